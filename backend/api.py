@@ -1,11 +1,16 @@
 """Minimal API functions for offline use."""
 from __future__ import annotations
 
+import asyncio
 import json
 import os
 import time
 
 from redis import Redis
+try:  # asyncio client ships with redis-py >= 4.2
+    from redis import asyncio as aioredis
+except Exception:  # pragma: no cover - offline redis stub
+    aioredis = None
 from rq import Queue, Retry
 try:
     from rq.job import Job
@@ -21,6 +26,7 @@ from fastapi import (
 from pydantic import BaseModel
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from starlette.concurrency import run_in_threadpool
 
 from backend import (
@@ -28,7 +34,12 @@ from backend import (
     REDIS_URL,
     HISTORY_ROOT,
 )
-from backend.auth import decode as decode_jwt
+from backend.auth import decode_cached as decode_jwt
+from backend.events import AsyncJobEvents, TERMINAL_STATUSES, wait_seconds
+from backend.metrics import REGISTRY, collect, render as render_metrics, start_flusher
+from backend.ratelimit import RateLimiter
+from backend.result_cache import CACHED_JOB_PREFIX, InFlight, ResultCache, claim_jobs, enqueue_claimed
+from backend.scheduler import Scheduler, estimate_cost
 
 
 def health() -> dict:
@@ -49,64 +60,143 @@ JWT_SECRET = os.getenv("JWT_SECRET", "secret")
 RATE_LIMIT = int(os.getenv("RATE_LIMIT", "10"))
 
 redis_conn = Redis.from_url(REDIS_URL)
+# Status polls use an asyncio pool; requests wait for a free
+# connection instead of failing once REDIS_POOL_SIZE are in use.
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", "50"))
+async_redis = (
+    aioredis.Redis(
+        connection_pool=aioredis.BlockingConnectionPool.from_url(REDIS_URL, max_connections=REDIS_POOL_SIZE)
+    )
+    if aioredis is not None
+    else None
+)
+job_events = AsyncJobEvents(async_redis)
 QUEUE_NAME = os.getenv("QUEUE_NAME", "legogpt")
 queue = Queue(QUEUE_NAME, connection=redis_conn)
 DEFAULT_RETRY = Retry(max=3, interval=[10, 30, 60])
-
-_TOKEN_USAGE: dict[str, tuple[int, int]] = {}
+# Most prompts accepted by one POST /generate/batch
+GENERATE_BATCH_MAX = int(os.getenv("GENERATE_BATCH_MAX", "32"))
+
+# Per-token request limit shared with the other replicas through Redis
+rate_limiter = RateLimiter(redis_conn, async_redis)
+# Results of earlier identical generation requests
+result_cache = ResultCache(redis_conn)
+# Generation jobs still queued or running, shared by identical requests
+in_flight = InFlight(redis_conn)
+# Picks each job's queue by type, cost, priority tier and fair share
+scheduler = Scheduler(redis_conn)
 
 METRICS = {
-    "generate_requests": 0,
-    "detect_requests": 0,
-    "example_submissions": 0,
-    "example_reports": 0,
-    "token_usage": 0,
-    "rate_limit_hits": 0,
-}
-
-METRICS_HISTORY: dict[str, dict[int, int]] = {
-    "token_usage": {},
-    "rate_limit_hits": {},
+    name: REGISTRY.counter(name)
+    for name in (
+        "generate_requests",
+        "detect_requests",
+        "example_submissions",
+        "example_reports",
+        "token_usage",
+        "rate_limit_hits",
+    )
 }
+# Per-minute counts for the analytics charts
+METRICS_HISTORY = {name: REGISTRY.history(name) for name in ("token_usage", "rate_limit_hits")}
+REQUEST_LATENCY = REGISTRY.histogram("http_request_seconds", "Time from request to response headers")
+start_flusher()
+
+
+async def _job_status(job_id: str) -> tuple[str | None, Job | None]:
+    """Return the RQ status of ``job_id`` and the job if it had to be fetched.
+
+    With the asyncio client only the ``status`` field of the job hash is
+    read, so pending jobs are never deserialized. The status is ``None``
+    when the job does not exist.
+    """
+    if async_redis is not None:
+        raw = await async_redis.hget(f"rq:job:{job_id}", "status")
+        return (raw.decode() if raw is not None else None), None
+    try:
+        job = await run_in_threadpool(Job.fetch, job_id, connection=redis_conn)
+    except Exception:
+        return None, None
+    if job.is_finished:
+        return "finished", job
+    if job.is_failed:
+        return "failed", job
+    return "queued", job
+
+
+async def _wait_for_job(job_id: str, wait: float) -> tuple[str | None, Job | None]:
+    """Like :func:`_job_status` but wait up to ``wait`` seconds for the job to end.
+
+    The job's events are subscribed to before its status is read, so a
+    job finishing in between still wakes the request.
+    """
+    if wait <= 0:
+        return await _job_status(job_id)
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + wait
+    async with job_events.listen(job_id) as events:
+        job_status, job = await _job_status(job_id)
+        while job_status is not None and job_status not in TERMINAL_STATUSES:
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                break
+            try:
+                # Without pub/sub, re-check the status every second instead
+                timeout = remaining if job_events.running else min(remaining, 1.0)
+                event = await asyncio.wait_for(events.get(), timeout)
+            except asyncio.TimeoutError:
+                event = {}
+            if "status" in event or not job_events.running:
+                job_status, job = await _job_status(job_id)
+    return job_status, job
+
+
+def _fetch_job(job_id: str, job: Job | None = None) -> Job:
+    """Fetch ``job_id`` unless ``job`` is already loaded (blocking)."""
+    return job if job is not None else Job.fetch(job_id, connection=redis_conn)
+
+
+def _enqueue(target, func, *args, meta: dict) -> Job:
+    """Enqueue ``func`` on ``target`` and store ``meta`` on the job (blocking)."""
+    job = target.enqueue(func, *args, retry=DEFAULT_RETRY)
+    job.meta.update(meta)
+    job.save_meta()
+    return job
 
 
-def _prometheus_metrics() -> str:
-    lines = []
-    for key, val in METRICS.items():
-        lines.append(f"# TYPE lego_gpt_{key} counter")
-        lines.append(f"lego_gpt_{key} {val}")
-    return "\n".join(lines) + "\n"
+def _submit_generate(calls: list[tuple], claims: dict) -> list[tuple[str, dict | None]]:
+    """Answer ``generate_job`` calls from the cache, jobs in flight or the queue (blocking).
 
+    New jobs go to the queue :data:`scheduler` picks for the costliest of
+    them; calls answered without a new job do not count towards fair share.
+    """
+    from backend.worker import generate_job  # imported here to avoid circular dependency
 
-def _record_history(key: str) -> None:
-    now_min = int(time.time() // 60)
-    hist = METRICS_HISTORY.setdefault(key, {})
-    hist[now_min] = hist.get(now_min, 0) + 1
-    for ts in list(hist):
-        if now_min - ts > 59:
-            del hist[ts]
+    user = claims.get("sub", "user")
+    claimed = claim_jobs(calls, result_cache, in_flight)
+    new = [calls[i] for i in claimed.new]
+    target = queue
+    if new:
+        cost = max(estimate_cost(prompt, inv) for prompt, _seed, inv in new)
+        target = scheduler.route(queue, "generate", claims, cost, len(new))
+    metas = [{"user": user, "prompt": prompt, "seed": seed} for prompt, seed, _inv in calls]
+    return enqueue_claimed(target, generate_job, calls, metas, claimed, in_flight, retry=DEFAULT_RETRY)
 
 
 bearer = HTTPBearer(auto_error=False)
 
 
-def _rate_limit(token: str) -> None:
-    now = int(time.time())
-    window = now // 60
-    count, win = _TOKEN_USAGE.get(token, (0, window))
-    if win != window:
-        count = 0
-        win = window
-    if count >= RATE_LIMIT:
-        METRICS["rate_limit_hits"] += 1
-        _record_history("rate_limit_hits")
+async def _rate_limit(token: str, count: int = 1) -> None:
+    if not await rate_limiter.ahit(token, RATE_LIMIT, count):
+        METRICS["rate_limit_hits"].inc()
+        METRICS_HISTORY["rate_limit_hits"].record()
         raise HTTPException(status_code=429, detail="rate_limit")
-    _TOKEN_USAGE[token] = (count + 1, win)
 
 
-async def _auth(
+async def _authenticate(
     credentials: HTTPAuthorizationCredentials | None = Depends(bearer),
 ) -> tuple[dict, str]:
+    """Return the claims and token of the request, without rate limiting it."""
     if credentials is None:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
     token = credentials.credentials
@@ -114,9 +204,16 @@ async def _auth(
         payload = decode_jwt(token, JWT_SECRET)
     except Exception:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED)
-    _rate_limit(token)
-    METRICS["token_usage"] += 1
-    _record_history("token_usage")
+    return payload, token
+
+
+async def _auth(
+    credentials: HTTPAuthorizationCredentials | None = Depends(bearer),
+) -> tuple[dict, str]:
+    payload, token = await _authenticate(credentials)
+    await _rate_limit(token)
+    METRICS["token_usage"].inc()
+    METRICS_HISTORY["token_usage"].record()
     return payload, token
 
 
@@ -136,6 +233,15 @@ app.add_middleware(
 )
 
 
+@app.middleware("http")
+async def _time_requests(request, call_next):
+    start = time.perf_counter()
+    try:
+        return await call_next(request)
+    finally:
+        REQUEST_LATENCY.observe(time.perf_counter() - start)
+
+
 @app.get("/health")
 async def health_route() -> dict:
     return await run_in_threadpool(health)
@@ -147,6 +253,10 @@ class GenerateRequest(BaseModel):
     inventory_filter: dict[str, int] | None = None
 
 
+class GenerateBatchRequest(BaseModel):
+    requests: list[GenerateRequest]
+
+
 class ImageRequest(BaseModel):
     image: str
 
@@ -157,40 +267,78 @@ async def generate_route(
     auth: tuple[dict, str] = Depends(_auth),
 ) -> dict:
     payload, _token = auth
-    from backend.worker import generate_job  # imported here to avoid circular dependency
-
-    job = await run_in_threadpool(
-        queue.enqueue,
-        generate_job,
-        req.prompt,
-        req.seed or 42,
-        req.inventory_filter,
-        retry=DEFAULT_RETRY,
-    )
-    job.meta["user"] = payload.get("sub", "user")
-    job.meta["prompt"] = req.prompt
-    job.meta["seed"] = req.seed or 42
-    job.save_meta()
-    METRICS["generate_requests"] += 1
-    return {"job_id": job.id}
+    METRICS["generate_requests"].inc()
+    call = (req.prompt, req.seed or 42, req.inventory_filter)
+    ((job_id, cached),) = await run_in_threadpool(_submit_generate, [call], payload)
+    if cached is not None:
+        return {"job_id": job_id, "cached": True, "result": cached}
+    return {"job_id": job_id}
+
+
+@app.post("/generate/batch")
+async def generate_batch_route(
+    req: GenerateBatchRequest,
+    auth: tuple[dict, str] = Depends(_authenticate),
+) -> dict:
+    """Enqueue one generation job per request; each prompt counts towards the rate limit.
+
+    The prompts are admitted together, so a rejected batch uses no quota.
+    """
+    payload, token = auth
+    if not req.requests:
+        raise HTTPException(status_code=400, detail="empty_batch")
+    if len(req.requests) > GENERATE_BATCH_MAX:
+        raise HTTPException(status_code=413, detail="batch_too_large")
+    await _rate_limit(token, len(req.requests))
+    METRICS["token_usage"].inc()
+    METRICS_HISTORY["token_usage"].record()
+    calls = [(item.prompt, item.seed or 42, item.inventory_filter) for item in req.requests]
+    METRICS["generate_requests"].inc(len(calls))
+    submitted = await run_in_threadpool(_submit_generate, calls, payload)
+    return {"job_ids": [job_id for job_id, _cached in submitted]}
 
 
 @app.get("/generate/{job_id}")
 async def generate_result_route(
     job_id: str,
+    wait: float = 0,
     auth: tuple[dict, str] = Depends(_auth),
 ) -> Response:
-    try:
-        job = Job.fetch(job_id, connection=redis_conn)
-    except Exception:
+    if job_id.startswith(CACHED_JOB_PREFIX):
+        cached = await run_in_threadpool(result_cache.get, job_id[len(CACHED_JOB_PREFIX) :])
+        if cached is None:
+            raise HTTPException(status_code=404)
+        return cached
+    job_status, job = await _wait_for_job(job_id, wait_seconds(wait))
+    if job_status is None:
         raise HTTPException(status_code=404)
-    if job.is_finished:
+    if job_status == "finished":
+        job = await run_in_threadpool(_fetch_job, job_id, job)
         return job.result
-    if job.is_failed:
+    if job_status == "failed":
         raise HTTPException(status_code=500, detail="Job failed")
     return Response(status_code=202)
 
 
+def _detect_result(job_id: str, job: Job | None = None):
+    """Return the detection result and append it to the user's history (blocking)."""
+    job = _fetch_job(job_id, job)
+    result = job.result
+    user = job.meta.get("user")
+    if user:
+        HISTORY_ROOT.mkdir(parents=True, exist_ok=True)
+        file_path = HISTORY_ROOT / f"{user}.jsonl"
+        record = {
+            "prompt": job.meta.get("prompt", ""),
+            "seed": job.meta.get("seed", 42),
+            "result": result,
+            "ts": int(time.time()),
+        }
+        with open(file_path, "a") as fh:
+            fh.write(json.dumps(record) + "\n")
+    return result
+
+
 @app.post("/detect_inventory")
 async def detect_inventory_route(
     req: ImageRequest,
@@ -199,57 +347,81 @@ async def detect_inventory_route(
     payload, _token = auth
     from backend.worker import detect_job  # imported here to avoid circular dependency
 
-    job = await run_in_threadpool(
-        queue.enqueue,
-        detect_job,
-        req.image,
-        retry=DEFAULT_RETRY,
-    )
-    job.meta["user"] = payload.get("sub", "user")
-    job.save_meta()
-    METRICS["detect_requests"] += 1
+    target = scheduler.route(queue, "detect", payload)
+    job = await run_in_threadpool(_enqueue, target, detect_job, req.image, meta={"user": payload.get("sub", "user")})
+    METRICS["detect_requests"].inc()
     return {"job_id": job.id}
 
 
 @app.get("/detect_inventory/{job_id}")
 async def detect_inventory_result_route(
     job_id: str,
+    wait: float = 0,
     auth: tuple[dict, str] = Depends(_auth),
 ) -> Response:
-    try:
-        job = Job.fetch(job_id, connection=redis_conn)
-    except Exception:
+    job_status, job = await _wait_for_job(job_id, wait_seconds(wait))
+    if job_status is None:
         raise HTTPException(status_code=404)
-    if job.is_finished:
-        result = job.result
-        user = job.meta.get("user")
-        if user:
-            HISTORY_ROOT.mkdir(parents=True, exist_ok=True)
-            file_path = HISTORY_ROOT / f"{user}.jsonl"
-            record = {
-                "prompt": job.meta.get("prompt", ""),
-                "seed": job.meta.get("seed", 42),
-                "result": result,
-                "ts": int(time.time()),
-            }
-            with open(file_path, "a") as fh:
-                fh.write(json.dumps(record) + "\n")
-        return result
-    if job.is_failed:
+    if job_status == "finished":
+        return await run_in_threadpool(_detect_result, job_id, job)
+    if job_status == "failed":
         raise HTTPException(status_code=500, detail="Job failed")
     return Response(status_code=202)
 
 
+async def _progress_events(job_id: str):
+    """Yield SSE ``data:`` lines with the job's progress until it ends."""
+    last = None
+    async with job_events.listen(job_id) as events:
+        while True:
+            try:
+                job = await run_in_threadpool(Job.fetch, job_id, connection=redis_conn)
+            except Exception:
+                return
+            progress = job.meta.get("progress")
+            if progress != last and progress is not None:
+                yield f"data: {json.dumps({'progress': progress})}\n\n"
+                last = progress
+            if job.is_finished or job.is_failed:
+                return
+            if not job_events.running:
+                await asyncio.sleep(1)
+                continue
+            # Relay progress events; re-read the job once it reports a status
+            # or after 15 s without events in case the subscriber went away.
+            while True:
+                try:
+                    event = await asyncio.wait_for(events.get(), 15)
+                except asyncio.TimeoutError:
+                    break
+                if "status" in event:
+                    break
+                progress = event.get("progress")
+                if progress != last and progress is not None:
+                    yield f"data: {json.dumps({'progress': progress})}\n\n"
+                    last = progress
+
+
+@app.get("/progress/{job_id}")
+async def progress_route(job_id: str) -> StreamingResponse:
+    return StreamingResponse(
+        _progress_events(job_id),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache"},
+    )
+
+
 @app.get("/metrics")
 async def metrics_route(admin: dict = Depends(_admin)) -> dict:
-    payload = dict(METRICS)
-    payload["history"] = {k: sorted(v.items()) for k, v in METRICS_HISTORY.items()}
+    snapshot = await run_in_threadpool(collect)
+    payload = dict(snapshot["counters"])
+    payload["history"] = snapshot["history"]
     return payload
 
 
 @app.get("/metrics_prom")
 async def metrics_prom_route(admin: dict = Depends(_admin)) -> Response:
-    data = await run_in_threadpool(_prometheus_metrics)
+    data = render_metrics(await run_in_threadpool(collect))
     return Response(content=data, media_type="text/plain; version=0.0.4")
 
 
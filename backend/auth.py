@@ -4,9 +4,24 @@ import base64
 import hashlib
 import hmac
 import json
+import os
+import threading
 import time
+from collections import OrderedDict
 from typing import Any, Dict
 
+from backend.metrics import REGISTRY
+
+# Verified tokens kept by ``decode_cached`` and for how long (seconds)
+JWT_CACHE_SIZE = int(os.getenv("JWT_CACHE_SIZE", "4096"))
+JWT_CACHE_TTL = float(os.getenv("JWT_CACHE_TTL", "300"))
+
+METRICS = {
+    "jwt_cache_hits": 0,
+    "jwt_cache_misses": 0,
+}
+REGISTRY.include(METRICS)
+
 
 def _b64url(data: bytes) -> bytes:
     return base64.urlsafe_b64encode(data).rstrip(b"=")
@@ -45,3 +60,54 @@ def decode(token: str, secret: str) -> Dict[str, Any]:
     if exp is not None and time.time() > exp:
         raise ValueError("Token expired")
     return payload
+
+
+class TokenCache:
+    """Bounded LRU of verified tokens so repeat requests skip the HMAC.
+
+    Entries are dropped ``ttl`` seconds after verification or when the
+    token's ``exp`` passes, whichever is sooner, and are tied to the secret
+    they were verified with. Invalid tokens are never cached. Callers still
+    apply their own checks, such as the ban list, to the returned payload.
+    """
+
+    def __init__(self, size: int = JWT_CACHE_SIZE, ttl: float = JWT_CACHE_TTL) -> None:
+        self.size = size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[str, float, Dict[str, Any]]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def decode(self, token: str, secret: str) -> Dict[str, Any]:
+        """Like :func:`decode` but served from the cache when possible."""
+        now = time.time()
+        with self._lock:
+            entry = self._entries.get(token)
+            if entry is not None and entry[0] == secret and now <= entry[1]:
+                self._entries.move_to_end(token)
+                METRICS["jwt_cache_hits"] += 1
+                return dict(entry[2])
+        METRICS["jwt_cache_misses"] += 1
+        payload = decode(token, secret)
+        if self.size > 0 and self.ttl > 0:
+            expires = now + self.ttl
+            exp = payload.get("exp")
+            if isinstance(exp, (int, float)):
+                expires = min(expires, exp)
+            with self._lock:
+                self._entries[token] = (secret, expires, dict(payload))
+                self._entries.move_to_end(token)
+                while len(self._entries) > self.size:
+                    self._entries.popitem(last=False)
+        return payload
+
+
+_cache = TokenCache()
+
+
+def decode_cached(token: str, secret: str) -> Dict[str, Any]:
+    """Verify ``token`` using the process-wide :class:`TokenCache`."""
+    return _cache.decode(token, secret)
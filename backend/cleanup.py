@@ -8,28 +8,36 @@ import time
 from pathlib import Path
 
 from backend import STATIC_ROOT
+from backend.result_cache import ResultCache, result_cache
 
 
-def cleanup(path: Path = STATIC_ROOT, days: int = 7, dry_run: bool = False) -> int:
+def cleanup(
+    path: Path = STATIC_ROOT,
+    days: int = 7,
+    dry_run: bool = False,
+    cache: ResultCache | None = None,
+) -> int:
     """Remove subdirectories in *path* older than *days* days.
 
     If ``dry_run`` is ``True`` the directories are listed but not removed.
+    Cached generation results pointing at removed directories are dropped
+    from ``cache`` (the shared result cache by default) first, so they are
+    never served after their assets are gone.
 
     Returns the number of directories removed (or that would be removed in dry
     run mode).
     """
     threshold = time.time() - days * 86400
-    count = 0
-    for item in path.iterdir():
-        if not item.is_dir():
-            continue
-        if item.stat().st_mtime < threshold:
-            if dry_run:
-                print(f"Would remove {item}")
-            else:
-                shutil.rmtree(item, ignore_errors=True)
-            count += 1
-    return count
+    old = [item for item in path.iterdir() if item.is_dir() and item.stat().st_mtime < threshold]
+    if dry_run:
+        for item in old:
+            print(f"Would remove {item}")
+        return len(old)
+    if old:
+        (cache or result_cache).forget_runs(item.name for item in old)
+    for item in old:
+        shutil.rmtree(item, ignore_errors=True)
+    return len(old)
 
 
 def main(argv: list[str] | None = None) -> None:
@@ -56,6 +56,8 @@ def _load_config_token() -> str | None:
 
 
 OFFLINE_FILE = Path.home() / ".lego-gpt-offline.json"
+# Seconds the server may hold a job status request open
+POLL_WAIT = 30
 
 
 def _queue_offline(task: dict) -> None:
@@ -122,7 +124,11 @@ def _post(url: str, token: str, payload: dict) -> dict:
 
 
 def _poll(url: str, token: str, progress: bool = False) -> dict:
+    # Ask the server to hold the request until the job ends (long-poll).
+    # Servers without long-poll answer at once, so pace retries to 1 s.
+    url = f"{url}{'&' if '?' in url else '?'}wait={POLL_WAIT}"
     while True:
+        start = time.monotonic()
         req = request.Request(url, headers={"Authorization": f"Bearer {token}"})
         try:
             with request.urlopen(req) as resp:
@@ -134,11 +140,11 @@ def _poll(url: str, token: str, progress: bool = False) -> dict:
             if exc.code == 202:
                 if progress:
                     print(".", end="", file=sys.stderr, flush=True)
-                time.sleep(1)
+                time.sleep(max(0.0, 1 - (time.monotonic() - start)))
                 continue
             msg = _extract_error(exc)
             raise RuntimeError(f"GET {url} failed ({exc.code}): {msg}") from None
-        time.sleep(1)
+        time.sleep(max(0.0, 1 - (time.monotonic() - start)))
 
 
 def _stream_progress(url: str) -> None:
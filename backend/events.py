@@ -0,0 +1,193 @@
+"""Job progress and completion events over Redis pub/sub.
+
+Workers publish a small JSON message on ``JOB_EVENTS_CHANNEL`` whenever a
+job's progress changes and once it has finished or failed. Each API
+process runs a single subscriber that fans the messages out to the
+requests waiting on that job (long-polls and SSE streams), so waiting
+clients are woken within milliseconds instead of re-reading the job from
+Redis every second.
+
+:class:`JobEvents` is the thread-based hub used by the gateway and
+:class:`AsyncJobEvents` the asyncio one used by the FastAPI app. Both fall
+back to reporting ``running == False`` when pub/sub is unavailable, in
+which case callers poll as before.
+"""
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import os
+import queue as queue_mod
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager
+from typing import Any, AsyncIterator, Iterator
+
+JOB_EVENTS_CHANNEL = os.getenv("JOB_EVENTS_CHANNEL", "legogpt:job-events")
+# Longest ``?wait=`` a status request may ask for, in seconds
+LONG_POLL_MAX = int(os.getenv("LONG_POLL_MAX", "30"))
+# Job statuses after which no further events are published
+TERMINAL_STATUSES = frozenset({"finished", "failed", "stopped", "canceled"})
+# Seconds to wait before subscribing again after pub/sub was unavailable
+_RETRY_DELAY = 5.0
+
+log = logging.getLogger(__name__)
+
+
+def publish_event(conn: Any, job_id: str, **fields: Any) -> None:
+    """Publish ``fields`` for ``job_id``; errors are logged and ignored."""
+    try:
+        conn.publish(JOB_EVENTS_CHANNEL, json.dumps({"job_id": job_id, **fields}))
+    except Exception:  # pragma: no cover - best effort, clients still poll
+        log.debug("Could not publish event for job %s", job_id, exc_info=True)
+
+
+def wait_seconds(value: str | float | None) -> float:
+    """Parse a ``wait`` query parameter, clamped to ``[0, LONG_POLL_MAX]``."""
+    try:
+        seconds = float(value or 0)
+    except (TypeError, ValueError):
+        return 0.0
+    if not seconds > 0:  # also rejects NaN
+        return 0.0
+    return min(seconds, float(LONG_POLL_MAX))
+
+
+class _Fanout:
+    """Per-job listener queues shared by both hubs."""
+
+    def __init__(self) -> None:
+        self._listeners: dict[str, set[Any]] = {}
+        self._subscribed = False
+        self._retry_at = 0.0
+
+    @property
+    def running(self) -> bool:
+        """Whether events are being received; callers poll otherwise."""
+        return self._subscribed
+
+    def _add(self, job_id: str, listener: Any) -> None:
+        self._listeners.setdefault(job_id, set()).add(listener)
+
+    def _remove(self, job_id: str, listener: Any) -> None:
+        listeners = self._listeners.get(job_id)
+        if listeners is not None:
+            listeners.discard(listener)
+            if not listeners:
+                del self._listeners[job_id]
+
+    def _dispatch(self, data: bytes | str) -> None:
+        try:
+            event = json.loads(data)
+            listeners = list(self._listeners.get(event["job_id"], ()))
+        except (ValueError, KeyError, TypeError):
+            return
+        for listener in listeners:
+            listener.put_nowait(event)
+
+
+class JobEvents(_Fanout):
+    """Fan out job events to threads through one subscriber thread."""
+
+    def __init__(self, conn: Any) -> None:
+        super().__init__()
+        self._conn = conn
+        self._lock = threading.Lock()
+        self._thread: threading.Thread | None = None
+
+    def _ensure_started(self) -> None:
+        if (self._thread is not None and self._thread.is_alive()) or time.monotonic() < self._retry_at:
+            return
+        started = threading.Event()
+        self._thread = threading.Thread(target=self._run, args=(started,), name="job-events", daemon=True)
+        self._thread.start()
+        started.wait(1.0)
+
+    def _run(self, started: threading.Event) -> None:
+        try:
+            pubsub = self._conn.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(JOB_EVENTS_CHANNEL)
+        except Exception:
+            log.debug("Job events unavailable, falling back to polling", exc_info=True)
+            self._retry_at = time.monotonic() + _RETRY_DELAY
+            return
+        finally:
+            started.set()
+        self._subscribed = True
+        try:
+            for message in pubsub.listen():
+                if message.get("type") == "message":
+                    with self._lock:
+                        self._dispatch(message["data"])
+        except Exception:  # pragma: no cover - connection lost, restarted on demand
+            log.warning("Job event subscriber stopped", exc_info=True)
+        finally:
+            self._subscribed = False
+
+    @contextmanager
+    def listen(self, job_id: str) -> Iterator[queue_mod.Queue]:
+        """Yield a queue receiving the events published for ``job_id``."""
+        events: queue_mod.Queue = queue_mod.Queue()
+        with self._lock:
+            self._add(job_id, events)
+            self._ensure_started()
+        try:
+            yield events
+        finally:
+            with self._lock:
+                self._remove(job_id, events)
+
+
+class AsyncJobEvents(_Fanout):
+    """Fan out job events to coroutines through one subscriber task."""
+
+    def __init__(self, client: Any) -> None:
+        super().__init__()
+        self._client = client
+        self._task: asyncio.Task | None = None
+        self._started: asyncio.Future | None = None
+
+    async def _ensure_started(self) -> None:
+        if self._client is None or time.monotonic() < self._retry_at:
+            return
+        loop = asyncio.get_running_loop()
+        if self._task is None or self._task.done() or self._task.get_loop() is not loop:
+            self._subscribed = False
+            self._started = loop.create_future()
+            self._task = loop.create_task(self._run(self._started))
+        try:
+            await asyncio.wait_for(asyncio.shield(self._started), 1.0)
+        except asyncio.TimeoutError:
+            pass
+
+    async def _run(self, started: asyncio.Future) -> None:
+        pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        try:
+            try:
+                await pubsub.subscribe(JOB_EVENTS_CHANNEL)
+                self._subscribed = True
+            except Exception:
+                self._retry_at = time.monotonic() + _RETRY_DELAY
+                raise
+            finally:
+                started.set_result(None)
+            async for message in pubsub.listen():
+                if message.get("type") == "message":
+                    self._dispatch(message["data"])
+        except Exception:
+            log.warning("Job event subscriber stopped", exc_info=True)
+        finally:
+            self._subscribed = False
+            await (getattr(pubsub, "aclose", None) or pubsub.reset)()
+
+    @asynccontextmanager
+    async def listen(self, job_id: str) -> AsyncIterator[asyncio.Queue]:
+        """Yield a queue receiving the events published for ``job_id``."""
+        events: asyncio.Queue = asyncio.Queue()
+        self._add(job_id, events)
+        try:
+            await self._ensure_started()
+            yield events
+        finally:
+            self._remove(job_id, events)
@@ -2,9 +2,12 @@
 
 import json
 import os
+import threading
 import time
 from pathlib import Path
-from http.server import HTTPServer, BaseHTTPRequestHandler
+from queue import Empty, SimpleQueue
+from urllib.parse import parse_qs, urlsplit
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
 from redis import Redis
 from rq import Queue, Retry
 try:
@@ -23,7 +26,13 @@ from backend import (
     PREFERENCES_ROOT,
 )
 from backend.worker import QUEUE_NAME as DEFAULT_QUEUE, generate_job, detect_job
-from backend.auth import decode as decode_jwt
+from backend.auth import decode_cached as decode_jwt
+from backend.events import JobEvents, wait_seconds
+from backend.metrics import REGISTRY, collect, render as render_metrics, start_flusher
+from backend.ratelimit import RateLimiter
+from backend.result_cache import CACHED_JOB_PREFIX, InFlight, ResultCache, claim_jobs, enqueue_claimed
+from backend.scheduler import Scheduler, estimate_cost
+from backend import static_files
 from backend import __version__
 from backend.logging_config import setup_logging
 from backend.cleanup import cleanup
@@ -33,9 +42,12 @@ from backend.config import apply_yaml_config
 REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
 redis_conn = Redis.from_url(REDIS_URL)
 submissions_redis = Redis.from_url(SUBMISSIONS_REDIS_URL) if SUBMISSIONS_REDIS_URL else None
+job_events = JobEvents(redis_conn)
 QUEUE_NAME = os.getenv("QUEUE_NAME", DEFAULT_QUEUE)
 queue = Queue(QUEUE_NAME, connection=redis_conn)
 DEFAULT_RETRY = Retry(max=3, interval=[10, 30, 60])
+# Most prompts accepted by one POST /generate/batch
+GENERATE_BATCH_MAX = int(os.getenv("GENERATE_BATCH_MAX", "32"))
 
 JWT_SECRET = os.getenv("JWT_SECRET", "secret")
 RATE_LIMIT = int(os.getenv("RATE_LIMIT", "5"))
@@ -44,49 +56,40 @@ CLEANUP_DAYS = int(os.getenv("CLEANUP_DAYS", "7"))
 CLEANUP_INTERVAL = int(os.getenv("CLEANUP_INTERVAL", "3600"))  # seconds
 # Allow cross-origin requests
 CORS_ORIGINS = os.getenv("CORS_ORIGINS", "*")
-# token -> (count, window_epoch_minute)
-# token -> (count, window_epoch_minute)
-_TOKEN_USAGE: dict[str, tuple[int, int]] = {}
+# Handler threads, concurrent /progress/ streams and ?wait= long-polls, and
+# keep-alive idle timeout
+GATEWAY_THREADS = int(os.getenv("GATEWAY_THREADS", "32"))
+GATEWAY_MAX_STREAMS = int(os.getenv("GATEWAY_MAX_STREAMS", str(GATEWAY_THREADS // 2)))
+GATEWAY_MAX_LONG_POLLS = int(os.getenv("GATEWAY_MAX_LONG_POLLS", str(GATEWAY_THREADS // 4)))
+GATEWAY_KEEPALIVE = float(os.getenv("GATEWAY_KEEPALIVE", "5"))
+# Per-token request limit shared with the other replicas through Redis
+rate_limiter = RateLimiter(redis_conn)
+# Results of earlier identical generation requests
+result_cache = ResultCache(redis_conn)
+# Generation jobs still queued or running, shared by identical requests
+in_flight = InFlight(redis_conn)
+# Picks each job's queue by type, cost, priority tier and fair share
+scheduler = Scheduler(redis_conn)
 # one-time link codes -> (token, expiry_ts)
 _LINK_CODES: dict[str, tuple[str, float]] = {}
 
 # banned user subjects
 _BANNED_USERS: set[str] = set()
 
-# Simple in-memory metrics
 METRICS = {
-    "generate_requests": 0,
-    "detect_requests": 0,
-    "example_submissions": 0,
-    "example_reports": 0,
-    "token_usage": 0,
-    "rate_limit_hits": 0,
-}
-
-# Sliding-window metric history (last 60 minutes)
-METRICS_HISTORY: dict[str, dict[int, int]] = {
-    "token_usage": {},
-    "rate_limit_hits": {},
+    name: REGISTRY.counter(name)
+    for name in (
+        "generate_requests",
+        "detect_requests",
+        "example_submissions",
+        "example_reports",
+        "token_usage",
+        "rate_limit_hits",
+    )
 }
-
-
-def _prometheus_metrics() -> str:
-    """Return metrics in Prometheus text format."""
-    lines = []
-    for key, val in METRICS.items():
-        lines.append(f"# TYPE lego_gpt_{key} counter")
-        lines.append(f"lego_gpt_{key} {val}")
-    return "\n".join(lines) + "\n"
-
-
-def _record_history(key: str) -> None:
-    """Increment minute bucket for ``key`` and trim old entries."""
-    now_min = int(time.time() // 60)
-    hist = METRICS_HISTORY.setdefault(key, {})
-    hist[now_min] = hist.get(now_min, 0) + 1
-    for ts in list(hist):
-        if now_min - ts > 59:
-            del hist[ts]
+# Per-minute counts for the analytics charts
+METRICS_HISTORY = {name: REGISTRY.history(name) for name in ("token_usage", "rate_limit_hits")}
+REQUEST_LATENCY = REGISTRY.histogram("http_request_seconds", "Time from request to response headers")
 
 # Additional example sources for federated search
 EXAMPLE_SOURCES = [s for s in os.getenv("EXAMPLE_SOURCES", "").split(",") if s]
@@ -98,7 +101,8 @@ if BANS_FILE.is_file():
         pass
 
 
-def _check_auth(headers) -> None:
+def _check_auth(headers, cost: int = 1) -> None:
+    """Check the bearer token and count ``cost`` requests towards its rate limit."""
     auth = headers.get("Authorization", "")
     if not auth.startswith("Bearer "):
         raise PermissionError
@@ -107,20 +111,50 @@ def _check_auth(headers) -> None:
     if payload.get("sub") in _BANNED_USERS:
         raise PermissionError
 
-    METRICS["token_usage"] += 1
-    _record_history("token_usage")
-
-    now = int(time.time())
-    window = now // 60
-    count, win = _TOKEN_USAGE.get(token, (0, window))
-    if win != window:
-        count = 0
-        win = window
-    if count >= RATE_LIMIT:
-        METRICS["rate_limit_hits"] += 1
-        _record_history("rate_limit_hits")
+    METRICS["token_usage"].inc()
+    METRICS_HISTORY["token_usage"].record()
+    if cost:
+        _rate_limit(token, cost)
+
+
+def _rate_limit(token: str, count: int = 1) -> None:
+    if not rate_limiter.hit(token, RATE_LIMIT, count):
+        METRICS["rate_limit_hits"].inc()
+        METRICS_HISTORY["rate_limit_hits"].record()
         raise RuntimeError("rate_limit")
-    _TOKEN_USAGE[token] = (count + 1, win)
+
+
+def _submit_generate(calls: list[tuple], claims: dict) -> list[tuple[str, dict | None]]:
+    """Answer ``generate_job`` calls from the cache, jobs in flight or the queue.
+
+    New jobs go to the queue :data:`scheduler` picks for the costliest of
+    them; calls answered without a new job do not count towards fair share.
+    """
+    user = claims.get("sub", "user")
+    claimed = claim_jobs(calls, result_cache, in_flight)
+    new = [calls[i] for i in claimed.new]
+    target = queue
+    if new:
+        cost = max(estimate_cost(prompt, inv) for prompt, _seed, inv in new)
+        target = scheduler.route(queue, "generate", claims, cost, len(new))
+    metas = [{"user": user, "prompt": prompt, "seed": seed} for prompt, seed, _inv in calls]
+    return enqueue_claimed(target, generate_job, calls, metas, claimed, in_flight, retry=DEFAULT_RETRY)
+
+
+def _generate_calls(payload) -> list[tuple]:
+    """Validate a ``/generate/batch`` body into ``generate_job`` arguments."""
+    items = payload.get("requests") if isinstance(payload, dict) else None
+    if not isinstance(items, list):
+        raise ValueError("Invalid requests")
+    calls = []
+    for item in items:
+        if not isinstance(item, dict):
+            raise ValueError("Invalid request")
+        inventory = item.get("inventory_filter")
+        if inventory is not None and not isinstance(inventory, dict):
+            raise ValueError("Invalid inventory_filter")
+        calls.append((item.get("prompt", ""), item.get("seed", 42), inventory))
+    return calls
 
 
 def _search_examples(query: str) -> list[dict]:
@@ -163,7 +197,7 @@ def _start_cleanup_thread(path: Path, days: int, interval: int) -> None:
     def loop() -> None:
         while True:
             try:
-                cleanup(path, days)
+                cleanup(path, days, cache=result_cache)
             except Exception:
                 pass
             time.sleep(interval)
@@ -171,6 +205,31 @@ def _start_cleanup_thread(path: Path, days: int, interval: int) -> None:
     threading.Thread(target=loop, daemon=True).start()
 
 
+def _wait_for_job(job_id: str, wait: float):
+    """Fetch ``job_id``, waiting up to ``wait`` seconds for it to finish or fail.
+
+    Raises if the job does not exist. The job's events are subscribed to
+    before it is fetched, so a job finishing in between still wakes us.
+    """
+    if wait <= 0:
+        return Job.fetch(job_id, connection=redis_conn)
+    deadline = time.monotonic() + wait
+    with job_events.listen(job_id) as events:
+        job_obj = Job.fetch(job_id, connection=redis_conn)
+        while not (job_obj.is_finished or job_obj.is_failed):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                # Without pub/sub, re-check the job every second instead
+                event = events.get(timeout=remaining if job_events.running else min(remaining, 1.0))
+            except Empty:
+                event = {}
+            if "status" in event or not job_events.running:
+                job_obj = Job.fetch(job_id, connection=redis_conn)
+    return job_obj
+
+
 def _check_admin(headers) -> None:
     auth = headers.get("Authorization", "")
     if not auth.startswith("Bearer "):
@@ -181,7 +240,69 @@ def _check_admin(headers) -> None:
         raise PermissionError
 
 
+class GatewayServer(ThreadingHTTPServer):
+    """HTTP server handling connections on a fixed pool of threads.
+
+    Connections beyond ``threads`` wait for a free thread instead of each
+    spawning a new one. At most ``max_streams`` threads may be held by
+    ``/progress/`` streams and ``max_long_polls`` by ``?wait=`` long-polls,
+    so other requests and health checks are always served.
+    """
+
+    def __init__(
+        self,
+        server_address,
+        handler_class,
+        threads: int = GATEWAY_THREADS,
+        max_streams: int = GATEWAY_MAX_STREAMS,
+        max_long_polls: int = GATEWAY_MAX_LONG_POLLS,
+    ):
+        super().__init__(server_address, handler_class)
+        self.streams = threading.BoundedSemaphore(max(1, max_streams))
+        self.long_polls = threading.BoundedSemaphore(max(1, max_long_polls))
+        self._connections: SimpleQueue = SimpleQueue()
+        self._workers = [
+            threading.Thread(target=self._serve_connections, name=f"gateway-{i}", daemon=True)
+            for i in range(max(1, threads))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def process_request(self, request, client_address):
+        self._connections.put((request, client_address))
+
+    def _serve_connections(self) -> None:
+        while True:
+            item = self._connections.get()
+            if item is None:
+                return
+            self.process_request_thread(*item)
+
+    def server_close(self):
+        super().server_close()
+        for _ in self._workers:
+            self._connections.put(None)
+
+
 class Handler(BaseHTTPRequestHandler):
+    # Keep connections open between requests; idle ones are closed after
+    # GATEWAY_KEEPALIVE seconds so they do not pin a handler thread.
+    protocol_version = "HTTP/1.1"
+    timeout = GATEWAY_KEEPALIVE
+
+    def parse_request(self) -> bool:
+        # Start timing once the request line has arrived, so time spent
+        # idle on a keep-alive connection is not counted
+        self._request_start = time.perf_counter()
+        return super().parse_request()
+
+    def send_response(self, code, message=None) -> None:
+        super().send_response(code, message)
+        start = getattr(self, "_request_start", None)
+        if start is not None:
+            REQUEST_LATENCY.observe(time.perf_counter() - start)
+            self._request_start = None
+
     def _add_cors(self) -> None:
         if CORS_ORIGINS:
             self.send_header("Access-Control-Allow-Origin", CORS_ORIGINS)
@@ -195,6 +316,145 @@ class Handler(BaseHTTPRequestHandler):
         self.end_headers()
         self.wfile.write(encoded)
 
+    def _poll_job(self, job_id: str, wait: float):
+        """Fetch ``job_id``, long-polling up to ``wait`` seconds if a slot is free.
+
+        With every long-poll slot taken the job is fetched at once, so the
+        client gets its current status and polls again.
+        """
+        polls = getattr(self.server, "long_polls", None)
+        if wait <= 0 or polls is None:
+            return _wait_for_job(job_id, wait)
+        if not polls.acquire(blocking=False):
+            return _wait_for_job(job_id, 0)
+        try:
+            return _wait_for_job(job_id, wait)
+        finally:
+            polls.release()
+
+    def _send_progress(self, progress, last):
+        """Write an SSE progress event if ``progress`` changed; return the latest."""
+        if progress != last and progress is not None:
+            data = json.dumps({"progress": progress}).encode()
+            self.wfile.write(b"data: " + data + b"\n\n")
+            self.wfile.flush()
+            return progress
+        return last
+
+    def _stream_progress(self, job_id: str) -> None:
+        """Stream the job's progress as Server-Sent Events until it ends."""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        # The stream has no length, so the connection ends with it
+        self.send_header("Connection", "close")
+        self.close_connection = True
+        self._add_cors()
+        self.end_headers()
+        last = None
+        with job_events.listen(job_id) as events:
+            while True:
+                try:
+                    job_obj = Job.fetch(job_id, connection=redis_conn)
+                except Exception:
+                    break
+                last = self._send_progress(job_obj.meta.get("progress"), last)
+                if job_obj.is_finished or job_obj.is_failed:
+                    break
+                if not job_events.running:
+                    time.sleep(1)
+                    continue
+                # Relay progress events; re-read the job once it reports a
+                # status or after 15 s without events.
+                while True:
+                    try:
+                        event = events.get(timeout=15)
+                    except Empty:
+                        # Detects clients that went away while the job is idle
+                        try:
+                            self.wfile.write(b": keepalive\n\n")
+                            self.wfile.flush()
+                        except OSError:
+                            return
+                        break
+                    if "status" in event:
+                        break
+                    last = self._send_progress(event.get("progress"), last)
+
+    def _send_static(self, head: bool = False) -> None:
+        """Serve a file under ``STATIC_ROOT`` without reading it into memory."""
+        base = STATIC_ROOT.resolve()
+        rel = urlsplit(self.path).path[len("/static/") :]
+        file_path = (base / rel).resolve()
+        if not str(file_path).startswith(str(base)) or not file_path.is_file():
+            self.send_error(404)
+            return
+        st = file_path.stat()
+        encoding = None
+        gz_path = file_path.with_name(file_path.name + ".gz")
+        try:
+            gz_st = gz_path.stat()
+        except OSError:
+            gz_st = None
+        if (
+            gz_st is not None
+            and gz_st.st_mtime_ns >= st.st_mtime_ns
+            and "Range" not in self.headers
+            and static_files.accepts_gzip(self.headers)
+        ):
+            serve_path, st, encoding = gz_path, gz_st, "gzip"
+        else:
+            serve_path = file_path
+        tag = static_files.etag(st, encoding)
+
+        def send_headers(status: int, length: int) -> None:
+            self.send_response(status)
+            self.send_header("Content-Type", static_files.content_type(file_path))
+            self.send_header("Content-Length", str(length))
+            self.send_header("ETag", tag)
+            self.send_header("Last-Modified", static_files.last_modified(st))
+            self.send_header("Cache-Control", static_files.cache_control(rel))
+            self.send_header("Accept-Ranges", "bytes")
+            if gz_st is not None:
+                self.send_header("Vary", "Accept-Encoding")
+            if encoding:
+                self.send_header("Content-Encoding", encoding)
+            self._add_cors()
+
+        if static_files.not_modified(self.headers, tag, st):
+            # No body and no Content-Length: only the validators, plus the
+            # caching headers a 200 would have carried
+            self.send_response(304)
+            self.send_header("ETag", tag)
+            self.send_header("Last-Modified", static_files.last_modified(st))
+            self.send_header("Cache-Control", static_files.cache_control(rel))
+            if gz_st is not None:
+                self.send_header("Vary", "Accept-Encoding")
+            self._add_cors()
+            self.end_headers()
+            return
+        try:
+            byte_range = static_files.parse_range(self.headers.get("Range"), st.st_size)
+        except ValueError:
+            self.send_response(416)
+            self.send_header("Content-Range", f"bytes */{st.st_size}")
+            self.send_header("Content-Length", "0")
+            self._add_cors()
+            self.end_headers()
+            return
+        if byte_range is None:
+            start, end = 0, st.st_size - 1
+            send_headers(200, st.st_size)
+        else:
+            start, end = byte_range
+            send_headers(206, end - start + 1)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{st.st_size}")
+        self.end_headers()
+        if head:
+            return
+        with open(serve_path, "rb") as fh:
+            static_files.send_file(self.connection, fh, start, end - start + 1)
+
     def do_OPTIONS(self):
         self.send_response(204)
         self._add_cors()
@@ -217,9 +477,11 @@ class Handler(BaseHTTPRequestHandler):
             except RuntimeError:
                 self.send_error(429, "Rate limit exceeded")
                 return
-            job_id = self.path.rsplit("/", 1)[-1]
+            parts = urlsplit(self.path)
+            job_id = parts.path.rsplit("/", 1)[-1]
+            wait = wait_seconds(parse_qs(parts.query).get("wait", [None])[0])
             try:
-                job_obj = Job.fetch(job_id, connection=redis_conn)
+                job_obj = self._poll_job(job_id, wait)
             except Exception:
                 self.send_error(404)
                 return
@@ -242,6 +504,7 @@ class Handler(BaseHTTPRequestHandler):
                 self.send_error(500, "Job failed")
             else:
                 self.send_response(202)
+                self.send_header("Content-Length", "0")
                 self._add_cors()
                 self.end_headers()
             return
@@ -254,9 +517,18 @@ class Handler(BaseHTTPRequestHandler):
             except RuntimeError:
                 self.send_error(429, "Rate limit exceeded")
                 return
-            job_id = self.path.rsplit("/", 1)[-1]
+            parts = urlsplit(self.path)
+            job_id = parts.path.rsplit("/", 1)[-1]
+            if job_id.startswith(CACHED_JOB_PREFIX):
+                cached = result_cache.get(job_id[len(CACHED_JOB_PREFIX) :])
+                if cached is None:
+                    self.send_error(404)
+                else:
+                    self._send_json(cached)
+                return
+            wait = wait_seconds(parse_qs(parts.query).get("wait", [None])[0])
             try:
-                job_obj = Job.fetch(job_id, connection=redis_conn)
+                job_obj = self._poll_job(job_id, wait)
             except Exception:
                 self.send_error(404)
                 return
@@ -266,31 +538,21 @@ class Handler(BaseHTTPRequestHandler):
                 self.send_error(500, "Job failed")
             else:
                 self.send_response(202)
+                self.send_header("Content-Length", "0")
                 self._add_cors()
                 self.end_headers()
             return
         if self.path.startswith("/progress/"):
             job_id = self.path.split("/", 2)[-1]
-            self.send_response(200)
-            self.send_header("Content-Type", "text/event-stream")
-            self.send_header("Cache-Control", "no-cache")
-            self._add_cors()
-            self.end_headers()
-            last = None
-            while True:
-                try:
-                    job_obj = Job.fetch(job_id, connection=redis_conn)
-                except Exception:
-                    break
-                prog = job_obj.meta.get("progress")
-                if prog != last and prog is not None:
-                    data = json.dumps({"progress": prog}).encode()
-                    self.wfile.write(b"data: " + data + b"\n\n")
-                    self.wfile.flush()
-                    last = prog
-                if job_obj.is_finished or job_obj.is_failed:
-                    break
-                time.sleep(1)
+            streams = getattr(self.server, "streams", None)
+            if streams is not None and not streams.acquire(blocking=False):
+                self.send_error(503, "Too many progress streams")
+                return
+            try:
+                self._stream_progress(job_id)
+            finally:
+                if streams is not None:
+                    streams.release()
             return
         if self.path == "/submissions":
             try:
@@ -362,10 +624,9 @@ class Handler(BaseHTTPRequestHandler):
             except PermissionError:
                 self.send_error(401)
                 return
-            payload = dict(METRICS)
-            payload["history"] = {
-                k: sorted(v.items()) for k, v in METRICS_HISTORY.items()
-            }
+            snapshot = collect()
+            payload = dict(snapshot["counters"])
+            payload["history"] = snapshot["history"]
             self._send_json(payload)
             return
         if self.path == "/metrics_prom":
@@ -374,7 +635,7 @@ class Handler(BaseHTTPRequestHandler):
             except PermissionError:
                 self.send_error(401)
                 return
-            data = _prometheus_metrics().encode()
+            data = render_metrics(collect()).encode()
             self.send_response(200)
             self.send_header("Content-Type", "text/plain; version=0.0.4")
             self.send_header("Content-Length", str(len(data)))
@@ -435,25 +696,13 @@ class Handler(BaseHTTPRequestHandler):
             self._send_json({"preferences": data})
             return
         if self.path.startswith("/static/"):
-            base = STATIC_ROOT.resolve()
-            rel = self.path[len("/static/") :]
-            file_path = (base / rel).resolve()
-            if not str(file_path).startswith(str(base)) or not file_path.is_file():
-                self.send_error(404)
-                return
-            self.send_response(200)
-            if file_path.suffix == ".png":
-                content_type = "image/png"
-            elif file_path.suffix == ".gltf":
-                content_type = "model/gltf+json"
-            else:
-                content_type = "text/plain"
-            self.send_header("Content-Type", content_type)
-            data = file_path.read_bytes()
-            self.send_header("Content-Length", str(len(data)))
-            self._add_cors()
-            self.end_headers()
-            self.wfile.write(data)
+            self._send_static()
+            return
+        self.send_error(404)
+
+    def do_HEAD(self):
+        if self.path.startswith("/static/"):
+            self._send_static(head=True)
             return
         self.send_error(404)
 
@@ -492,6 +741,43 @@ class Handler(BaseHTTPRequestHandler):
             pref_path.write_text(json.dumps(payload, indent=2))
             self._send_json({"ok": True})
             return
+        if self.path == "/generate/batch":
+            try:
+                # Counted below once the batch size is known
+                _check_auth(self.headers, cost=0)
+            except PermissionError:
+                self.send_error(401)
+                return
+            length = int(self.headers.get("Content-Length", 0))
+            body = self.rfile.read(length)
+            try:
+                payload = json.loads(body.decode() or "{}")
+                calls = _generate_calls(payload)
+            except json.JSONDecodeError:
+                self.send_error(400, "Invalid JSON")
+                return
+            except ValueError as exc:
+                self.send_error(400, str(exc))
+                return
+            if not calls:
+                self.send_error(400, "Empty batch")
+                return
+            if len(calls) > GENERATE_BATCH_MAX:
+                self.send_error(413, "Batch too large")
+                return
+            token = self.headers.get("Authorization", "").split(" ", 1)[1]
+            # Every prompt counts towards the rate limit, not just the request;
+            # a rejected batch counts none of them
+            try:
+                _rate_limit(token, len(calls))
+            except RuntimeError:
+                self.send_error(429, "Rate limit exceeded")
+                return
+            claims = decode_jwt(token, JWT_SECRET)
+            METRICS["generate_requests"].inc(len(calls))
+            submitted = _submit_generate(calls, claims)
+            self._send_json({"job_ids": [job_id for job_id, _cached in submitted]})
+            return
         if self.path == "/generate":
             try:
                 _check_auth(self.headers)
@@ -516,15 +802,12 @@ class Handler(BaseHTTPRequestHandler):
                 return
             token = self.headers.get("Authorization", "").split(" ", 1)[1]
             payload = decode_jwt(token, JWT_SECRET)
-            job_obj = queue.enqueue(
-                generate_job, prompt, seed, inventory, retry=DEFAULT_RETRY
-            )
-            job_obj.meta["user"] = payload.get("sub", "user")
-            job_obj.meta["prompt"] = prompt
-            job_obj.meta["seed"] = seed
-            job_obj.save_meta()
-            METRICS["generate_requests"] += 1
-            self._send_json({"job_id": job_obj.id})
+            METRICS["generate_requests"].inc()
+            ((job_id, cached),) = _submit_generate([(prompt, seed, inventory)], payload)
+            if cached is not None:
+                self._send_json({"job_id": job_id, "cached": True, "result": cached})
+            else:
+                self._send_json({"job_id": job_id})
             return
         if self.path == "/submit_example":
             length = int(self.headers.get("Content-Length", 0))
@@ -555,7 +838,7 @@ class Handler(BaseHTTPRequestHandler):
                     submissions_redis.rpush("submissions", file_name)
                 except Exception:
                     pass
-            METRICS["example_submissions"] += 1
+            METRICS["example_submissions"].inc()
             self._send_json({"ok": True})
             return
         if self.path == "/report":
@@ -587,7 +870,7 @@ class Handler(BaseHTTPRequestHandler):
             user = decode_jwt(self.headers.get("Authorization", "").split(" ", 1)[1], JWT_SECRET).get("sub", "user")
             reports.append({"user": user, "ts": int(time.time())})
             file_path.write_text(json.dumps(reports, indent=2))
-            METRICS["example_reports"] += 1
+            METRICS["example_reports"].inc()
             self._send_json({"ok": True})
             return
         if self.path == "/reports/clear":
@@ -822,8 +1105,10 @@ class Handler(BaseHTTPRequestHandler):
             except Exception:
                 self.send_error(400, "Invalid image data")
                 return
-            job_obj = queue.enqueue(detect_job, image_b64, retry=DEFAULT_RETRY)
-            METRICS["detect_requests"] += 1
+            token = self.headers.get("Authorization", "").split(" ", 1)[1]
+            target = scheduler.route(queue, "detect", decode_jwt(token, JWT_SECRET))
+            job_obj = target.enqueue(detect_job, image_b64, retry=DEFAULT_RETRY)
+            METRICS["detect_requests"].inc()
             self._send_json({"job_id": job_obj.id})
             return
         self.send_error(404)
@@ -847,8 +1132,15 @@ def run(
     cleanup_interval: int = CLEANUP_INTERVAL,
 ) -> None:
     """Start the HTTP API server."""
-    global queue, redis_conn, JWT_SECRET, RATE_LIMIT, CORS_ORIGINS, COMMENTS_ROOT, submissions_redis, PREFERENCES_ROOT
+    global queue, redis_conn, job_events, rate_limiter, JWT_SECRET, RATE_LIMIT, CORS_ORIGINS, COMMENTS_ROOT
+    global submissions_redis, PREFERENCES_ROOT, result_cache, in_flight, scheduler
     redis_conn = Redis.from_url(redis_url)
+    job_events = JobEvents(redis_conn)
+    rate_limiter = RateLimiter(redis_conn)
+    result_cache = ResultCache(redis_conn)
+    in_flight = InFlight(redis_conn)
+    scheduler = Scheduler(redis_conn)
+    start_flusher()
     queue = Queue(queue_name, connection=redis_conn)
     JWT_SECRET = jwt_secret
     RATE_LIMIT = rate_limit
@@ -870,7 +1162,7 @@ def run(
     setup_logging(log_level, log_file)
     if cleanup_interval > 0:
         _start_cleanup_thread(Path(static_root or STATIC_ROOT), cleanup_days, cleanup_interval)
-    server = HTTPServer((host, port), Handler)
+    server = GatewayServer((host, port), Handler)
     print(f"Serving on http://{host}:{port}")
     server.serve_forever()
 
@@ -1,53 +1,98 @@
 from __future__ import annotations
+from concurrent.futures import Future
 from pathlib import Path
-from backend.inference import generate
+from backend import inference, storage
+from backend.inference import export_instructions, generate, generate_batch
 from backend import STATIC_ROOT, STATIC_URL_PREFIX
-from backend.storage import maybe_upload_assets
+from backend.tracing import current, mark
 
 
 def generate_lego_model(
     prompt: str, seed: int = 42, inventory_filter: dict[str, int] | None = None
 ) -> dict:
     """Run the model and return URLs for the generated preview and models."""
-    png_path, ldr_path, gltf_path, pdf_path, brick_counts = generate(
-        prompt, seed, inventory_filter
-    )
-
-    paths = [Path(png_path)]
-    if ldr_path:
-        paths.append(Path(ldr_path))
-    if gltf_path:
-        paths.append(Path(gltf_path))
-    if pdf_path:
-        paths.append(Path(pdf_path))
-
-    urls, uploaded = maybe_upload_assets(paths)
-    pdf_url = None
-    if uploaded:
-        url_iter = iter(urls)
-        png_url = next(url_iter)
-        ldr_url = next(url_iter) if ldr_path else None
-        gltf_url = next(url_iter) if gltf_path else None
-        pdf_url = next(url_iter) if pdf_path else None
-    else:
-        rel_png = Path(png_path).resolve().relative_to(STATIC_ROOT.parent)
-        png_url = f"{STATIC_URL_PREFIX}/{rel_png.parent.name}/preview.png"
-        ldr_url = None
-        gltf_url = None
-        if ldr_path:
-            rel_ldr = Path(ldr_path).resolve().relative_to(STATIC_ROOT.parent)
-            ldr_url = f"{STATIC_URL_PREFIX}/{rel_ldr.parent.name}/model.ldr"
-        if gltf_path:
-            rel_gltf = Path(gltf_path).resolve().relative_to(STATIC_ROOT.parent)
-            gltf_url = f"{STATIC_URL_PREFIX}/{rel_gltf.parent.name}/model.gltf"
-        if pdf_path:
-            rel_pdf = Path(pdf_path).resolve().relative_to(STATIC_ROOT.parent)
-            pdf_url = f"{STATIC_URL_PREFIX}/{rel_pdf.parent.name}/instructions.pdf"
-
-    return {
-        "png_url": png_url,
-        "ldr_url": ldr_url,
-        "gltf_url": gltf_url,
-        "brick_counts": brick_counts,
-        "instructions_url": pdf_url,
-    }
+    uploads = _Uploads()
+    return uploads.urls(*generate(prompt, seed, inventory_filter, on_artifact=uploads.add))
+
+
+def generate_lego_models(
+    requests: list[tuple[str, int, dict[str, int] | None]],
+) -> list[dict]:
+    """Run ``(prompt, seed, inventory_filter)`` requests as one model batch.
+
+    Returns one :func:`generate_lego_model` result per request, in order.
+    """
+    uploads = _Uploads()
+    return [uploads.urls(*outputs) for outputs in generate_batch(requests, on_artifact=uploads.add)]
+
+
+def instructions_url(run_id: str) -> str:
+    """Return the URL the PDF instructions of run ``run_id`` are served at."""
+    if storage.S3_BUCKET:
+        return storage.url_for(f"{run_id}/instructions.pdf")
+    return f"{STATIC_URL_PREFIX}/{run_id}/instructions.pdf"
+
+
+def generate_instructions(run_id: str, ldr: str) -> str:
+    """Render and deliver the PDF instructions of run ``run_id``; return their URL."""
+    pdf_path = export_instructions(run_id, ldr)
+    if storage.S3_BUCKET:
+        return storage.upload(pdf_path, f"{run_id}/{pdf_path.name}")
+    return instructions_url(run_id)
+
+
+class _Uploads:
+    """Upload the files of generated runs to S3 as soon as each is written.
+
+    Marks ``first_artifact`` on the current trace once the first preview is
+    available: uploaded, or written to disk when S3 is not configured.
+    """
+
+    def __init__(self) -> None:
+        self.enabled = bool(storage.S3_BUCKET)
+        self._trace = current()
+        self._futures: dict[Path, Future] = {}
+
+    def add(self, path: Path) -> None:
+        """Start delivering ``path``; may be called from export threads."""
+        path = Path(path)
+        if not self.enabled:
+            if path.name == "preview.png":
+                mark("first_artifact")
+            return
+        future = storage.upload_async(path, f"{path.parent.name}/{path.name}")
+        trace = self._trace
+        if path.name == "preview.png" and trace is not None:
+            future.add_done_callback(lambda _future: trace.mark("first_artifact"))
+        self._futures[path] = future
+
+    def url(self, path: str) -> str:
+        """Return the URL of ``path``, waiting for its upload."""
+        if not self.enabled:
+            rel = Path(path).resolve().relative_to(STATIC_ROOT.parent)
+            return f"{STATIC_URL_PREFIX}/{rel.parent.name}/{rel.name}"
+        future = self._futures.get(Path(path))
+        if future is None:
+            return storage.upload(Path(path), f"{Path(path).parent.name}/{Path(path).name}")
+        return future.result()
+
+    def urls(
+        self,
+        png_path: str,
+        ldr_path: str | None,
+        gltf_path: str | None,
+        pdf_path: str | None,
+        brick_counts: dict,
+    ) -> dict:
+        """Return the URLs of one run's files once they are delivered."""
+        pdf_url = self.url(pdf_path) if pdf_path else None
+        if pdf_url is None and ldr_path and inference.DEFER_INSTRUCTIONS:
+            # Rendered later by the follow-up instructions job
+            pdf_url = instructions_url(Path(ldr_path).parent.name)
+        return {
+            "png_url": self.url(png_path),
+            "ldr_url": self.url(ldr_path) if ldr_path else None,
+            "gltf_url": self.url(gltf_path) if gltf_path else None,
+            "brick_counts": brick_counts,
+            "instructions_url": pdf_url,
+        }
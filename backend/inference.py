@@ -7,16 +7,31 @@ so the pipeline uses our open-source ILP backend.
 """
 from __future__ import annotations
 
+import threading
+import time
 import uuid
 import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable
+
 from backend import STATIC_ROOT
 
-from backend.export import ldr_to_gltf
+from backend.export import ldr_to_gltf, ldr_to_pdf
+from backend.static_files import precompress
 from backend.inventory import filter_counts
+from backend.tracing import bind, stage
 
 import backend.solver.shim  # noqa: F401  (forces monkey-patch)
 
 MODEL = None
+# Threads exporting the glTF, PDF and gzip siblings of a run concurrently
+EXPORT_THREADS = int(os.getenv("EXPORT_THREADS", "4"))
+# Leave PDF instructions to a follow-up job so results return sooner
+DEFER_INSTRUCTIONS = os.getenv("DEFER_INSTRUCTIONS", "0") == "1"
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
 
 
 # --------------------------------------------------------------------------- #
@@ -36,10 +51,27 @@ def load_model():
     return MODEL
 
 
+def warm_up() -> float:
+    """Load the model and initialise the solver; return the seconds taken.
+
+    Workers call this before taking jobs so the first generation does not
+    pay for it, and forked job processes share the loaded weights.
+    """
+    start = time.perf_counter()
+    load_model()
+    backend.solver.shim.warm_up()
+    return time.perf_counter() - start
+
+
 # --------------------------------------------------------------------------- #
 #                               Entry point                                   #
 # --------------------------------------------------------------------------- #
-def generate(prompt: str, seed: int | None = None, inventory_filter: dict[str, int] | None = None):
+def generate(
+    prompt: str,
+    seed: int | None = None,
+    inventory_filter: dict[str, int] | None = None,
+    on_artifact: Callable[[Path], None] | None = None,
+):
     """
     Generate a new LEGO structure preview.
 
@@ -51,15 +83,62 @@ def generate(prompt: str, seed: int | None = None, inventory_filter: dict[str, i
         Optional RNG seed for reproducibility.
     inventory_filter : dict[str, int] | None
         Optional inventory map to limit brick counts.
+    on_artifact : callable | None
+        Called with the path of each output file as soon as it is written,
+        possibly from another thread.
 
     Returns
     -------
-    tuple[str, str | None, str | None, dict]
-        PNG path, optional LDraw and glTF paths, and brick-count dict.
+    tuple[str, str | None, str | None, str | None, dict]
+        PNG path, optional LDraw, glTF and PDF paths, and brick-count dict.
+        The PDF path is ``None`` with ``DEFER_INSTRUCTIONS``.
     """
     model = load_model()
-    result = model.generate(prompt, seed=seed)
+    with stage("model"):
+        result = model.generate(prompt, seed=seed)
+    return _save_result(result, inventory_filter, on_artifact)
+
+
+def generate_batch(
+    requests: list[tuple[str, int | None, dict[str, int] | None]],
+    on_artifact: Callable[[Path], None] | None = None,
+) -> list[tuple[str, str | None, str | None, str | None, dict]]:
+    """
+    Generate several structures in one model call.
+
+    ``requests`` holds ``(prompt, seed, inventory_filter)`` tuples. Models
+    that provide ``generate_batch(prompts, seeds=...)`` run all prompts in
+    one batched forward pass; others are called once per prompt. Returns
+    one :func:`generate` tuple per request, in order.
+    """
+    model = load_model()
+    prompts = [prompt for prompt, _seed, _inv in requests]
+    seeds = [seed for _prompt, seed, _inv in requests]
+    with stage("model"):
+        if hasattr(model, "generate_batch"):
+            results = list(model.generate_batch(prompts, seeds=seeds))
+            if len(results) != len(requests):
+                raise RuntimeError(
+                    f"Model returned {len(results)} results for {len(requests)} prompts"
+                )
+        else:
+            results = [model.generate(prompt, seed=seed) for prompt, seed in zip(prompts, seeds)]
+    return [
+        _save_result(result, inventory_filter, on_artifact)
+        for result, (_prompt, _seed, inventory_filter) in zip(results, requests)
+    ]
+
+
+def _save_result(
+    result: dict,
+    inventory_filter: dict[str, int] | None,
+    on_artifact: Callable[[Path], None] | None = None,
+):
+    """Write one model result under a new run directory.
 
+    The exports of the LDraw file run concurrently once it is written.
+    """
+    notify = on_artifact or (lambda _path: None)
     run_id = str(uuid.uuid4())
     output_dir = STATIC_ROOT / run_id
     output_dir.mkdir(parents=True, exist_ok=True)
@@ -69,21 +148,20 @@ def generate(prompt: str, seed: int | None = None, inventory_filter: dict[str, i
     gltf_path = output_dir / "model.gltf"
     pdf_path = output_dir / "instructions.pdf"
 
-    # Always save PNG
-    png_path.write_bytes(result["png"])
+    with stage("save"):
+        # Always save PNG
+        png_path.write_bytes(result["png"])
+        notify(png_path)
+        # Save .ldr only if present
+        if result.get("ldr"):
+            ldr_path.write_text(result["ldr"])
+            notify(ldr_path)
 
-    # Save .ldr only if present
     if result.get("ldr"):
-        ldr_path.write_text(result["ldr"])
         ldr_path_str: str | None = str(ldr_path)
-        ldr_to_gltf(ldr_path, gltf_path)
-        try:
-            from backend.export import ldr_to_pdf
-
-            ldr_to_pdf(ldr_path, pdf_path)
-            pdf_path_str: str | None = str(pdf_path)
-        except Exception:
-            pdf_path_str = None
+        with stage("export"):
+            pdf_done = _export(ldr_path, gltf_path, None if DEFER_INSTRUCTIONS else pdf_path, notify)
+        pdf_path_str: str | None = str(pdf_path) if pdf_done else None
         gltf_path_str: str | None = str(gltf_path)
     else:
         ldr_path_str = None
@@ -93,3 +171,71 @@ def generate(prompt: str, seed: int | None = None, inventory_filter: dict[str, i
     counts = result.get("brick_counts", {})
     counts = filter_counts(counts, inventory_filter)
     return str(png_path), ldr_path_str, gltf_path_str, pdf_path_str, counts
+
+
+def _export(ldr_path: Path, gltf_path: Path, pdf_path: Path | None, notify: Callable[[Path], None]) -> bool:
+    """Export ``ldr_path`` to glTF, gzip siblings and, with ``pdf_path``, PDF.
+
+    The exports run concurrently; returns whether the PDF was written.
+    """
+    executor = _get_executor()
+    # gzip siblings are served to clients that accept them
+    tasks = [
+        executor.submit(bind(_export_gltf), ldr_path, gltf_path, notify),
+        executor.submit(bind(precompress), ldr_path),
+    ]
+    pdf = executor.submit(bind(_export_pdf), ldr_path, pdf_path, notify) if pdf_path else None
+    for task in tasks:
+        task.result()
+    return pdf.result() if pdf is not None else False
+
+
+def _export_gltf(ldr_path: Path, gltf_path: Path, notify: Callable[[Path], None]) -> None:
+    ldr_to_gltf(ldr_path, gltf_path)
+    notify(gltf_path)
+    precompress(gltf_path)
+
+
+def _export_pdf(ldr_path: Path, pdf_path: Path, notify: Callable[[Path], None]) -> bool:
+    try:
+        ldr_to_pdf(ldr_path, pdf_path)
+    except Exception:
+        return False
+    notify(pdf_path)
+    return True
+
+
+def export_instructions(run_id: str, ldr: str) -> Path:
+    """Write the PDF instructions of run ``run_id`` from its LDraw text.
+
+    Used by the follow-up job of ``DEFER_INSTRUCTIONS``, which may run on a
+    host without the run directory.
+    """
+    output_dir = STATIC_ROOT / Path(run_id).name
+    output_dir.mkdir(parents=True, exist_ok=True)
+    ldr_path = output_dir / "model.ldr"
+    if not ldr_path.exists():
+        ldr_path.write_text(ldr)
+    pdf_path = output_dir / "instructions.pdf"
+    with stage("export"):
+        ldr_to_pdf(ldr_path, pdf_path)
+    return pdf_path
+
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=EXPORT_THREADS, thread_name_prefix="export")
+        return _executor
+
+
+def _after_fork() -> None:
+    # The pool's threads do not exist in a forked child (RQ job process)
+    global _executor, _executor_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
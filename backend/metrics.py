@@ -0,0 +1,406 @@
+"""Metric primitives shared by the API, gateway and workers.
+
+Counters and histograms keep one cell per thread, so recording a value never
+takes a lock; reads add the cells up. Per-minute history for the analytics
+charts is a ring of ``HISTORY_MINUTES`` slots. Metrics are created through a
+:class:`Registry`, usually the process-wide :data:`REGISTRY`, which renders
+the Prometheus text format.
+
+With ``METRICS_MULTIPROC_DIR`` set, every process writes its metrics to
+``<dir>/<pid>-<id>.json`` every ``METRICS_FLUSH_INTERVAL`` seconds (RQ job
+processes when each job ends) and :func:`collect` returns the sum over all
+files, so uvicorn/gunicorn workers and RQ workers are reported as one. Files
+of processes that have exited are folded into ``dead.json``. Empty the
+directory when the deployment starts, as with ``prometheus_client``.
+"""
+from __future__ import annotations
+
+import atexit
+import bisect
+import json
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Any, Iterator, MutableMapping, Sequence
+
+try:  # pragma: no cover - not available on Windows
+    import fcntl
+except Exception:  # pragma: no cover - skip folding files of exited processes
+    fcntl = None  # type: ignore
+
+# Default latency buckets in seconds
+DEFAULT_BUCKETS: tuple[float, ...] = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+HISTORY_MINUTES = 60
+METRICS_MULTIPROC_DIR = os.getenv("METRICS_MULTIPROC_DIR")
+METRICS_FLUSH_INTERVAL = float(os.getenv("METRICS_FLUSH_INTERVAL", "5"))  # seconds
+
+log = logging.getLogger(__name__)
+
+
+class _Sharded:
+    """Fixed-width vector of numbers with one cell per thread.
+
+    Each thread only ever writes its own cell, so updates need no lock.
+    A cell left behind by a finished thread is folded into ``_retired``
+    when its thread id is reused.
+    """
+
+    def __init__(self, width: int) -> None:
+        self._width = width
+        self.reset()
+
+    def reset(self) -> None:
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._cells: dict[int, list] = {}
+        self._retired = [0] * self._width
+
+    def _cell(self) -> list:
+        try:
+            return self._local.cell
+        except AttributeError:
+            pass
+        cell = [0] * self._width
+        ident = threading.get_ident()
+        with self._lock:
+            old = self._cells.get(ident)
+            if old is not None:
+                self._retired = [a + b for a, b in zip(self._retired, old)]
+            self._cells[ident] = cell
+        self._local.cell = cell
+        return cell
+
+    def _totals(self) -> list:
+        with self._lock:
+            totals = list(self._retired)
+            cells = list(self._cells.values())
+        for cell in cells:
+            for i, value in enumerate(cell):
+                totals[i] += value
+        return totals
+
+
+class Counter(_Sharded):
+    """Monotonic counter."""
+
+    def __init__(self, name: str, help_text: str = "") -> None:
+        super().__init__(1)
+        self.name = name
+        self.help_text = help_text
+
+    def inc(self, amount: int | float = 1) -> None:
+        self._cell()[0] += amount
+
+    @property
+    def value(self) -> int | float:
+        return self._totals()[0]
+
+
+class Histogram(_Sharded):
+    """Cumulative histogram rendered in the Prometheus text format."""
+
+    def __init__(self, name: str, help_text: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # One slot per bucket, one for +Inf and the sum last
+        super().__init__(len(self.buckets) + 2)
+
+    def observe(self, value: float) -> None:
+        cell = self._cell()
+        cell[bisect.bisect_left(self.buckets, value)] += 1
+        cell[-1] += value
+
+    @contextmanager
+    def time(self) -> Iterator[None]:
+        """Observe the wall-clock duration of the ``with`` block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+    @property
+    def count(self) -> int:
+        return sum(self._totals()[:-1])
+
+    def raw(self) -> dict:
+        totals = self._totals()
+        return {"help": self.help_text, "bounds": list(self.buckets), "counts": totals[:-1], "sum": totals[-1]}
+
+    def snapshot(self) -> dict:
+        """Return cumulative bucket counts, sum and count."""
+        raw = self.raw()
+        cumulative = []
+        running = 0
+        for c in raw["counts"]:
+            running += c
+            cumulative.append(running)
+        return {"buckets": cumulative, "sum": raw["sum"], "count": running}
+
+    def render(self, prefix: str = "lego_gpt_") -> list[str]:
+        """Return Prometheus exposition lines for this histogram."""
+        return _render_histogram(f"{prefix}{self.name}", self.raw())
+
+
+class MinuteHistory:
+    """Per-minute event counts over the last ``minutes`` minutes.
+
+    A fixed ring of slots is reused as minutes pass, so recording is O(1)
+    and memory does not grow.
+    """
+
+    def __init__(self, name: str, minutes: int = HISTORY_MINUTES) -> None:
+        self.name = name
+        self.minutes = minutes
+        self.reset()
+
+    def reset(self) -> None:
+        self._lock = threading.Lock()
+        self._slots = [-1] * self.minutes
+        self._counts = [0] * self.minutes
+
+    def record(self, amount: int = 1, now: float | None = None) -> None:
+        minute = int((time.time() if now is None else now) // 60)
+        slot = minute % self.minutes
+        with self._lock:
+            if self._slots[slot] != minute:
+                self._slots[slot] = minute
+                self._counts[slot] = 0
+            self._counts[slot] += amount
+
+    def items(self, now: float | None = None) -> list[tuple[int, int]]:
+        """Return ``(minute, count)`` pairs of the window, oldest first."""
+        minute = int((time.time() if now is None else now) // 60)
+        with self._lock:
+            pairs = list(zip(self._slots, self._counts))
+        return sorted((m, c) for m, c in pairs if c and 0 <= minute - m < self.minutes)
+
+
+class Registry:
+    """Named metrics of one process.
+
+    Plain ``dict`` counters kept by other modules can be added with
+    :meth:`include` so they are exported and aggregated too.
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._metrics: dict[tuple[str, str], Counter | Histogram | MinuteHistory] = {}
+        self._included: list[MutableMapping[str, Any]] = []
+
+    def _get(self, kind: str, name: str, factory):
+        with self._lock:
+            metric = self._metrics.get((kind, name))
+            if metric is None:
+                metric = self._metrics[(kind, name)] = factory()
+            return metric
+
+    def counter(self, name: str, help_text: str = "") -> Counter:
+        return self._get("counter", name, lambda: Counter(name, help_text))
+
+    def histogram(self, name: str, help_text: str = "", buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get("histogram", name, lambda: Histogram(name, help_text, buckets))
+
+    def history(self, name: str, minutes: int = HISTORY_MINUTES) -> MinuteHistory:
+        return self._get("history", name, lambda: MinuteHistory(name, minutes))
+
+    def include(self, counters: MutableMapping[str, Any]) -> None:
+        """Export the values of a plain ``dict`` of counters."""
+        with self._lock:
+            if not any(d is counters for d in self._included):
+                self._included.append(counters)
+
+    def reset(self) -> None:
+        """Zero every metric, e.g. in a freshly forked child."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            included = list(self._included)
+        for metric in metrics:
+            metric.reset()
+        for counters in included:
+            for key in counters:
+                counters[key] = 0
+
+    def snapshot(self) -> dict:
+        """Return this process's metrics as a JSON-serialisable dict."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+            included = list(self._included)
+        snap: dict[str, dict] = {"counters": {}, "histograms": {}, "history": {}}
+        for metric in metrics:
+            if isinstance(metric, Counter):
+                snap["counters"][metric.name] = metric.value
+            elif isinstance(metric, Histogram):
+                snap["histograms"][metric.name] = metric.raw()
+            else:
+                snap["history"][metric.name] = metric.items()
+        for counters in included:
+            snap["counters"].update(counters)
+        return snap
+
+
+def merge(snapshots: Sequence[dict]) -> dict:
+    """Add up snapshots of several processes."""
+    merged: dict[str, dict] = {"counters": {}, "histograms": {}, "history": {}}
+    history: dict[str, dict[int, int]] = {}
+    for snap in snapshots:
+        for name, value in snap.get("counters", {}).items():
+            merged["counters"][name] = merged["counters"].get(name, 0) + value
+        for name, raw in snap.get("histograms", {}).items():
+            current = merged["histograms"].get(name)
+            if current is None:
+                merged["histograms"][name] = {**raw, "counts": list(raw["counts"])}
+            elif current["bounds"] == raw["bounds"]:
+                current["counts"] = [a + b for a, b in zip(current["counts"], raw["counts"])]
+                current["sum"] += raw["sum"]
+        for name, pairs in snap.get("history", {}).items():
+            buckets = history.setdefault(name, {})
+            for minute, count in pairs:
+                buckets[int(minute)] = buckets.get(int(minute), 0) + count
+    now_min = int(time.time() // 60)
+    merged["history"] = {
+        name: sorted((m, c) for m, c in buckets.items() if now_min - m < HISTORY_MINUTES)
+        for name, buckets in history.items()
+    }
+    return merged
+
+
+def _render_histogram(name: str, raw: dict) -> list[str]:
+    lines = []
+    if raw.get("help"):
+        lines.append(f"# HELP {name} {raw['help']}")
+    lines.append(f"# TYPE {name} histogram")
+    running = 0
+    for bound, count in zip(raw["bounds"], raw["counts"]):
+        running += count
+        lines.append(f'{name}_bucket{{le="{bound:g}"}} {running}')
+    running += raw["counts"][-1]
+    lines.append(f'{name}_bucket{{le="+Inf"}} {running}')
+    lines.append(f"{name}_sum {raw['sum']}")
+    lines.append(f"{name}_count {running}")
+    return lines
+
+
+def render(snapshot: dict, prefix: str = "lego_gpt_") -> str:
+    """Return ``snapshot`` in the Prometheus text format."""
+    lines = []
+    for key, val in snapshot["counters"].items():
+        lines.append(f"# TYPE {prefix}{key} counter")
+        lines.append(f"{prefix}{key} {val}")
+    for key, raw in snapshot["histograms"].items():
+        lines.extend(_render_histogram(f"{prefix}{key}", raw))
+    return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+_process_id = uuid.uuid4().hex[:8]
+_flusher: threading.Thread | None = None
+
+
+def _snapshot_path(directory: str) -> Path:
+    return Path(directory) / f"{os.getpid()}-{_process_id}.json"
+
+
+def flush(directory: str | None = None) -> None:
+    """Write this process's snapshot to the multiprocess directory."""
+    directory = directory or METRICS_MULTIPROC_DIR
+    if not directory:
+        return
+    path = _snapshot_path(directory)
+    tmp = path.with_suffix(".tmp")
+    try:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp.write_text(json.dumps(REGISTRY.snapshot()))
+        os.replace(tmp, path)
+    except OSError:
+        log.warning("Could not write metrics to %s", path, exc_info=True)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def _read(path: Path) -> dict | None:
+    try:
+        return json.loads(path.read_text())
+    except (OSError, ValueError):
+        return None
+
+
+def collect(directory: str | None = None) -> dict:
+    """Return the metrics of this process, or of all processes sharing ``directory``."""
+    directory = directory or METRICS_MULTIPROC_DIR
+    if not directory:
+        return REGISTRY.snapshot()
+    flush(directory)
+    root = Path(directory)
+    live: list[dict] = []
+    dead: list[dict] = []
+    dead_paths: list[Path] = []
+    lock_file = open(root / ".lock", "a")
+    try:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        for path in root.glob("*.json"):
+            snap = _read(path)
+            if snap is None:
+                continue
+            pid = path.stem.split("-", 1)[0]
+            if path.name == "dead.json" or not pid.isdigit():
+                dead.append(snap)
+            elif fcntl is not None and not _alive(int(pid)):
+                dead.append(snap)
+                dead_paths.append(path)
+            else:
+                live.append(snap)
+        folded = merge(dead)
+        if dead_paths:
+            (root / "dead.tmp").write_text(json.dumps(folded))
+            os.replace(root / "dead.tmp", root / "dead.json")
+            for path in dead_paths:
+                path.unlink(missing_ok=True)
+    finally:
+        lock_file.close()
+    return merge([folded, *live])
+
+
+def _flush_loop(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        flush()
+
+
+def start_flusher(interval: float = METRICS_FLUSH_INTERVAL) -> None:
+    """Flush this process's metrics periodically and at exit."""
+    global _flusher
+    if not METRICS_MULTIPROC_DIR or (_flusher is not None and _flusher.is_alive()):
+        return
+    _flusher = threading.Thread(target=_flush_loop, args=(interval,), name="metrics-flush", daemon=True)
+    _flusher.start()
+    atexit.register(flush)
+
+
+def _after_fork() -> None:
+    # A forked child (gunicorn worker, RQ job process) starts from zero and
+    # writes its own file; the parent keeps reporting what it recorded.
+    global _process_id, _flusher
+    _process_id = uuid.uuid4().hex[:8]
+    _flusher = None
+    # Another thread may have held the lock when the process forked
+    REGISTRY._lock = threading.Lock()
+    REGISTRY.reset()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
@@ -4,7 +4,7 @@ import json
 import os
 from typing import Set
 
-from backend.gateway import METRICS
+from backend.metrics import collect
 
 try:
     import websockets
@@ -19,7 +19,7 @@ _clients: Set[WebSocketServerProtocol] = set()  # type: ignore
 async def _handler(ws: WebSocketServerProtocol, path: str) -> None:
     _clients.add(ws)
     try:
-        await ws.send(json.dumps(METRICS))
+        await ws.send(json.dumps(collect()["counters"]))
         async for _ in ws:
             pass
     finally:
@@ -29,7 +29,7 @@ async def _handler(ws: WebSocketServerProtocol, path: str) -> None:
 async def _broadcast_loop() -> None:
     prev = None
     while True:
-        data = json.dumps(METRICS)
+        data = json.dumps(collect()["counters"])
         if data != prev:
             for ws in list(_clients):
                 try:
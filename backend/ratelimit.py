@@ -0,0 +1,224 @@
+"""Per-token rate limiting shared by every API replica through Redis.
+
+Each token may make ``limit`` requests per sliding ``RATE_LIMIT_WINDOW``
+seconds, estimated from the counters of the current and the previous fixed
+window as in most production limiters. The counters live in Redis and are
+checked and incremented by a single Lua script, so replicas behind a load
+balancer enforce one global limit.
+
+To avoid a Redis round trip per request, a token that is well under its
+limit is granted a lease of ``RATE_LIMIT_LEASE`` of its remaining budget
+(at most ``RATE_LIMIT_LEASE_MAX`` requests), which the process then admits
+locally. Leases shrink to one request as the limit nears and unused ones
+lapse with their window, so they can only make the limit stricter, never
+looser. Local state is an LRU of at most ``RATE_LIMIT_LOCAL_SIZE`` tokens.
+A hit may count several requests at once, such as the prompts of a batch;
+they are admitted or rejected together.
+
+When Redis is unavailable requests are counted per process instead, and
+Redis is tried again after ``_RETRY_DELAY`` seconds. Counters live in
+:data:`METRICS` and are exported next to the API metrics.
+"""
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any
+
+from backend.metrics import REGISTRY
+
+RATE_LIMIT_WINDOW = int(os.getenv("RATE_LIMIT_WINDOW", "60"))  # seconds
+# Share of a token's remaining budget leased to a process per round trip
+RATE_LIMIT_LEASE = float(os.getenv("RATE_LIMIT_LEASE", "0.1"))
+RATE_LIMIT_LEASE_MAX = int(os.getenv("RATE_LIMIT_LEASE_MAX", "50"))
+RATE_LIMIT_LOCAL_SIZE = int(os.getenv("RATE_LIMIT_LOCAL_SIZE", "10000"))
+RATE_LIMIT_PREFIX = os.getenv("RATE_LIMIT_PREFIX", "legogpt:ratelimit:")
+# Seconds to count locally before trying Redis again after an error
+_RETRY_DELAY = 5.0
+
+METRICS = {
+    "rate_limit_local": 0,
+    "rate_limit_redis": 0,
+    "rate_limit_fallback": 0,
+}
+REGISTRY.include(METRICS)
+
+# KEYS: counter of the current window, counter of the previous window
+# ARGV: limit, elapsed fraction of the current window, lease share,
+#       largest lease, counter TTL in milliseconds, requests needed
+# Returns the number of requests granted, at least the number needed, or 0
+# if that would exceed the limit.
+LEASE_SCRIPT = """
+local limit = tonumber(ARGV[1])
+local need = tonumber(ARGV[6])
+local current = tonumber(redis.call('GET', KEYS[1]) or '0')
+local previous = tonumber(redis.call('GET', KEYS[2]) or '0')
+local remaining = math.floor(limit - current - previous * (1 - tonumber(ARGV[2])))
+if remaining < need then
+    return 0
+end
+local grant = math.floor(remaining * tonumber(ARGV[3]))
+grant = math.max(need, math.min(grant, tonumber(ARGV[4])))
+if redis.call('INCRBY', KEYS[1], grant) == grant then
+    redis.call('PEXPIRE', KEYS[1], ARGV[5])
+end
+return grant
+"""
+
+log = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """Sliding-window limiter backed by Redis with local leases.
+
+    ``conn`` is a Redis client and ``async_conn`` an optional
+    ``redis.asyncio`` client used by :meth:`ahit`.
+    """
+
+    def __init__(
+        self,
+        conn: Any,
+        async_conn: Any = None,
+        *,
+        window: int = RATE_LIMIT_WINDOW,
+        lease: float = RATE_LIMIT_LEASE,
+        lease_max: int = RATE_LIMIT_LEASE_MAX,
+        local_size: int = RATE_LIMIT_LOCAL_SIZE,
+        prefix: str = RATE_LIMIT_PREFIX,
+    ) -> None:
+        self._conn = conn
+        self._async_conn = async_conn
+        self._script = None
+        self._async_script = None
+        self.window = window
+        self.lease = lease
+        self.lease_max = max(1, lease_max)
+        self.local_size = max(1, local_size)
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        # key -> [window, leased requests left]
+        self._leases: OrderedDict[str, list[int]] = OrderedDict()
+        # key -> [window, current count, previous count] without Redis
+        self._counts: OrderedDict[str, list[int]] = OrderedDict()
+        self._retry_at = 0.0
+
+    def clear(self) -> None:
+        """Forget all local leases and counts."""
+        with self._lock:
+            self._leases.clear()
+            self._counts.clear()
+
+    def _key(self, token: str) -> str:
+        # Tokens are credentials, so only a digest is stored in Redis
+        return hashlib.blake2b(token.encode(), digest_size=16).hexdigest()
+
+    def _touch(self, table: OrderedDict, key: str, value: list[int]) -> None:
+        table[key] = value
+        table.move_to_end(key)
+        while len(table) > self.local_size:
+            table.popitem(last=False)
+
+    def _take_lease(self, key: str, window: int, count: int) -> bool:
+        with self._lock:
+            lease = self._leases.get(key)
+            if lease is None or lease[0] != window or lease[1] < count:
+                return False
+            lease[1] -= count
+            self._leases.move_to_end(key)
+            METRICS["rate_limit_local"] += 1
+            return True
+
+    def _store_lease(self, key: str, window: int, granted: int, count: int) -> bool:
+        METRICS["rate_limit_redis"] += 1
+        with self._lock:
+            if granted < count:
+                return False
+            lease = self._leases.get(key)
+            if lease is not None and lease[0] == window:
+                # Another thread's lease for this window; keep both
+                granted += lease[1]
+            self._touch(self._leases, key, [window, granted - count])
+            return True
+
+    def _script_args(self, key: str, limit: int, now: float, count: int) -> tuple[list[str], list]:
+        window = int(now // self.window)
+        elapsed = now / self.window - window
+        keys = [f"{self.prefix}{key}:{window}", f"{self.prefix}{key}:{window - 1}"]
+        return keys, [limit, elapsed, self.lease, self.lease_max, self.window * 2000, count]
+
+    def _local_hit(self, key: str, limit: int, now: float, count: int) -> bool:
+        """Count ``key`` in this process only; used without Redis."""
+        window = int(now // self.window)
+        elapsed = now / self.window - window
+        with self._lock:
+            METRICS["rate_limit_fallback"] += 1
+            entry = self._counts.get(key)
+            if entry is None or entry[0] < window - 1:
+                entry = [window, 0, 0]
+            elif entry[0] == window - 1:
+                entry = [window, 0, entry[1]]
+            self._touch(self._counts, key, entry)
+            if entry[1] + entry[2] * (1 - elapsed) + count > limit:
+                return False
+            entry[1] += count
+            return True
+
+    def _failed(self) -> None:
+        log.warning("Rate limiter cannot reach Redis, counting per process", exc_info=True)
+        self._retry_at = time.monotonic() + _RETRY_DELAY
+
+    def _call(self, keys: list[str], args: list) -> int:
+        if self._script is None:
+            self._script = self._conn.register_script(LEASE_SCRIPT)
+        return int(self._script(keys=keys, args=args))
+
+    async def _acall(self, keys: list[str], args: list) -> int:
+        if self._async_conn is None:
+            return await asyncio.to_thread(self._call, keys, args)
+        if self._async_script is None:
+            self._async_script = self._async_conn.register_script(LEASE_SCRIPT)
+        return int(await self._async_script(keys=keys, args=args))
+
+    def hit(self, token: str, limit: int, count: int = 1) -> bool:
+        """Record ``count`` requests for ``token``; return ``False`` if over ``limit``.
+
+        Rejected requests are not recorded.
+        """
+        now = time.time()
+        key = self._key(token)
+        window = int(now // self.window)
+        if self._take_lease(key, window, count):
+            return True
+        if time.monotonic() >= self._retry_at:
+            try:
+                granted = self._call(*self._script_args(key, limit, now, count))
+            except Exception:
+                self._failed()
+            else:
+                return self._store_lease(key, window, granted, count)
+        return self._local_hit(key, limit, now, count)
+
+    async def ahit(self, token: str, limit: int, count: int = 1) -> bool:
+        """Like :meth:`hit` but without blocking the event loop.
+
+        Leases and local counts are checked inline; only the Redis call is
+        awaited, in a thread if there is no asyncio client.
+        """
+        now = time.time()
+        key = self._key(token)
+        window = int(now // self.window)
+        if self._take_lease(key, window, count):
+            return True
+        if time.monotonic() >= self._retry_at:
+            try:
+                granted = await self._acall(*self._script_args(key, limit, now, count))
+            except Exception:
+                self._failed()
+            else:
+                return self._store_lease(key, window, granted, count)
+        return self._local_hit(key, limit, now, count)
@@ -0,0 +1,329 @@
+"""Cache of generation results keyed by their inputs, finished or in flight.
+
+``generate_lego_model`` is deterministic for a prompt, seed, inventory and
+model/solver version, so popular example prompts and client retries can be
+answered with the asset URLs of an earlier run instead of running the model
+again. Workers store each result in Redis under a hash of those inputs and
+``POST /generate`` looks it up before enqueuing.
+
+Entries must never outlive the run directory their URLs point at. They
+expire after ``RESULT_CACHE_TTL`` seconds, by default an hour less than the
+``CLEANUP_DAYS`` after which ``lego-gpt-cleanup`` removes run directories,
+and :func:`backend.cleanup.cleanup` also forgets the entries of every
+directory it removes. Set ``RESULT_CACHE_TTL=0`` to disable the cache.
+
+Requests arriving while an identical job is still queued or running are
+coalesced onto that job: :class:`InFlight` maps the same key to the job ID
+until a worker finishes it, so one model run serves every such request.
+Set ``COALESCE_TTL=0`` to disable coalescing.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import logging
+import os
+import time
+import unicodedata
+import uuid
+from typing import Any, Iterable
+
+from redis import Redis
+
+from backend import REDIS_URL, __version__
+from backend.inventory import get_inventory
+from backend.metrics import REGISTRY
+
+CLEANUP_DAYS = int(os.getenv("CLEANUP_DAYS", "7"))
+RESULT_CACHE_TTL = int(os.getenv("RESULT_CACHE_TTL", str(max(0, CLEANUP_DAYS * 86400 - 3600))))
+RESULT_CACHE_PREFIX = os.getenv("RESULT_CACHE_PREFIX", "legogpt:result:")
+# Bump to invalidate every cached result, e.g. after changing model weights
+RESULT_CACHE_VERSION = os.getenv("RESULT_CACHE_VERSION", "1")
+# Job IDs returned for cache hits; GET /generate/<id> reads the cache
+CACHED_JOB_PREFIX = "cached-"
+# Upper bound on how long a job counts as in flight if no worker releases it
+COALESCE_TTL = int(os.getenv("COALESCE_TTL", "3600"))
+# Job statuses that will not produce a result
+_DEAD_STATUSES = {"failed", "stopped", "canceled"}
+# Seconds a claimed job may take to appear in Redis before it counts as lost
+_ENQUEUE_GRACE = 30
+
+METRICS = {
+    "result_cache_hits": 0,
+    "result_cache_misses": 0,
+    "generate_coalesced": 0,
+}
+REGISTRY.include(METRICS)
+
+log = logging.getLogger(__name__)
+
+
+def normalize_prompt(prompt: str) -> str:
+    """Return ``prompt`` in NFC form with runs of whitespace collapsed.
+
+    Case is kept since the model is case sensitive.
+    """
+    return " ".join(unicodedata.normalize("NFC", prompt).split())
+
+
+def model_version() -> str:
+    """Return the backend, model and solver versions results depend on."""
+    return ":".join(
+        (
+            __version__,
+            RESULT_CACHE_VERSION,
+            os.getenv("LEGOGPT_MODEL", "stub"),
+            os.getenv("ORTOOLS_ENGINE", "HIGHs"),
+        )
+    )
+
+
+def result_key(prompt: str, seed: int | None, inventory_filter: dict[str, int] | None) -> str:
+    """Return the cache key of a generation request."""
+    # Without a filter the counts are trimmed to the global inventory
+    inventory = inventory_filter if inventory_filter is not None else {"default": get_inventory()}
+    payload = json.dumps(
+        [normalize_prompt(prompt), seed, inventory, model_version()],
+        sort_keys=True,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def run_id(result: dict) -> str | None:
+    """Return the run directory name of a ``generate_lego_model`` result."""
+    url = result.get("png_url") or ""
+    parts = url.rsplit("/", 2)
+    return parts[-2] if len(parts) == 3 else None
+
+
+class ResultCache:
+    """Generation results in Redis with a reverse index by run directory."""
+
+    def __init__(self, conn: Any, ttl: int = RESULT_CACHE_TTL, prefix: str = RESULT_CACHE_PREFIX) -> None:
+        self.conn = conn
+        self.ttl = ttl
+        self.prefix = prefix
+
+    @property
+    def enabled(self) -> bool:
+        return self.conn is not None and self.ttl > 0
+
+    def get(self, key: str) -> dict | None:
+        """Return the result cached under ``key`` or ``None``."""
+        return self.get_many([key])[0]
+
+    def get_many(self, keys: list[str]) -> list[dict | None]:
+        """Return the result cached under each of ``keys``, ``None`` if missing."""
+        if not self.enabled or not keys:
+            return [None] * len(keys)
+        try:
+            raws = self.conn.mget([self.prefix + key for key in keys])
+        except Exception:
+            log.warning("Result cache lookup failed", exc_info=True)
+            raws = [None] * len(keys)
+        results = [json.loads(raw) if raw else None for raw in raws]
+        hits = sum(result is not None for result in results)
+        METRICS["result_cache_hits"] += hits
+        METRICS["result_cache_misses"] += len(keys) - hits
+        return results
+
+    def put(self, key: str, result: dict) -> None:
+        """Cache ``result`` under ``key`` for ``ttl`` seconds."""
+        run = run_id(result)
+        if not self.enabled or run is None:
+            return
+        try:
+            with self.conn.pipeline() as pipe:
+                pipe.set(self.prefix + key, json.dumps(result), ex=self.ttl)
+                pipe.set(f"{self.prefix}run:{run}", key, ex=self.ttl)
+                pipe.execute()
+        except Exception:
+            log.warning("Could not cache generation result", exc_info=True)
+
+    def forget_runs(self, runs: Iterable[str]) -> None:
+        """Drop the entries pointing at the run directories ``runs``."""
+        run_keys = [f"{self.prefix}run:{run}" for run in runs]
+        if self.conn is None or not run_keys:
+            return
+        try:
+            keys = self.conn.mget(run_keys)
+            with self.conn.pipeline() as pipe:
+                for key in keys:
+                    if key:
+                        pipe.delete(self.prefix + (key.decode() if isinstance(key, bytes) else key))
+                pipe.delete(*run_keys)
+                pipe.execute()
+        except Exception:
+            log.warning("Could not remove cached results of deleted runs", exc_info=True)
+
+
+class InFlight:
+    """Single-flight registry of generation jobs by request key.
+
+    ``conn`` must be the Redis client of the job queue, since the status of
+    registered jobs is read from their RQ hashes.
+    """
+
+    def __init__(self, conn: Any, ttl: int = COALESCE_TTL, prefix: str = RESULT_CACHE_PREFIX) -> None:
+        self.conn = conn
+        self.ttl = ttl
+        self.prefix = f"{prefix}inflight:"
+
+    @property
+    def enabled(self) -> bool:
+        return self.conn is not None and self.ttl > 0
+
+    def claim_many(self, keys: list[str]) -> list[tuple[str, bool]]:
+        """Return ``(job_id, new)`` for each of ``keys``.
+
+        ``new`` is ``True`` if the caller must enqueue a job with ``job_id``
+        and ``False`` if an identical job, possibly one claimed earlier in
+        ``keys``, is already queued or running under ``job_id``. Jobs that
+        failed or were stopped are replaced.
+        """
+        job_ids = [str(uuid.uuid4()) for _ in keys]
+        if not self.enabled or not keys:
+            return [(job_id, True) for job_id in job_ids]
+        # Values are "<job id> <claim time>"
+        values = [f"{job_id} {time.time():.0f}" for job_id in job_ids]
+        try:
+            with self.conn.pipeline() as pipe:
+                for key, value in zip(keys, values):
+                    pipe.set(self.prefix + key, value, nx=True, ex=self.ttl)
+                claimed = pipe.execute()
+            claims = []
+            for key, job_id, value, new in zip(keys, job_ids, values, claimed):
+                if not new:
+                    current = self._live_job(key)
+                    if current is not None:
+                        METRICS["generate_coalesced"] += 1
+                        claims.append((current, False))
+                        continue
+                    self.conn.set(self.prefix + key, value, ex=self.ttl)
+                claims.append((job_id, True))
+            return claims
+        except Exception:
+            log.warning("Could not coalesce generation requests", exc_info=True)
+            return [(job_id, True) for job_id in job_ids]
+
+    def _current(self, key: str) -> tuple[str, float] | None:
+        raw = self.conn.get(self.prefix + key)
+        if not raw:
+            return None
+        job_id, _, claimed_at = (raw.decode() if isinstance(raw, bytes) else raw).partition(" ")
+        return job_id, float(claimed_at or 0)
+
+    def _live_job(self, key: str) -> str | None:
+        current = self._current(key)
+        if current is None:
+            return None
+        job_id, claimed_at = current
+        status = self.conn.hget(f"rq:job:{job_id}", "status")
+        if status is None:
+            # Still being enqueued, unless it should have been long ago
+            return job_id if time.time() - claimed_at < _ENQUEUE_GRACE else None
+        status = status.decode() if isinstance(status, bytes) else status
+        return None if status in _DEAD_STATUSES else job_id
+
+    def release(self, key: str, job_id: str) -> None:
+        """Forget ``key`` if it still maps to ``job_id``."""
+        if not self.enabled:
+            return
+        try:
+            current = self._current(key)
+            if current is not None and current[0] == job_id:
+                self.conn.delete(self.prefix + key)
+        except Exception:
+            log.warning("Could not release in-flight generation job", exc_info=True)
+
+
+class Claims:
+    """Outcome of looking up ``generate_job`` calls, see :func:`claim_jobs`."""
+
+    def __init__(self, keys: list[str], cached: list[dict | None], claims: dict[int, tuple[str, bool]]) -> None:
+        self.keys = keys
+        self.cached = cached
+        self.claims = claims
+        # Indices of the calls that need a new job
+        self.new = [i for i, (_job_id, new) in claims.items() if new]
+
+
+def claim_jobs(calls: list[tuple], cache: ResultCache, in_flight: InFlight) -> Claims:
+    """Look ``generate_job`` calls up in ``cache`` and claim the rest in ``in_flight``.
+
+    Calls whose result is neither cached nor already being generated end up
+    in :attr:`Claims.new`. The caller must pass the claims to
+    :func:`enqueue_claimed`, which enqueues those calls.
+    """
+    keys = [result_key(*call) for call in calls]
+    cached = cache.get_many(keys)
+    pending = [i for i, result in enumerate(cached) if result is None]
+    return Claims(keys, cached, dict(zip(pending, in_flight.claim_many([keys[i] for i in pending]))))
+
+
+def enqueue_claimed(
+    queue: Any,
+    func: Any,
+    calls: list[tuple],
+    metas: list[dict],
+    claimed: Claims,
+    in_flight: InFlight,
+    **enqueue_kwargs: Any,
+) -> list[tuple[str, dict | None]]:
+    """Enqueue the new calls of ``claimed`` on ``queue``; see :func:`submit_jobs`."""
+    keys, cached, claims, new = claimed.keys, claimed.cached, claimed.claims, claimed.new
+    job_ids = {i: job_id for i, (job_id, _new) in claims.items()}
+    try:
+        if len(new) == 1:
+            (i,) = new
+            job = queue.enqueue(
+                func, *calls[i], job_id=job_ids[i], meta={**metas[i], "result_key": keys[i]}, **enqueue_kwargs
+            )
+            job_ids[i] = job.id
+        elif new:
+            jobs = queue.enqueue_many(
+                [
+                    queue.prepare_data(
+                        func,
+                        calls[i],
+                        job_id=job_ids[i],
+                        meta={**metas[i], "result_key": keys[i]},
+                        **enqueue_kwargs,
+                    )
+                    for i in new
+                ]
+            )
+            job_ids.update((i, job.id) for i, job in zip(new, jobs))
+    except Exception:
+        for i in new:
+            in_flight.release(keys[i], claims[i][0])
+        raise
+    return [
+        (CACHED_JOB_PREFIX + key, result) if result is not None else (job_ids[i], None)
+        for i, (key, result) in enumerate(zip(keys, cached))
+    ]
+
+
+def submit_jobs(
+    queue: Any,
+    func: Any,
+    calls: list[tuple],
+    metas: list[dict],
+    cache: ResultCache,
+    in_flight: InFlight,
+    **enqueue_kwargs: Any,
+) -> list[tuple[str, dict | None]]:
+    """Return ``(job_id, cached result)`` for each ``generate_job`` call.
+
+    Calls with a cached result get a :data:`CACHED_JOB_PREFIX` ID and the
+    result, calls identical to a job in flight share its ID, and only the
+    remaining ones are enqueued on ``queue``. Each job's meta records its
+    ``result_key`` so the worker caches and releases it under the same key.
+    """
+    claimed = claim_jobs(calls, cache, in_flight)
+    return enqueue_claimed(queue, func, calls, metas, claimed, in_flight, **enqueue_kwargs)
+
+
+# The queue Redis, which the API, gateway and workers keep the cache in too
+result_cache = ResultCache(Redis.from_url(REDIS_URL))
@@ -0,0 +1,182 @@
+"""Route jobs to queues by type, cost and user, and weight worker queues.
+
+With one FIFO queue a burst of slow generations delays every inventory
+detection queued behind it. With ``JOB_ROUTING`` on (the default) the API
+instead puts each job on one of four queues derived from ``QUEUE_NAME``:
+
+``<name>-detect``
+    Inventory detections.
+``<name>-high``
+    Generations of users whose JWT ``tier`` claim is in
+    ``SCHED_PRIORITY_TIERS``, and of admins.
+``<name>``
+    Other generations.
+``<name>-bulk``
+    Generations whose estimated cost (prompt words plus inventory part types)
+    reaches ``SCHED_LARGE_COST``.
+
+Users that submitted more than ``SCHED_FAIR_SHARE`` generations within the
+current ``SCHED_FAIR_WINDOW`` seconds drop one queue for the rest of the
+window, so one heavy user cannot hold up everyone else. Counters are shared
+through Redis; without Redis nobody is demoted.
+
+Workers subscribe to several queues with weights (``name=weight,...``). Each
+time a worker takes a job its queues are reordered at random with a queue's
+chance of coming first proportional to its weight, so lower priority queues
+are served less often but never starved. Queues without jobs are skipped.
+"""
+from __future__ import annotations
+
+import logging
+import os
+import random
+import time
+from typing import Any
+
+from rq import Queue
+
+from backend.metrics import REGISTRY
+
+JOB_ROUTING = os.getenv("JOB_ROUTING", "1") not in {"", "0", "false", "False"}
+SCHED_PRIORITY_TIERS = frozenset(filter(None, os.getenv("SCHED_PRIORITY_TIERS", "priority,pro").split(",")))
+SCHED_LARGE_COST = float(os.getenv("SCHED_LARGE_COST", "64"))
+SCHED_FAIR_SHARE = int(os.getenv("SCHED_FAIR_SHARE", "20"))
+SCHED_FAIR_WINDOW = int(os.getenv("SCHED_FAIR_WINDOW", "60"))  # seconds
+SCHED_PREFIX = os.getenv("SCHED_PREFIX", "legogpt:sched:")
+
+# Queue name suffix of each class, from most to least urgent
+QUEUE_SUFFIXES = {"detect": "-detect", "high": "-high", "normal": "", "bulk": "-bulk"}
+# Generation class a user over their fair share drops to
+_DEMOTED = {"high": "normal", "normal": "bulk", "bulk": "bulk"}
+# Default weights of the queues a generation worker takes jobs from
+GENERATE_WEIGHTS = {"high": 4.0, "normal": 2.0, "bulk": 1.0}
+
+METRICS = {f"jobs_routed_{name}": 0 for name in QUEUE_SUFFIXES}
+METRICS["jobs_demoted"] = 0
+REGISTRY.include(METRICS)
+
+log = logging.getLogger(__name__)
+
+
+def queue_name(base: str, job_class: str) -> str:
+    """Return the name of the ``job_class`` queue derived from ``base``."""
+    return base + QUEUE_SUFFIXES[job_class]
+
+
+def estimate_cost(prompt: str, inventory_filter: dict[str, int] | None = None) -> float:
+    """Return a rough relative cost of generating ``prompt``.
+
+    Longer prompts tend to describe bigger models and every part type of an
+    inventory filter adds solver constraints.
+    """
+    return float(len(prompt.split()) + len(inventory_filter or {}))
+
+
+def parse_weights(spec: str) -> list[tuple[str, float]]:
+    """Parse ``"name=weight,name"`` into ``(name, weight)`` pairs.
+
+    A missing weight means 1. Raises :class:`ValueError` for a malformed
+    spec or a weight that is not positive.
+    """
+    queues = []
+    for item in spec.split(","):
+        name, _, weight = item.strip().partition("=")
+        if not name:
+            raise ValueError(f"Invalid queue spec: {spec!r}")
+        value = float(weight) if weight else 1.0
+        if value <= 0:
+            raise ValueError(f"Queue weight must be positive: {item!r}")
+        queues.append((name, value))
+    return queues
+
+
+def default_weights(base: str, detect: bool = False) -> list[tuple[str, float]]:
+    """Return the weighted queues a worker for ``base`` takes jobs from.
+
+    Generation workers take the generation queues; with ``detect`` the
+    detection queue only. Without ``JOB_ROUTING`` both use ``base`` alone.
+    """
+    if not JOB_ROUTING:
+        return [(base, 1.0)]
+    if detect:
+        return [(queue_name(base, "detect"), 1.0)]
+    return [(queue_name(base, name), weight) for name, weight in GENERATE_WEIGHTS.items()]
+
+
+def weighted_order(items: list, weights: list[float], rng: random.Random | Any = random) -> list:
+    """Return ``items`` shuffled so each comes first with a chance proportional to its weight."""
+    keys = [rng.random() ** (1.0 / weight) for weight in weights]
+    return [item for _key, item in sorted(zip(keys, items), key=lambda pair: pair[0], reverse=True)]
+
+
+class Scheduler:
+    """Pick the queue of each new job.
+
+    ``conn`` is the Redis client holding the fair-share counters.
+    """
+
+    def __init__(
+        self,
+        conn: Any,
+        enabled: bool = JOB_ROUTING,
+        fair_share: int = SCHED_FAIR_SHARE,
+        window: int = SCHED_FAIR_WINDOW,
+        large_cost: float = SCHED_LARGE_COST,
+        priority_tiers: frozenset[str] = SCHED_PRIORITY_TIERS,
+        prefix: str = SCHED_PREFIX,
+    ) -> None:
+        self.conn = conn
+        self.enabled = enabled
+        self.fair_share = fair_share
+        self.window = window
+        self.large_cost = large_cost
+        self.priority_tiers = priority_tiers
+        self.prefix = prefix
+
+    def job_class(self, kind: str, claims: dict, cost: float = 0.0, count: int = 1) -> str:
+        """Return the queue class of ``count`` ``kind`` jobs of the user with ``claims``.
+
+        ``kind`` is ``"generate"`` or ``"detect"``. Generations are counted
+        towards the user's fair share.
+        """
+        if kind == "detect":
+            return "detect"
+        if cost >= self.large_cost:
+            job_class = "bulk"
+        elif claims.get("tier") in self.priority_tiers or claims.get("role") == "admin":
+            job_class = "high"
+        else:
+            job_class = "normal"
+        if self._charge(str(claims.get("sub", "user")), count) > self.fair_share > 0:
+            METRICS["jobs_demoted"] += count
+            job_class = _DEMOTED[job_class]
+        return job_class
+
+    def route(self, queue: Any, kind: str, claims: dict, cost: float = 0.0, count: int = 1) -> Any:
+        """Return the queue for ``count`` ``kind`` jobs, a sibling of ``queue``.
+
+        ``queue`` itself takes normal generations, and every job while
+        routing is off.
+        """
+        if not self.enabled:
+            return queue
+        job_class = self.job_class(kind, claims, cost, count)
+        METRICS[f"jobs_routed_{job_class}"] += count
+        if job_class == "normal":
+            return queue
+        return Queue(queue_name(queue.name, job_class), connection=queue.connection)
+
+    def _charge(self, user: str, count: int) -> int:
+        """Add ``count`` jobs to ``user``'s window and return its total."""
+        if self.conn is None or self.fair_share <= 0:
+            return 0
+        key = f"{self.prefix}share:{user}:{int(time.time() // self.window)}"
+        try:
+            with self.conn.pipeline() as pipe:
+                pipe.incrby(key, count)
+                pipe.expire(key, self.window)
+                total, _ = pipe.execute()
+            return int(total)
+        except Exception:
+            log.warning("Could not count fair-share usage", exc_info=True)
+            return 0
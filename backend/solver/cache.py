@@ -0,0 +1,148 @@
+"""Cache of stability results keyed by a canonical structure hash.
+
+Retries, regenerations with the same seed and popular example prompts
+often ask the solver about a structure it has already seen. Results are
+kept in a bounded in-process LRU and, when ``SOLVER_CACHE_REDIS_URL`` is
+set, in Redis so that every worker can reuse them.
+
+The key ignores brick order, so cached entries store the kept bricks as
+indices into the sorted brick list. Only MIP results the solver reports
+as ``OPTIMAL`` are cached, which means optimal within ``SOLVER_MIP_GAP``:
+the greedy fallback and time-limited incumbents depend on brick order and
+solve time, so another ordering could get a different answer.
+Hit/miss/eviction counters live in :data:`METRICS` and are exported next
+to the API metrics through ``backend.metrics.REGISTRY``.
+"""
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from typing import Any, Sequence
+
+from redis import Redis
+
+from backend.metrics import REGISTRY
+
+SOLVER_CACHE_SIZE = int(os.getenv("SOLVER_CACHE_SIZE", "1024"))
+SOLVER_CACHE_REDIS_URL = os.getenv("SOLVER_CACHE_REDIS_URL")
+SOLVER_CACHE_TTL = int(os.getenv("SOLVER_CACHE_TTL", "86400"))  # seconds
+
+METRICS = {
+    "solver_cache_hits": 0,
+    "solver_cache_misses": 0,
+    "solver_cache_evictions": 0,
+}
+REGISTRY.include(METRICS)
+
+
+def _canonical(bricks: Sequence[Any]) -> list[tuple[int, int, int, int, int]]:
+    return sorted((b.h, b.w, b.x, b.y, b.z) for b in bricks)
+
+
+def structure_key(bricks: Sequence[Any], world_dim: int = 20) -> str:
+    """Return an order-independent hash of ``bricks`` and ``world_dim``."""
+    payload = json.dumps([world_dim, _canonical(bricks)], separators=(",", ":"))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def kept_indices(bricks: Sequence[Any], kept: Sequence[Any]) -> list[int]:
+    """Return the positions of ``kept`` within the sorted ``bricks``."""
+    remaining: dict[tuple, int] = {}
+    for b in kept:
+        dims = (b.h, b.w, b.x, b.y, b.z)
+        remaining[dims] = remaining.get(dims, 0) + 1
+    result = []
+    for idx, dims in enumerate(_canonical(bricks)):
+        if remaining.get(dims):
+            remaining[dims] -= 1
+            result.append(idx)
+    return result
+
+
+def restore_kept(bricks: Sequence[Any], indices: Sequence[int]) -> list[Any]:
+    """Inverse of :func:`kept_indices`, returning bricks in their original order."""
+    canonical = _canonical(bricks)
+    remaining: dict[tuple, int] = {}
+    for idx in indices:
+        remaining[canonical[idx]] = remaining.get(canonical[idx], 0) + 1
+    result = []
+    for b in bricks:
+        dims = (b.h, b.w, b.x, b.y, b.z)
+        if remaining.get(dims):
+            remaining[dims] -= 1
+            result.append(b)
+    return result
+
+
+class SolverCache:
+    """Bounded LRU of ``key -> (kept indices, score)`` with optional Redis."""
+
+    def __init__(self, maxsize: int = SOLVER_CACHE_SIZE, redis_conn: Any | None = None, ttl: int = SOLVER_CACHE_TTL):
+        self.maxsize = maxsize
+        self.redis = redis_conn
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[list[int], float]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self.maxsize > 0 or self.redis is not None
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, key: str) -> tuple[list[int], float] | None:
+        """Return the cached entry for ``key`` or ``None``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                self._entries.move_to_end(key)
+        if entry is None and self.redis is not None:
+            try:
+                raw = self.redis.get(f"solver_cache:{key}")
+            except Exception:
+                raw = None
+            if raw:
+                data = json.loads(raw)
+                entry = (data["kept"], float(data["score"]))
+                self._remember(key, entry)
+        with self._lock:
+            METRICS["solver_cache_hits" if entry is not None else "solver_cache_misses"] += 1
+        return entry
+
+    def put(self, key: str, kept: list[int], score: float) -> None:
+        """Store ``kept`` indices and ``score`` under ``key``."""
+        self._remember(key, (list(kept), float(score)))
+        if self.redis is not None:
+            try:
+                self.redis.set(
+                    f"solver_cache:{key}",
+                    json.dumps({"kept": list(kept), "score": float(score)}),
+                    ex=self.ttl,
+                )
+            except Exception:
+                pass
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def _remember(self, key: str, entry: tuple[list[int], float]) -> None:
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                METRICS["solver_cache_evictions"] += 1
+
+
+solver_cache = SolverCache(
+    SOLVER_CACHE_SIZE,
+    Redis.from_url(SOLVER_CACHE_REDIS_URL) if SOLVER_CACHE_REDIS_URL else None,
+    SOLVER_CACHE_TTL,
+)
@@ -0,0 +1,175 @@
+"""Split stability problems into independent support components.
+
+A brick's constraints only mention the bricks directly below it, and
+ground bricks (``z == 0``) are unconstrained, so they are always kept in
+an optimal solution. Removing them splits the constraint graph into
+components (table legs, separate towers, ...) whose MIPs can be solved
+separately: each sub-problem holds one component plus the ground bricks
+it rests on.
+
+Sub-problems are solved across a ``ProcessPoolExecutor`` with
+``SOLVER_WORKERS`` processes when the structure has at least
+``SOLVER_PARALLEL_MIN_BRICKS`` bricks. Components are packed into one
+batch per worker so small components do not pay a round trip each.
+In a single process HiGHS presolve already separates the components, so
+splitting only pays off with the pool and is skipped otherwise.
+"""
+from __future__ import annotations
+
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, List, Sequence
+
+from legogpt.data import LegoBrick
+from legogpt.stability_analysis import brick_adjacency
+
+from .pool import mark_not_optimal, track_optimal
+
+SOLVER_WORKERS = int(os.getenv("SOLVER_WORKERS", "0"))
+SOLVER_PARALLEL_MIN_BRICKS = int(os.getenv("SOLVER_PARALLEL_MIN_BRICKS", "300"))
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+# Solvers created inside pool processes, keyed by backend
+_worker_solvers: dict[str, Any] = {}
+
+
+def support_components(bricks: Sequence[LegoBrick]) -> list[list[int]]:
+    """Return the indices of each component of non-ground bricks.
+
+    Components are ordered by their first brick and indices are ascending.
+    """
+    parent = list(range(len(bricks)))
+
+    def find(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for lower, upper in brick_adjacency(bricks):
+        if bricks[lower].z == 0 or bricks[upper].z == 0:
+            continue  # ground bricks are fixed and do not couple their loads
+        ri, rj = find(lower), find(upper)
+        if ri != rj:
+            parent[max(ri, rj)] = min(ri, rj)
+
+    components: dict[int, list[int]] = {}
+    for idx, brick in enumerate(bricks):
+        if brick.z != 0:
+            components.setdefault(find(idx), []).append(idx)
+    return list(components.values())
+
+
+def solve_decomposed(solver: Any, bricks: Sequence[LegoBrick], world_dim: int = 20) -> List[bool]:
+    """Return a keep flag per brick, solving components in parallel.
+
+    ``solver`` is an :class:`~backend.solver.ortools_solver.OrtoolsSolver`
+    whose ``_solve_mask`` handles a single (sub-)problem.
+    """
+    executor = _get_executor() if len(bricks) >= SOLVER_PARALLEL_MIN_BRICKS else None
+    if executor is None:
+        return solver._solve_mask(bricks, world_dim)
+    return _solve_components(solver, bricks, world_dim, executor)
+
+
+def _solve_components(
+    solver: Any,
+    bricks: Sequence[LegoBrick],
+    world_dim: int = 20,
+    executor: ProcessPoolExecutor | None = None,
+) -> List[bool]:
+    components = support_components(bricks)
+    if len(components) <= 1:
+        return solver._solve_mask(bricks, world_dim)
+
+    ground = {idx for idx, b in enumerate(bricks) if b.z == 0}
+    labels: dict[tuple[int, int], list[int]] = {}
+    for idx in ground:
+        b = bricks[idx]
+        for x in range(b.x, b.x + b.h):
+            for y in range(b.y, b.y + b.w):
+                labels.setdefault((x, y), []).append(idx)
+
+    subproblems: list[list[int]] = []
+    for component in components:
+        supporters = set()
+        for idx in component:
+            b = bricks[idx]
+            if b.z != 1:
+                continue
+            for x in range(b.x, b.x + b.h):
+                for y in range(b.y, b.y + b.w):
+                    supporters.update(labels.get((x, y), ()))
+        subproblems.append(sorted(supporters.union(component)))
+
+    keep = [b.z == 0 for b in bricks]
+    subsets = [[bricks[i] for i in indices] for indices in subproblems]
+    for indices, mask in zip(subproblems, _solve_all(solver, subsets, world_dim, executor)):
+        for idx, flag in zip(indices, mask):
+            if idx not in ground:
+                keep[idx] = flag
+    return keep
+
+
+def _solve_all(
+    solver: Any,
+    subsets: list[list[LegoBrick]],
+    world_dim: int,
+    executor: ProcessPoolExecutor | None,
+) -> list[List[bool]]:
+    if executor is not None:
+        batches = _pack(subsets, SOLVER_WORKERS)
+        try:
+            futures = [
+                executor.submit(_solve_batch, solver.backend, [subsets[i] for i in batch], world_dim)
+                for batch in batches
+            ]
+            results: list[List[bool]] = [[] for _ in subsets]
+            for batch, future in zip(batches, futures):
+                masks, optimal = future.result()
+                if not optimal:
+                    mark_not_optimal()
+                for i, mask in zip(batch, masks):
+                    results[i] = mask
+            return results
+        except Exception:  # pragma: no cover - broken pool, solve in-process
+            pass
+    return [solver._solve_mask(subset, world_dim) for subset in subsets]
+
+
+def _pack(subsets: list[list[LegoBrick]], bins: int) -> list[list[int]]:
+    """Distribute subset indices over ``bins`` batches, largest first."""
+    batches: list[list[int]] = [[] for _ in range(min(bins, len(subsets)))]
+    loads = [0] * len(batches)
+    for i in sorted(range(len(subsets)), key=lambda i: -len(subsets[i])):
+        target = loads.index(min(loads))
+        batches[target].append(i)
+        loads[target] += len(subsets[i])
+    return batches
+
+
+def _get_executor() -> ProcessPoolExecutor | None:
+    global _executor
+    if SOLVER_WORKERS < 2:
+        return None
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(max_workers=SOLVER_WORKERS)
+        return _executor
+
+
+def _solve_batch(backend: str, subsets: list[list[LegoBrick]], world_dim: int) -> tuple[list[List[bool]], bool]:
+    """Solve ``subsets`` inside a pool process (must stay picklable).
+
+    Returns the masks and whether every solve was proven optimal.
+    """
+    solver = _worker_solvers.get(backend)
+    if solver is None:
+        from .ortools_solver import OrtoolsSolver
+
+        solver = _worker_solvers[backend] = OrtoolsSolver(backend)
+    with track_optimal() as optimal:
+        masks = [solver._solve_mask(subset, world_dim) for subset in subsets]
+    return masks, optimal[0]
@@ -0,0 +1,93 @@
+"""Greedy support check used when OR-Tools is unavailable.
+
+Bricks are visited in order and kept if every stud rests on a brick that
+was kept earlier in the list (ground bricks are always kept). The NumPy
+implementation computes the same set layer by layer: kept bricks of layer
+``z - 1`` stamp their list index into a label grid, and a brick on layer
+``z`` is kept when every cell under it carries a smaller index.
+"""
+from __future__ import annotations
+
+from typing import List, Sequence
+
+from legogpt.data import LegoBrick
+
+try:  # NumPy is optional for the slim image
+    import numpy as np
+
+    # The vendored offline-test stub only provides ``zeros``/``array``
+    _NUMPY_AVAILABLE = hasattr(np, "minimum")
+except Exception:  # pragma: no cover - optional dependency
+    np = None  # type: ignore
+    _NUMPY_AVAILABLE = False
+
+# Below this size the fixed cost of building arrays outweighs the scan
+# (see scripts/benchmark_fallback.py).
+NUMPY_MIN_BRICKS = 200
+
+
+def greedy_supported(bricks: Sequence[LegoBrick], world_dim: int = 20) -> List[LegoBrick]:
+    """Return the greedily supported bricks, vectorized when NumPy is present."""
+    if _NUMPY_AVAILABLE and len(bricks) >= NUMPY_MIN_BRICKS:
+        return greedy_supported_numpy(bricks, world_dim)
+    return greedy_supported_python(bricks)
+
+
+def greedy_supported_python(bricks: Sequence[LegoBrick]) -> List[LegoBrick]:
+    """Reference implementation scanning kept bricks for every stud."""
+    kept: List[LegoBrick] = []
+    for b in bricks:
+        if b.z > 0:
+            valid = True
+            for x in range(b.x, b.x + b.h):
+                for y in range(b.y, b.y + b.w):
+                    supported = False
+                    for sb in kept:
+                        if sb.z == b.z - 1 and sb.x <= x < sb.x + sb.h and sb.y <= y < sb.y + sb.w:
+                            supported = True
+                            break
+                    if not supported:
+                        valid = False
+                        break
+                if not valid:
+                    break
+            if not valid:
+                continue
+        kept.append(b)
+    return kept
+
+
+def greedy_supported_numpy(bricks: Sequence[LegoBrick], world_dim: int = 20) -> List[LegoBrick]:
+    """Vectorized equivalent of :func:`greedy_supported_python`."""
+    n = len(bricks)
+    dims = np.array([(b.h, b.w, b.x, b.y, b.z) for b in bricks], dtype=np.int64).reshape(n, 5)
+    h, w, x, y, z = dims.T
+
+    # Label grid covering the world, grown for out-of-bounds bricks
+    x0, y0 = min(int(x.min()), 0), min(int(y.min()), 0)
+    size_x = max(world_dim, int((x + h).max())) - x0
+    size_y = max(world_dim, int((y + w).max())) - y0
+
+    def cells(idx):
+        """Return the stud cells of bricks ``idx`` and the brick owning each."""
+        area = h[idx] * w[idx]
+        owner = np.repeat(idx, area)
+        starts = np.cumsum(area) - area
+        k = np.arange(owner.size) - np.repeat(starts, area)
+        cx = x[owner] + k // w[owner] - x0
+        cy = y[owner] + k % w[owner] - y0
+        return cx, cy, owner, starts
+
+    kept = z <= 0
+    for layer in np.unique(z[z > 0]):
+        upper = np.flatnonzero(z == layer)
+        lower = np.flatnonzero((z == layer - 1) & kept)
+        if lower.size == 0:
+            continue  # nothing to rest on; bricks stay unsupported
+        label = np.full((size_x, size_y), n, dtype=np.int64)
+        cx, cy, owner, _ = cells(lower)
+        np.minimum.at(label, (cx, cy), owner)
+        cx, cy, owner, starts = cells(upper)
+        supported = label[cx, cy] < owner
+        kept[upper] = np.logical_and.reduceat(supported, starts)
+    return [b for b, keep in zip(bricks, kept) if keep]
@@ -0,0 +1,162 @@
+"""Incremental stability solving for structures built brick by brick.
+
+LegoGPT checks stability after every regeneration step, and consecutive
+structures usually differ by a handful of bricks at the end. A
+:class:`StabilitySession` keeps the OR-Tools model, its variables and the
+:class:`SpatialIndex` alive between checks so that adding or undoing a
+brick only rewrites the constraints of that brick and the bricks resting
+on it.
+
+Generation usually keeps the structure fully stable, and while every
+brick is kept an edit that leaves all touched bricks supported cannot
+change the optimum, so :meth:`StabilitySession.solve` skips the MIP
+entirely. Otherwise the model is re-solved under the time and gap limits
+of :class:`~backend.solver.pool.SolverPool`, warm-started from the previous
+solution where the backend supports hints.
+"""
+from __future__ import annotations
+
+from typing import List, Sequence, cast
+
+from .base import SupportsStability
+from .fallback import greedy_supported
+from .ortools_solver import OrtoolsSolver, _Structure
+from .spatial import SpatialIndex
+from legogpt.data import LegoBrick
+
+# Backends that accept repeated solution hints. OR-Tools' HiGHS wrapper
+# crashes on hints and SCIP rejects them once its partial-solution store
+# fills up, so those re-solve from scratch (HiGHS still reuses the model).
+_HINT_BACKENDS = {"CBC", "CP_SAT", "SAT"}
+
+
+class StabilitySession:
+    """Stability model that is updated in place as bricks come and go."""
+
+    def __init__(self, backend: str = "HIGHs", world_dim: int = 20) -> None:
+        self.world_dim = world_dim
+        self._solver = OrtoolsSolver(backend)
+        self._index = SpatialIndex([])
+        self._model = None
+        if self._solver.pool is not None:
+            # Long-lived, so created outside the pool but solved with its limits
+            self._model = self._solver.pool.create()
+            self._model.Objective().SetMaximization()
+        self._keep_vars: list = []
+        self._rows: list[list] = []
+        # Retired variables and constraints are recycled instead of
+        # growing the model on every add/undo cycle.
+        self._spare_vars: list = []
+        self._spare_rows: list = []
+        self._hint: list[float] = []
+        self._warm_start = backend.upper() in _HINT_BACKENDS
+        # True while keeping every brick is known to be optimal
+        self._all_kept = True
+
+    @property
+    def bricks(self) -> List[LegoBrick]:
+        return self._index.bricks
+
+    def __len__(self) -> int:
+        return len(self._index.bricks)
+
+    def add_brick(self, brick: LegoBrick) -> None:
+        """Append ``brick`` and add the constraints it touches."""
+        idx = self._index.add(brick)
+        if self._model is None:
+            return
+        if self._spare_vars:
+            var = self._spare_vars.pop()
+            var.SetBounds(0, 1)
+        else:
+            var = self._model.BoolVar(f"keep_{idx}")
+        self._model.Objective().SetCoefficient(var, 1)
+        self._keep_vars.append(var)
+        self._rows.append([])
+        self._hint.append(1.0)
+        supported = self._rebuild(idx)
+        for above in self._index.resting_on(brick):
+            self._rebuild(above)  # gaining a supporter never breaks support
+        self._all_kept = self._all_kept and supported
+
+    def undo_add_brick(self) -> None:
+        """Remove the most recently added brick and its constraints."""
+        brick = self._index.bricks[-1]
+        above = self._index.resting_on(brick)
+        self._index.pop()
+        if self._model is None:
+            return
+        for row in self._rows.pop():
+            self._release(row)
+        var = self._keep_vars.pop()
+        self._model.Objective().SetCoefficient(var, 0)
+        var.SetBounds(0, 0)
+        self._spare_vars.append(var)
+        self._hint.pop()
+        for idx in above:
+            if not self._rebuild(idx):
+                self._all_kept = False
+
+    def sync(self, bricks: Sequence[LegoBrick]) -> None:
+        """Bring the session in line with ``bricks`` using the fewest edits.
+
+        Bricks after the longest common prefix are undone and the remainder
+        of ``bricks`` is added, so a structure that only grew at the end
+        costs one :meth:`add_brick` per new brick.
+        """
+        current = self._index.bricks
+        common = 0
+        for old, new in zip(current, bricks):
+            if old != new:
+                break
+            common += 1
+        while len(current) > common:
+            self.undo_add_brick()
+        for brick in bricks[common:]:
+            self.add_brick(brick)
+
+    def solve(self) -> SupportsStability:
+        """Return the stable subset of the current bricks."""
+        bricks = list(self._index.bricks)
+        if self._model is None:
+            return self._solver.solve(_Structure(bricks, world_dim=self.world_dim))
+
+        if self._all_kept:
+            # Every brick is supported by kept bricks, hence also grounded
+            return cast(SupportsStability, _Structure(bricks, world_dim=self.world_dim))
+
+        if self._warm_start and self._keep_vars:
+            self._model.SetHint(self._keep_vars, self._hint)
+        if not self._solver.pool.run(self._model):  # timed out without a solution
+            kept = greedy_supported(bricks, self.world_dim)
+        else:
+            self._hint = [var.solution_value() for var in self._keep_vars]
+            kept = [b for b, value in zip(bricks, self._hint) if value > 0.5]
+            self._all_kept = len(kept) == len(bricks)
+        kept = self._solver._filter_connected(kept)
+        return cast(SupportsStability, _Structure(kept, world_dim=self.world_dim))
+
+    def _rebuild(self, idx: int) -> bool:
+        """Replace the support constraints of brick ``idx``.
+
+        Returns ``False`` if some stud of the brick has nothing below it.
+        """
+        for row in self._rows[idx]:
+            self._release(row)
+        self._rows[idx] = []
+        if self._index.bricks[idx].z == 0:
+            return True
+        keep = self._keep_vars[idx]
+        groups = self._index.support_groups(idx)
+        for group in groups:
+            # sum(supporters) - keep >= 0; an empty group forces keep == 0
+            row = self._spare_rows.pop() if self._spare_rows else self._model.Constraint(0, self._model.infinity())
+            for j in group:
+                row.SetCoefficient(self._keep_vars[j], 1)
+            row.SetCoefficient(keep, -1)
+            self._rows[idx].append(row)
+        return groups != [()]
+
+    def _release(self, row) -> None:
+        row.Clear()
+        self._spare_rows.append(row)
@@ -1,8 +1,10 @@
 """OR-Tools implementation of :class:`ILPSolver`.
 
 The solver keeps a stable subset of bricks using a small MIP model.
-If OR-Tools is unavailable (e.g. offline tests), a simple Python
-fallback performs the same checks.
+Solver objects come from a :class:`~backend.solver.pool.SolverPool`, which
+bounds the solve time. If OR-Tools is unavailable (e.g. offline tests) or a
+solve times out without an incumbent, a greedy fallback (vectorized with
+NumPy when available) performs the same checks.
 """
 from __future__ import annotations
 from typing import List, cast
@@ -15,7 +17,12 @@ except Exception:  # pragma: no cover - fallback for offline tests
     _ORTOOLS_AVAILABLE = False
 
 from .base import ILPSolver, SupportsStability
+from .decompose import solve_decomposed
+from .fallback import greedy_supported
+from .pool import SolverPool
+from .spatial import SpatialIndex
 from legogpt.data import LegoBrick
+from legogpt.stability_analysis import ground_connected
 
 
 class _Structure:
@@ -31,106 +38,69 @@ class OrtoolsSolver(ILPSolver):
         # Keep a reference for future model builds
         self.backend = backend
         if _ORTOOLS_AVAILABLE:
-            # Quick self-test: create a dummy solver instance
-            self._probe = pywraplp.Solver.CreateSolver(backend)
-            if self._probe is None:
-                raise RuntimeError(f"OR-Tools backend '{backend}' unavailable")
+            # Raises if the backend is unavailable
+            self.pool: SolverPool | None = SolverPool(backend)
         else:  # pragma: no cover - used only in offline test envs
-            self._probe = None
-
-    def _overlap(self, a: LegoBrick, b: LegoBrick) -> bool:
-        """Return True if two bricks overlap in the x/y plane."""
-        return not (
-            a.x + a.h <= b.x or b.x + b.h <= a.x or a.y + a.w <= b.y or b.y + b.w <= a.y
-        )
-
-    def _connected(self, a: LegoBrick, b: LegoBrick) -> bool:
-        """Return True if ``b`` sits directly on top of ``a``."""
-        if a.z > b.z:
-            a, b = b, a
-        return a.z == b.z - 1 and self._overlap(a, b)
+            self.pool = None
 
     def _filter_connected(self, bricks: List[LegoBrick]) -> List[LegoBrick]:
         """Return bricks connected to the ground via stack connections."""
-        graph: list[list[int]] = [[] for _ in bricks]
-        ground = []
-        for i, bi in enumerate(bricks):
-            if bi.z == 0:
-                ground.append(i)
-        for i, bi in enumerate(bricks):
-            for j in range(i + 1, len(bricks)):
-                bj = bricks[j]
-                if self._connected(bi, bj):
-                    graph[i].append(j)
-                    graph[j].append(i)
-        visited = set(ground)
-        stack = list(ground)
-        while stack:
-            idx = stack.pop()
-            for j in graph[idx]:
-                if j not in visited:
-                    visited.add(j)
-                    stack.append(j)
-        return [b for i, b in enumerate(bricks) if i in visited]
-
-    def solve(self, structure: SupportsStability) -> SupportsStability:  # noqa: D401
-        """Return a stable subset of ``structure`` using a small MIP model."""
-
-        bricks: List[LegoBrick] = list(structure.bricks)
+        connected = ground_connected(bricks)
+        return [b for b, ok in zip(bricks, connected) if ok]
 
-        if not _ORTOOLS_AVAILABLE:
-            kept: List[LegoBrick] = []
-            for b in bricks:
-                if b.z > 0:
-                    valid = True
-                    for x in range(b.x, b.x + b.h):
-                        for y in range(b.y, b.y + b.w):
-                            supported = False
-                            for sb in kept:
-                                if sb.z == b.z - 1 and sb.x <= x < sb.x + sb.h and sb.y <= y < sb.y + sb.w:
-                                    supported = True
-                                    break
-                            if not supported:
-                                valid = False
-                                break
-                        if not valid:
-                            break
-                    if not valid:
-                        continue
-                kept.append(b)
-            kept = self._filter_connected(kept)
-            world_dim = getattr(structure, "world_dim", 20)
-            return cast(SupportsStability, _Structure(kept, world_dim=world_dim))
-
-        solver = pywraplp.Solver.CreateSolver(self.backend)
-        if solver is None:  # pragma: no cover - checked in __init__
-            raise RuntimeError("Failed to create OR-Tools solver instance")
+    def _build_model(self, solver, bricks: List[LegoBrick]) -> list:
+        """Add keep variables and support constraints to ``solver``.
 
+        Supporters are looked up through a :class:`SpatialIndex` and each
+        brick gets one constraint per distinct supporter set rather than
+        one per stud cell.
+        """
         keep_vars = [solver.BoolVar(f"keep_{i}") for i in range(len(bricks))]
 
         # Objective: keep as many bricks as possible
         solver.Maximize(solver.Sum(keep_vars))
 
         # Stability constraints
+        index = SpatialIndex(bricks)
         for i, bi in enumerate(bricks):
             if bi.z == 0:
                 continue
-            for x in range(bi.x, bi.x + bi.h):
-                for y in range(bi.y, bi.y + bi.w):
-                    supporters = []
-                    for j, bj in enumerate(bricks):
-                        if bj.z == bi.z - 1 and bj.x <= x < bj.x + bj.h and bj.y <= y < bj.y + bj.w:
-                            supporters.append(keep_vars[j])
-                    if supporters:
-                        solver.Add(solver.Sum(supporters) >= keep_vars[i])
-                    else:
-                        solver.Add(keep_vars[i] == 0)
-
-        status = solver.Solve()
-        if status != pywraplp.Solver.OPTIMAL:  # pragma: no cover
-            kept = bricks
+            for group in index.support_groups(i):
+                if group:
+                    solver.Add(solver.Sum([keep_vars[j] for j in group]) >= keep_vars[i])
+                else:
+                    solver.Add(keep_vars[i] == 0)
+        return keep_vars
+
+    def _solve_mask(self, bricks: List[LegoBrick], world_dim: int = 20) -> List[bool]:
+        """Return a keep flag per brick from one pooled MIP solve."""
+        with self.pool.acquire() as solver:
+            keep_vars = self._build_model(solver, bricks)
+            if self.pool.run(solver):
+                return [var.solution_value() > 0.5 for var in keep_vars]
+        # Timed out before finding any solution; greedy keeps an ordered subset
+        kept = greedy_supported(bricks, world_dim)
+        mask, k = [], 0
+        for b in bricks:
+            hit = k < len(kept) and kept[k] is b
+            mask.append(hit)
+            k += hit
+        return mask
+
+    def solve(self, structure: SupportsStability) -> SupportsStability:  # noqa: D401
+        """Return a stable subset of ``structure`` using a small MIP model.
+
+        Independent support components are solved separately (see
+        :mod:`backend.solver.decompose`).
+        """
+
+        bricks: List[LegoBrick] = list(structure.bricks)
+        world_dim = getattr(structure, "world_dim", 20)
+
+        if self.pool is None:
+            kept = greedy_supported(bricks, world_dim)
         else:
-            kept = [b for b, var in zip(bricks, keep_vars) if var.solution_value() > 0.5]
+            keep = solve_decomposed(self, bricks, world_dim)
+            kept = [b for b, flag in zip(bricks, keep) if flag]
         kept = self._filter_connected(kept)
-        world_dim = getattr(structure, "world_dim", 20)
         return cast(SupportsStability, _Structure(kept, world_dim=world_dim))
@@ -0,0 +1,141 @@
+"""Pool of reusable OR-Tools solver instances with bounded solve time.
+
+Creating a ``pywraplp.Solver`` per request is wasteful and an unbounded
+solve can stall an RQ worker on a pathological structure. A
+:class:`SolverPool` hands out cleared solver objects and runs them with a
+wall-clock limit (``SOLVER_TIME_LIMIT`` seconds, ``0`` disables it) and a
+relative MIP gap (``SOLVER_MIP_GAP``). When the limit is hit the caller
+gets the best incumbent if the backend found one; otherwise
+:meth:`SolverPool.run` reports that no solution is available and the
+caller falls back to the greedy check. Inside a :func:`track_optimal`
+block such answers are flagged, so callers can tell ``OPTIMAL`` results,
+optimal within the MIP gap, apart.
+
+Solve counts live in :data:`METRICS` and wall-clock times in
+:data:`SOLVE_LATENCY`; both are part of ``backend.metrics.REGISTRY``.
+"""
+from __future__ import annotations
+
+import contextvars
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+try:  # OR-Tools might not be available in minimal CI images
+    from ortools.linear_solver import pywraplp
+except Exception:  # pragma: no cover - fallback for offline tests
+    pywraplp = None  # type: ignore
+
+from backend.metrics import REGISTRY
+
+SOLVER_POOL_SIZE = int(os.getenv("SOLVER_POOL_SIZE", "2"))
+SOLVER_TIME_LIMIT = float(os.getenv("SOLVER_TIME_LIMIT", "10"))  # seconds
+SOLVER_MIP_GAP = float(os.getenv("SOLVER_MIP_GAP", "0.0001"))
+
+METRICS = {
+    "solver_solves": 0,
+    "solver_incumbents": 0,
+    "solver_fallbacks": 0,
+}
+
+REGISTRY.include(METRICS)
+
+SOLVE_LATENCY = REGISTRY.histogram(
+    "solver_solve_seconds",
+    "Wall-clock time of OR-Tools solves",
+    buckets=(0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0),
+)
+
+
+# Flag of the innermost track_optimal block, cleared by non-optimal solves
+_optimal: contextvars.ContextVar[list[bool] | None] = contextvars.ContextVar("solver_optimal", default=None)
+
+
+@contextmanager
+def track_optimal() -> Iterator[list[bool]]:
+    """Yield ``[True]``, set to ``[False]`` if a solve in the block is not ``OPTIMAL``."""
+    flag = [True]
+    token = _optimal.set(flag)
+    try:
+        yield flag
+    finally:
+        _optimal.reset(token)
+
+
+def mark_not_optimal() -> None:
+    """Flag the current :func:`track_optimal` block, if any."""
+    flag = _optimal.get()
+    if flag is not None:
+        flag[0] = False
+
+
+class SolverPool:
+    """Hand out reusable ``pywraplp.Solver`` objects for one backend."""
+
+    def __init__(
+        self,
+        backend: str = "HIGHs",
+        size: int = SOLVER_POOL_SIZE,
+        time_limit: float = SOLVER_TIME_LIMIT,
+        mip_gap: float = SOLVER_MIP_GAP,
+    ) -> None:
+        if pywraplp is None:
+            raise RuntimeError("OR-Tools is not installed")
+        self.backend = backend
+        self.size = size
+        self.time_limit = time_limit
+        self.mip_gap = mip_gap
+        self._lock = threading.Lock()
+        # Creating the first solver up front doubles as a backend check
+        self._idle: list[Any] = [self.create()]
+
+    def __len__(self) -> int:
+        return len(self._idle)
+
+    def create(self) -> Any:
+        """Return a new solver for ``backend``."""
+        solver = pywraplp.Solver.CreateSolver(self.backend)
+        if solver is None:
+            raise RuntimeError(f"OR-Tools backend '{self.backend}' unavailable")
+        return solver
+
+    @contextmanager
+    def acquire(self) -> Iterator[Any]:
+        """Yield an empty solver and return it to the pool afterwards."""
+        with self._lock:
+            solver = self._idle.pop() if self._idle else None
+        if solver is None:
+            solver = self.create()
+        try:
+            yield solver
+        finally:
+            solver.Clear()
+            with self._lock:
+                if len(self._idle) < self.size:
+                    self._idle.append(solver)
+
+    def run(self, solver: Any) -> bool:
+        """Solve ``solver`` within the configured limits.
+
+        Returns ``True`` if variable values are available, either optimal
+        or the best incumbent found before the time limit.
+        """
+        if self.time_limit > 0:
+            solver.SetTimeLimit(int(self.time_limit * 1000))
+        params = pywraplp.MPSolverParameters()
+        if self.mip_gap > 0:
+            params.SetDoubleParam(params.RELATIVE_MIP_GAP, self.mip_gap)
+        start = time.perf_counter()
+        status = solver.Solve(params)
+        SOLVE_LATENCY.observe(time.perf_counter() - start)
+        METRICS["solver_solves"] += 1
+        if status == pywraplp.Solver.OPTIMAL:
+            return True
+        mark_not_optimal()
+        if status == pywraplp.Solver.FEASIBLE:
+            METRICS["solver_incumbents"] += 1
+            return True
+        METRICS["solver_fallbacks"] += 1
+        return False
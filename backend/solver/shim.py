@@ -3,7 +3,8 @@ Drop-in replacement for ``legogpt.stability_analysis.stability_score``.
 
 Uses the open-source OR-Tools solver when available and falls back to
 a dummy score otherwise.  This keeps the pipeline functional even on
-systems without OR-Tools installed.
+systems without OR-Tools installed.  Results are memoised in
+:data:`backend.solver.cache.solver_cache`.
 """
 from __future__ import annotations
 
@@ -11,10 +12,15 @@ import importlib
 import json
 import os
 import sys
+import threading
 from typing import Any, Tuple
 
-from legogpt.data import LegoStructure
-from .ortools_solver import OrtoolsSolver
+from legogpt.data import LegoBrick
+from backend.tracing import stage
+from .cache import kept_indices, restore_kept, solver_cache, structure_key
+from .incremental import StabilitySession
+from .ortools_solver import OrtoolsSolver, _Structure
+from .pool import track_optimal
 
 try:  # Instantiate solver if OR-Tools is available
     backend_name = os.getenv("ORTOOLS_ENGINE", "HIGHs")
@@ -22,6 +28,13 @@ try:  # Instantiate solver if OR-Tools is available
 except Exception:  # pragma: no cover - fallback to dummy score
     _solver = None
 
+# Consecutive calls during generation usually differ by a few trailing
+# bricks, so one long-lived session is synced instead of rebuilding the MIP.
+_session: StabilitySession | None = None
+_session_lock = threading.Lock()
+if _solver is not None and os.getenv("SOLVER_INCREMENTAL", "1") == "1":
+    _session = StabilitySession(_solver.backend)
+
 
 def stability_score(
     lego_structure: str | dict,
@@ -29,6 +42,11 @@ def stability_score(
     cfg: Any = None,
 ) -> Tuple[float, None, None, None, None]:
     """Return a simple stability score using the OR-Tools solver if available."""
+    with stage("solver"):
+        return _stability_score(lego_structure)
+
+
+def _stability_score(lego_structure: str | dict) -> Tuple[float, None, None, None, None]:
     try:
         if isinstance(lego_structure, (str, bytes)):
             lego_data = json.loads(lego_structure)
@@ -36,19 +54,42 @@ def stability_score(
             lego_data = lego_structure
 
         if _solver is not None and isinstance(lego_data, dict):
-            structure = LegoStructure.from_json(lego_data)
-            stable = _solver.solve(structure)
-            if structure.bricks:
-                score = len(stable.bricks) / len(structure.bricks)
-            else:
-                score = 1.0
-            return float(score), None, None, None, stable
+            bricks = [LegoBrick.from_json(v) for k, v in lego_data.items() if k.isdigit()]
+            # Without OR-Tools the order-dependent greedy fallback runs
+            key = structure_key(bricks) if solver_cache.enabled and _solver.pool is not None else None
+            cached = solver_cache.get(key) if key else None
+            if cached is not None:
+                kept, score = cached
+                return score, None, None, None, _Structure(restore_kept(bricks, kept))
+
+            with track_optimal() as optimal:
+                if _session is not None:
+                    with _session_lock:
+                        _session.sync(bricks)
+                        stable = _session.solve()
+                else:
+                    stable = _solver.solve(_Structure(bricks))
+            score = float(len(stable.bricks) / len(bricks)) if bricks else 1.0
+            if key and optimal[0]:
+                solver_cache.put(key, kept_indices(bricks, stable.bricks), score)
+            return score, None, None, None, stable
     except Exception:  # pragma: no cover - keep dummy behaviour on parse errors
         pass
 
     return 1.0, None, None, None, None
 
 
+def warm_up() -> None:
+    """Solve a two-brick tower so OR-Tools and the solver pool are initialised.
+
+    Bypasses the result cache and incremental session, which are left as
+    they were.
+    """
+    if _solver is not None:
+        tower = [LegoBrick(h=2, w=4, x=0, y=0, z=0), LegoBrick(h=2, w=4, x=0, y=0, z=1)]
+        _solver.solve(_Structure(tower))
+
+
 # ---- expose on the original import path ---------------------------------
 module_path = "legogpt.stability_analysis"
 module = importlib.import_module(module_path)
@@ -0,0 +1,89 @@
+"""Per-layer spatial index used to build stability constraints.
+
+The index maps every stud cell of every layer to the bricks covering it,
+so the bricks supporting a given brick can be read straight from the
+layer below instead of scanning the whole structure.
+"""
+from __future__ import annotations
+
+from typing import Iterator, List, Sequence, Tuple
+
+from legogpt.data import LegoBrick
+from legogpt.stability_analysis import layer_labels
+
+Cell = Tuple[int, int]
+
+
+def footprint(brick: LegoBrick) -> Iterator[Cell]:
+    """Yield the ``(x, y)`` stud cells covered by ``brick``."""
+    for x in range(brick.x, brick.x + brick.h):
+        for y in range(brick.y, brick.y + brick.w):
+            yield x, y
+
+
+class SpatialIndex:
+    """Sparse ``z -> (x, y) -> [brick indices]`` occupancy grid.
+
+    Building the index is linear in the total stud area of the structure
+    and each supporter lookup only touches the footprint of the queried
+    brick. Colliding bricks are kept side by side in the same cell so the
+    index reproduces the behaviour of a full pairwise scan.
+    """
+
+    def __init__(self, bricks: Sequence[LegoBrick]) -> None:
+        self.bricks: List[LegoBrick] = list(bricks)
+        self.layers: dict[int, dict[Cell, list[int]]] = layer_labels(self.bricks)
+
+    def add(self, brick: LegoBrick) -> int:
+        """Insert ``brick`` and return its index."""
+        idx = len(self.bricks)
+        self.bricks.append(brick)
+        layer = self.layers.setdefault(brick.z, {})
+        for cell in footprint(brick):
+            layer.setdefault(cell, []).append(idx)
+        return idx
+
+    def pop(self) -> LegoBrick:
+        """Remove and return the most recently added brick."""
+        brick = self.bricks.pop()
+        layer = self.layers[brick.z]
+        for cell in footprint(brick):
+            occupants = layer[cell]
+            occupants.pop()  # the newest brick is always last in its cells
+            if not occupants:
+                del layer[cell]
+        if not layer:
+            del self.layers[brick.z]
+        return brick
+
+    def resting_on(self, brick: LegoBrick) -> list[int]:
+        """Return the bricks directly above any stud cell of ``brick``."""
+        above = self.layers.get(brick.z + 1, {})
+        found: dict[int, None] = {}
+        for cell in footprint(brick):
+            found.update(dict.fromkeys(above.get(cell, ())))
+        return list(found)
+
+    def supporters(self, idx: int) -> list[tuple[int, ...]]:
+        """Return the bricks directly below each stud cell of brick ``idx``."""
+        brick = self.bricks[idx]
+        below = self.layers.get(brick.z - 1, {})
+        return [tuple(below.get(cell, ())) for cell in footprint(brick)]
+
+    def support_groups(self, idx: int) -> list[tuple[int, ...]]:
+        """Return the distinct supporter sets needed to keep brick ``idx``.
+
+        Stud cells resting on the same bricks share one group, and a group
+        that is a superset of another is dropped because its constraint is
+        implied. A single empty group means some stud has nothing below it,
+        so the brick cannot be kept at all.
+        """
+        groups = set(self.supporters(idx))
+        if () in groups:
+            return [()]
+        minimal: list[tuple[int, ...]] = []
+        for group in sorted(groups, key=len):
+            members = set(group)
+            if not any(members.issuperset(kept) for kept in minimal):
+                minimal.append(group)
+        return minimal
@@ -0,0 +1,124 @@
+"""Helpers for serving generated assets from ``STATIC_ROOT``.
+
+The gateway streams files to the socket with ``sendfile`` instead of
+reading them into memory, answers conditional requests from an ``ETag``
+built from the file's size and modification time, honours single byte
+``Range`` requests and prefers a pre-compressed ``<name>.gz`` sibling when
+the client accepts gzip. Run directories are named by UUID and never
+rewritten, so their files are cached as immutable.
+"""
+from __future__ import annotations
+
+import gzip
+import os
+import re
+import shutil
+from email.utils import formatdate, parsedate_to_datetime
+from pathlib import Path
+from typing import BinaryIO
+
+CONTENT_TYPES = {
+    ".png": "image/png",
+    ".gltf": "model/gltf+json",
+    ".pdf": "application/pdf",
+}
+IMMUTABLE_CACHE = "public, max-age=31536000, immutable"
+# Text assets worth storing a gzip sibling for
+PRECOMPRESS_SUFFIXES = frozenset({".ldr", ".gltf"})
+PRECOMPRESS = os.getenv("STATIC_PRECOMPRESS", "1") != "0"
+
+_RUN_DIR = re.compile(r"^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$")
+_RANGE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+def content_type(path: Path) -> str:
+    """Return the ``Content-Type`` served for ``path``."""
+    return CONTENT_TYPES.get(path.suffix, "text/plain")
+
+
+def cache_control(rel: str) -> str:
+    """Return ``Cache-Control`` for ``rel``; UUID run directories are immutable."""
+    run_dir = rel.split("/", 1)[0]
+    return IMMUTABLE_CACHE if _RUN_DIR.match(run_dir) else "no-cache"
+
+
+def etag(st: os.stat_result, encoding: str | None = None) -> str:
+    """Return a strong ``ETag`` from the size and mtime of ``st``."""
+    suffix = f"-{encoding}" if encoding else ""
+    return f'"{st.st_size:x}-{st.st_mtime_ns:x}{suffix}"'
+
+
+def last_modified(st: os.stat_result) -> str:
+    return formatdate(st.st_mtime, usegmt=True)
+
+
+def not_modified(headers, tag: str, st: os.stat_result) -> bool:
+    """Return whether the conditional request ``headers`` match the file."""
+    if_none_match = headers.get("If-None-Match")
+    if if_none_match is not None:
+        tags = {t.strip().removeprefix("W/") for t in if_none_match.split(",")}
+        return "*" in tags or tag in tags
+    since = headers.get("If-Modified-Since")
+    if since is None:
+        return False
+    try:
+        return int(st.st_mtime) <= parsedate_to_datetime(since).timestamp()
+    except (TypeError, ValueError):
+        return False
+
+
+def accepts_gzip(headers) -> bool:
+    for coding in headers.get("Accept-Encoding", "").split(","):
+        name, _, params = coding.partition(";")
+        if name.strip().lower() in ("gzip", "*"):
+            q = params.strip().removeprefix("q=")
+            try:
+                return not params or float(q) > 0
+            except ValueError:
+                return False
+    return False
+
+
+def parse_range(value: str | None, size: int) -> tuple[int, int] | None:
+    """Return the inclusive ``(start, end)`` of a single byte range.
+
+    ``None`` means the header is absent or not a single byte range, so the
+    whole file is sent. Raises ``ValueError`` if the range cannot be
+    satisfied.
+    """
+    if not value:
+        return None
+    match = _RANGE.match(value.strip())
+    if not match or match.groups() == ("", ""):
+        return None
+    first, last = match.groups()
+    if not first:
+        length = int(last)
+        if length == 0 or size == 0:
+            raise ValueError(value)
+        return max(0, size - length), size - 1
+    start = int(first)
+    end = min(int(last), size - 1) if last else size - 1
+    if start >= size or start > end:
+        raise ValueError(value)
+    return start, end
+
+
+def send_file(sock, fh: BinaryIO, offset: int, count: int) -> None:
+    """Write ``count`` bytes of ``fh`` from ``offset`` to ``sock``.
+
+    ``socket.sendfile`` uses ``os.sendfile`` where available, so the data
+    never passes through Python, and copies in chunks otherwise.
+    """
+    if count:
+        sock.sendfile(fh, offset, count)
+
+
+def precompress(path: Path) -> Path | None:
+    """Write ``<path>.gz`` for text assets so it can be served as is."""
+    if not PRECOMPRESS or path.suffix not in PRECOMPRESS_SUFFIXES:
+        return None
+    target = path.with_name(path.name + ".gz")
+    with open(path, "rb") as src, gzip.GzipFile(target, "wb", mtime=0) as gz:
+        shutil.copyfileobj(src, gz)
+    return target
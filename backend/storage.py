@@ -1,4 +1,12 @@
-"""Optional S3 asset uploads for generated models."""
+"""Optional S3 asset uploads for generated models.
+
+One S3 client per process is shared by all uploads; its connection pool
+holds a connection for every upload thread and multipart part in flight.
+Files are gzipped into a spooled buffer that stays in memory up to
+``UPLOAD_SPOOL_BYTES`` before spilling to disk, except types that are
+already compressed such as PNG. Files of ``UPLOAD_MULTIPART_THRESHOLD``
+bytes or more are sent as concurrent multipart uploads.
+"""
 from __future__ import annotations
 
 import os
@@ -6,60 +14,121 @@ import gzip
 import mimetypes
 import shutil
 import tempfile
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
 from pathlib import Path
 from typing import Iterable, Tuple
 
+from backend.tracing import bind, stage
+
 S3_BUCKET = os.getenv("S3_BUCKET")
 S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")
 S3_URL_PREFIX = os.getenv("S3_URL_PREFIX")
+# Files uploaded at the same time by upload_async
+UPLOAD_THREADS = int(os.getenv("UPLOAD_THREADS", "4"))
+# Gzipped uploads are buffered in memory up to this size
+UPLOAD_SPOOL_BYTES = int(os.getenv("UPLOAD_SPOOL_BYTES", str(8 * 1024 * 1024)))
+# Files at least this large are uploaded in parts of the same size
+UPLOAD_MULTIPART_THRESHOLD = int(os.getenv("UPLOAD_MULTIPART_THRESHOLD", str(8 * 1024 * 1024)))
+# Parts of one multipart upload sent at the same time
+UPLOAD_MULTIPART_CONCURRENCY = int(os.getenv("UPLOAD_MULTIPART_CONCURRENCY", "4"))
+# Already compressed formats, uploaded as is
+COMPRESSED_SUFFIXES = frozenset({".png", ".jpg", ".jpeg", ".gif", ".webp", ".gz", ".zip"})
+
+_executor: ThreadPoolExecutor | None = None
+_executor_lock = threading.Lock()
+_s3 = None
+_s3_lock = threading.Lock()
 
 try:  # Lazy optional dependency
     import boto3
+    from boto3.s3.transfer import TransferConfig
+    from botocore.config import Config
 except Exception:  # pragma: no cover - optional
     boto3 = None  # type: ignore
 
 
 def _client():
+    """Return the process-wide S3 client; boto3 clients are thread-safe."""
+    global _s3
     if not boto3:
         raise RuntimeError("boto3 not installed")
-    return boto3.client("s3", endpoint_url=S3_ENDPOINT_URL)
+    with _s3_lock:
+        if _s3 is None:
+            pool = max(10, UPLOAD_THREADS * UPLOAD_MULTIPART_CONCURRENCY)
+            _s3 = boto3.client("s3", endpoint_url=S3_ENDPOINT_URL, config=Config(max_pool_connections=pool))
+        return _s3
+
+
+def _transfer_config():
+    return TransferConfig(
+        multipart_threshold=UPLOAD_MULTIPART_THRESHOLD,
+        multipart_chunksize=UPLOAD_MULTIPART_THRESHOLD,
+        max_concurrency=UPLOAD_MULTIPART_CONCURRENCY,
+    )
 
 
 def upload(path: Path, key: str) -> str:
     """Upload a file to S3 and return the public URL."""
     if not S3_BUCKET:
         raise RuntimeError("S3_BUCKET not configured")
+    with stage("upload"):
+        return _upload(path, key)
+
+
+def _upload(path: Path, key: str) -> str:
     client = _client()
-    extra = {}
-    tmp_name = None
-    try:
-        if os.getenv("COMPRESS_UPLOADS", "1") == "1":
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".gz") as tmp:
-                with open(path, "rb") as src, gzip.GzipFile(fileobj=tmp, mode="wb") as gz:
-                    shutil.copyfileobj(src, gz)
-                tmp_name = tmp.name
-            ctype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
-            extra = {"ContentType": ctype, "ContentEncoding": "gzip"}
-            upload_path = tmp_name
-        else:
-            upload_path = str(path)
-        client.upload_file(upload_path, S3_BUCKET, key, ExtraArgs=extra)  # type: ignore[arg-type]
-    finally:
-        if tmp_name:
-            os.unlink(tmp_name)
+    config = _transfer_config()
+    ctype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if os.getenv("COMPRESS_UPLOADS", "1") != "1" or path.suffix.lower() in COMPRESSED_SUFFIXES:
+        extra = {"ContentType": ctype}
+        client.upload_file(str(path), S3_BUCKET, key, ExtraArgs=extra, Config=config)  # type: ignore[arg-type]
+        return url_for(key)
+    with tempfile.SpooledTemporaryFile(max_size=UPLOAD_SPOOL_BYTES) as buf:
+        with open(path, "rb") as src, gzip.GzipFile(fileobj=buf, mode="wb", mtime=0) as gz:
+            shutil.copyfileobj(src, gz)
+        buf.seek(0)
+        extra = {"ContentType": ctype, "ContentEncoding": "gzip"}
+        client.upload_fileobj(buf, S3_BUCKET, key, ExtraArgs=extra, Config=config)  # type: ignore[arg-type]
+    return url_for(key)
+
+
+def url_for(key: str) -> str:
+    """Return the public URL of ``key`` in the bucket."""
     base = S3_URL_PREFIX.rstrip("/") if S3_URL_PREFIX else f"https://{S3_BUCKET}.s3.amazonaws.com"
     return f"{base}/{key}"
 
 
+def upload_async(path: Path, key: str) -> Future:
+    """Start uploading ``path`` in a background thread; the future holds its URL."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=UPLOAD_THREADS, thread_name_prefix="upload")
+    return _executor.submit(bind(upload), path, key)
+
+
+def _after_fork() -> None:
+    # The pool's threads do not exist in a forked child (RQ job process),
+    # and the client's connections must not be shared with the parent
+    global _executor, _executor_lock, _s3, _s3_lock
+    _executor = None
+    _executor_lock = threading.Lock()
+    _s3 = None
+    _s3_lock = threading.Lock()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork)
+
+
 def maybe_upload_assets(paths: Iterable[Path]) -> Tuple[list[str], bool]:
     """Upload multiple files if S3 is configured.
 
-    Returns list of URLs and a flag indicating whether upload occurred.
+    Returns list of URLs and a flag indicating whether upload occurred. The
+    files are uploaded in parallel.
     """
     if not S3_BUCKET:
         return [str(p) for p in paths], False
-    urls: list[str] = []
-    for p in paths:
-        key = f"{p.parent.name}/{p.name}"
-        urls.append(upload(p, key))
-    return urls, True
+    futures = [upload_async(p, f"{p.parent.name}/{p.name}") for p in paths]
+    return [future.result() for future in futures], True
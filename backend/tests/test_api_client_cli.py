@@ -1,6 +1,8 @@
 import io
 import json
+import shutil
 import sys
+import tempfile
 import unittest
 from pathlib import Path
 from unittest.mock import patch, mock_open
@@ -57,6 +59,8 @@ class APIClientCLITests(unittest.TestCase):
         mock_poll.assert_called_once()
 
     def test_generate_with_out_dir(self):
+        out_dir = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, out_dir)
         argv = [
             "cli",
             "--token",
@@ -64,7 +68,7 @@ class APIClientCLITests(unittest.TestCase):
             "generate",
             "hi",
             "--out-dir",
-            "out",
+            str(out_dir),
         ]
         result = {"png_url": "/static/a/preview.png", "ldr_url": None, "gltf_url": None}
         with patch.object(sys, "argv", argv), \
@@ -78,6 +82,7 @@ class APIClientCLITests(unittest.TestCase):
         mock_post.assert_called_once()
         mock_poll.assert_called_once()
         mock_urlopen.assert_called_once()
+        self.assertEqual((out_dir / "preview.png").read_bytes(), b"data")
 
     def test_detect_command(self):
         argv = ["cli", "--token", "tok", "detect", "img.png"]
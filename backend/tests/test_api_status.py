@@ -0,0 +1,69 @@
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+import unittest
+
+project_root = Path(__file__).resolve().parents[2]
+vendor_root = project_root / "vendor"
+for p in (project_root, vendor_root):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from fastapi import HTTPException
+
+import backend.api as api
+
+
+class FakeAsyncRedis:
+    def __init__(self, statuses):
+        self.statuses = statuses
+        self.keys = []
+
+    async def hget(self, key, field):
+        self.keys.append((key, field))
+        status = self.statuses.get(key.rsplit(":", 1)[-1])
+        return status.encode() if status is not None else None
+
+
+class JobStatusTests(unittest.TestCase):
+    def _get(self, job_id):
+        return asyncio.run(api.generate_result_route(job_id, auth=({"sub": "t"}, "tok")))
+
+    def test_pending_job_reads_status_field_only(self):
+        fake = FakeAsyncRedis({"a": "queued", "b": "started"})
+        with patch.object(api, "async_redis", fake), patch.object(api.Job, "fetch") as fetch:
+            self.assertEqual(self._get("a").status_code, 202)
+            self.assertEqual(self._get("b").status_code, 202)
+        fetch.assert_not_called()
+        self.assertEqual(fake.keys, [("rq:job:a", "status"), ("rq:job:b", "status")])
+
+    def test_missing_and_failed_jobs(self):
+        fake = FakeAsyncRedis({"f": "failed"})
+        with patch.object(api, "async_redis", fake):
+            with self.assertRaises(HTTPException) as missing:
+                self._get("nope")
+            with self.assertRaises(HTTPException) as failed:
+                self._get("f")
+        self.assertEqual(missing.exception.status_code, 404)
+        self.assertEqual(failed.exception.status_code, 500)
+
+    def test_finished_job_fetches_result(self):
+        fake = FakeAsyncRedis({"d": "finished"})
+        job = MagicMock(result={"png_url": "x"})
+        with patch.object(api, "async_redis", fake), patch.object(api.Job, "fetch", return_value=job) as fetch:
+            self.assertEqual(self._get("d"), {"png_url": "x"})
+        fetch.assert_called_once_with("d", connection=api.redis_conn)
+
+    def test_sync_fallback_without_async_client(self):
+        job = MagicMock(is_finished=False, is_failed=False)
+        with patch.object(api, "async_redis", None), patch.object(api.Job, "fetch", return_value=job):
+            self.assertEqual(self._get("q").status_code, 202)
+        with patch.object(api, "async_redis", None), patch.object(api.Job, "fetch", side_effect=KeyError):
+            with self.assertRaises(HTTPException) as missing:
+                self._get("q")
+        self.assertEqual(missing.exception.status_code, 404)
+
+
+if __name__ == "__main__":
+    unittest.main()
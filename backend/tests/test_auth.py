@@ -2,6 +2,7 @@ import sys
 import time
 import unittest
 from pathlib import Path
+from unittest.mock import patch
 
 project_root = Path(__file__).resolve().parents[2]
 if str(project_root) not in sys.path:
@@ -28,5 +29,50 @@ class AuthTests(unittest.TestCase):
             auth.decode(token, "s3cret")
 
 
+class TokenCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.metrics = patch.dict(auth.METRICS, {k: 0 for k in auth.METRICS})
+        self.metrics.start()
+        self.cache = auth.TokenCache(size=2, ttl=60)
+
+    def tearDown(self):
+        self.metrics.stop()
+
+    def test_repeat_tokens_skip_verification(self):
+        token = auth.encode({"sub": "alice"}, "s3cret")
+        self.assertEqual(self.cache.decode(token, "s3cret")["sub"], "alice")
+        with patch.object(auth, "decode", side_effect=AssertionError) as decode:
+            self.assertEqual(self.cache.decode(token, "s3cret")["sub"], "alice")
+        decode.assert_not_called()
+        self.assertEqual(auth.METRICS, {"jwt_cache_hits": 1, "jwt_cache_misses": 1})
+
+    def test_secret_change_and_bad_tokens_not_cached(self):
+        token = auth.encode({"sub": "alice"}, "s3cret")
+        self.cache.decode(token, "s3cret")
+        with self.assertRaises(ValueError):
+            self.cache.decode(token, "rotated")
+        with self.assertRaises(ValueError):
+            self.cache.decode(token, "rotated")
+        self.assertEqual(auth.METRICS["jwt_cache_misses"], 3)
+
+    def test_entries_expire_with_token(self):
+        now = time.time()
+        token = auth.encode({"sub": "alice"}, "s3cret", exp=int(now) + 5)
+        self.cache.decode(token, "s3cret")
+        with patch.object(auth.time, "time", return_value=now + 10):
+            with self.assertRaises(ValueError):
+                self.cache.decode(token, "s3cret")
+        ttl_token = auth.encode({"sub": "bob"}, "s3cret")
+        self.cache.decode(ttl_token, "s3cret")
+        with patch.object(auth.time, "time", return_value=now + 61):
+            self.cache.decode(ttl_token, "s3cret")
+        self.assertEqual(auth.METRICS["jwt_cache_hits"], 0)
+
+    def test_cache_is_bounded(self):
+        for user in ("a", "b", "c"):
+            self.cache.decode(auth.encode({"sub": user}, "s3cret"), "s3cret")
+        self.assertEqual(len(self.cache._entries), 2)
+
+
 if __name__ == "__main__":  # pragma: no cover
     unittest.main()
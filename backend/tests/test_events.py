@@ -0,0 +1,179 @@
+import asyncio
+import json
+import queue
+import sys
+import threading
+import time
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+import unittest
+
+project_root = Path(__file__).resolve().parents[2]
+vendor_root = project_root / "vendor"
+for p in (project_root, vendor_root):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from backend import events
+from backend.events import AsyncJobEvents, JobEvents, publish_event, wait_seconds
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = messages
+
+    def subscribe(self, channel):
+        self.channel = channel
+
+    def listen(self):
+        while True:
+            yield self.messages.get()
+
+
+class FakeConn:
+    """Synchronous Redis stand-in whose pub/sub delivers to one subscriber."""
+
+    def __init__(self):
+        self.messages = queue.Queue()
+
+    def pubsub(self, **kwargs):
+        return FakePubSub(self.messages)
+
+    def publish(self, channel, data):
+        self.messages.put({"type": "message", "data": data})
+
+
+class FakeAsyncPubSub:
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def subscribe(self, channel):
+        self.channel = channel
+
+    async def listen(self):
+        while True:
+            yield await self.messages.get()
+
+    async def aclose(self):
+        pass
+
+
+class FakeAsyncClient:
+    def __init__(self):
+        self.messages = asyncio.Queue()
+
+    def pubsub(self, **kwargs):
+        return FakeAsyncPubSub(self.messages)
+
+    def publish(self, channel, data):
+        self.messages.put_nowait({"type": "message", "data": data})
+
+
+class JobEventsTests(unittest.TestCase):
+    def test_events_reach_listeners_of_their_job_only(self):
+        conn = FakeConn()
+        hub = JobEvents(conn)
+        with hub.listen("a") as a, hub.listen("b") as b:
+            self.assertTrue(hub.running)
+            publish_event(conn, "a", progress=50)
+            conn.publish(events.JOB_EVENTS_CHANNEL, b"not json")
+            publish_event(conn, "a", status="finished")
+            self.assertEqual(a.get(timeout=1), {"job_id": "a", "progress": 50})
+            self.assertEqual(a.get(timeout=1), {"job_id": "a", "status": "finished"})
+            self.assertTrue(b.empty())
+        self.assertEqual(hub._listeners, {})
+
+    def test_without_pubsub_reports_not_running(self):
+        hub = JobEvents(object())
+        start = time.monotonic()
+        with hub.listen("a"):
+            self.assertFalse(hub.running)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def test_wait_seconds_is_clamped(self):
+        self.assertEqual(wait_seconds(None), 0.0)
+        self.assertEqual(wait_seconds("abc"), 0.0)
+        self.assertEqual(wait_seconds("nan"), 0.0)
+        self.assertEqual(wait_seconds("-5"), 0.0)
+        self.assertEqual(wait_seconds("2.5"), 2.5)
+        self.assertEqual(wait_seconds(10**6), float(events.LONG_POLL_MAX))
+
+
+class LongPollTests(unittest.TestCase):
+    def test_gateway_wait_wakes_on_completion_event(self):
+        import backend.gateway as gateway
+
+        conn = FakeConn()
+        pending = MagicMock(is_finished=False, is_failed=False)
+        done = MagicMock(is_finished=True, is_failed=False)
+        fetches = iter([pending, done])
+        with patch.object(gateway, "job_events", JobEvents(conn)), \
+             patch.object(gateway.Job, "fetch", side_effect=lambda *a, **k: next(fetches)):
+            timer = threading.Timer(0.1, publish_event, (conn, "j"), {"status": "finished"})
+            timer.start()
+            start = time.monotonic()
+            job = gateway._wait_for_job("j", 10)
+            elapsed = time.monotonic() - start
+        self.assertIs(job, done)
+        self.assertLess(elapsed, 2)
+
+    def test_gateway_wait_times_out(self):
+        import backend.gateway as gateway
+
+        pending = MagicMock(is_finished=False, is_failed=False)
+        with patch.object(gateway, "job_events", JobEvents(FakeConn())), \
+             patch.object(gateway.Job, "fetch", return_value=pending):
+            start = time.monotonic()
+            self.assertIs(gateway._wait_for_job("j", 0.2), pending)
+        self.assertLess(time.monotonic() - start, 1)
+
+    def test_api_wait_wakes_on_completion_event(self):
+        import backend.api as api
+
+        statuses = ["queued", "finished"]
+
+        async def fake_status(job_id):
+            return statuses.pop(0), None
+
+        async def run():
+            client = FakeAsyncClient()
+            with patch.object(api, "job_events", AsyncJobEvents(client)), \
+                 patch.object(api, "_job_status", fake_status):
+                loop = asyncio.get_running_loop()
+                loop.call_later(0.1, lambda: publish_event(client, "j", status="finished"))
+                start = loop.time()
+                result = await api._wait_for_job("j", 10)
+                return result, loop.time() - start
+
+        (job_status, _), elapsed = asyncio.run(run())
+        self.assertEqual(job_status, "finished")
+        self.assertLess(elapsed, 2)
+
+
+class ProgressPublishTests(unittest.TestCase):
+    def test_set_progress_saves_meta_and_publishes(self):
+        import backend.worker as worker
+
+        job = MagicMock(id="j", meta={})
+        worker._set_progress(job, 100)
+        self.assertEqual(job.meta["progress"], 100)
+        job.save_meta.assert_called_once()
+        channel, data = job.connection.publish.call_args.args
+        self.assertEqual(channel, events.JOB_EVENTS_CHANNEL)
+        self.assertEqual(json.loads(data), {"job_id": "j", "progress": 100})
+
+
+class CliLongPollTests(unittest.TestCase):
+    def test_poll_requests_long_poll(self):
+        from backend import cli
+
+        resp = MagicMock(status=200)
+        resp.__enter__.return_value = resp
+        resp.read.return_value = b'{"ok": true}'
+        with patch("backend.cli.request.urlopen", return_value=resp) as urlopen:
+            self.assertEqual(cli._poll("http://x/generate/1", "t"), {"ok": True})
+        self.assertEqual(urlopen.call_args.args[0].full_url, f"http://x/generate/1?wait={cli.POLL_WAIT}")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,90 @@
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+project_root = Path(__file__).resolve().parents[2]
+vendor_root = project_root / "vendor"
+for p in (project_root, vendor_root):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from backend import generation, inference, storage, tracing  # noqa: E402
+import backend.worker as worker  # noqa: E402
+
+LDR = "1 0 0 0 0 1 0 0 0 1 0 0 0 1 3001.dat\n"
+
+
+class ExportPipelineTests(unittest.TestCase):
+    def setUp(self):
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+        model = MagicMock()
+        model.generate.return_value = {"png": b"\x89PNG", "ldr": LDR}
+        for patcher in (
+            patch.object(inference, "MODEL", model),
+            patch.object(inference, "STATIC_ROOT", self.tmp),
+            patch.object(generation, "STATIC_ROOT", self.tmp),
+            patch.object(worker, "STATIC_ROOT", self.tmp),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+
+    def test_uploads_start_while_exports_run(self):
+        preview_uploaded = threading.Event()
+        uploaded = []
+
+        def fake_upload(path, key):
+            uploaded.append(key)
+            if path.name == "preview.png":
+                preview_uploaded.set()
+            return f"https://cdn/{key}"
+
+        def fake_gltf(ldr_path, gltf_path):
+            # The preview is uploaded before the exports finish
+            self.assertTrue(preview_uploaded.wait(5))
+            gltf_path.write_text("{}")
+
+        trace = tracing.Trace()
+        with patch.object(storage, "S3_BUCKET", "b"), patch.object(storage, "_upload", side_effect=fake_upload), patch(
+            "backend.inference.ldr_to_gltf", side_effect=fake_gltf
+        ), patch("backend.inference.ldr_to_pdf", side_effect=lambda _ldr, pdf: pdf.write_bytes(b"%PDF")):
+            with tracing.tracing(trace):
+                result = generation.generate_lego_model("cube", 1)
+        run = Path(result["png_url"]).parent.name
+        self.assertEqual(result["gltf_url"], f"https://cdn/{run}/model.gltf")
+        self.assertEqual(result["instructions_url"], f"https://cdn/{run}/instructions.pdf")
+        self.assertEqual(sorted(uploaded), sorted(
+            f"{run}/{name}" for name in ("preview.png", "model.ldr", "model.gltf", "instructions.pdf")
+        ))
+        self.assertIn("first_artifact", trace.marks)
+        self.assertIn("upload", trace.stages())
+
+    def test_deferred_instructions_run_in_bulk_job(self):
+        job = MagicMock(id="j", meta={})
+        queue = MagicMock()
+        queue.enqueue.return_value.id = "pdf-job"
+        with patch.object(inference, "DEFER_INSTRUCTIONS", True), patch.object(storage, "S3_BUCKET", None), patch(
+            "backend.inference.ldr_to_pdf"
+        ) as to_pdf, patch("rq.get_current_job", return_value=job, create=True), patch(
+            "backend.worker.ResultCache"
+        ), patch("backend.worker.publish_event"), patch("backend.worker.Queue", return_value=queue) as queue_cls:
+            result = worker.generate_job("cube", 1, None)
+            to_pdf.assert_not_called()
+            run = Path(result["png_url"]).parent.name
+            self.assertTrue(result["instructions_url"].endswith(f"/{run}/instructions.pdf"))
+            self.assertEqual(queue_cls.call_args.args[0], worker.queue_name(worker.QUEUE_NAME, "bulk"))
+            queue.enqueue.assert_called_once_with(worker.instructions_job, run, LDR)
+            self.assertEqual(job.meta["instructions_job_id"], "pdf-job")
+
+            shutil.rmtree(self.tmp / run)
+            self.assertEqual(worker.instructions_job(run, LDR), {"instructions_url": result["instructions_url"]})
+        self.assertEqual((self.tmp / run / "model.ldr").read_text(), LDR)
+        self.assertEqual(to_pdf.call_args.args[1], self.tmp / run / "instructions.pdf")
+
+
+if __name__ == "__main__":
+    unittest.main()
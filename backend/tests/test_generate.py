@@ -12,6 +12,7 @@ for p in (project_root, vendor_root):
         sys.path.insert(0, str(p))
 os.environ["PYTHONPATH"] = str(project_root)
 
+from backend import inference  # noqa: E402
 from backend.generation import generate_lego_model  # noqa: E402
 
 
@@ -34,9 +35,35 @@ class GenerateTests(unittest.TestCase):
         self.assertTrue(data["ldr_url"].endswith("model.ldr"))
         self.assertTrue(data["gltf_url"].endswith("model.gltf"))
         self.assertTrue(data["instructions_url"].endswith("instructions.pdf"))
-        mock_generate.assert_called_once_with("blue cube", 42, inv)
+        mock_generate.assert_called_once()
+        self.assertEqual(mock_generate.call_args.args, ("blue cube", 42, inv))
         self.assertIsInstance(data["brick_counts"], dict)
 
 
+class BatchModel:
+    def __init__(self):
+        self.batches = []
+
+    def generate_batch(self, prompts, seeds):
+        self.batches.append((prompts, seeds))
+        return [{"png": p.encode(), "brick_counts": {"Brick": 2, "Plate": 1}} for p in prompts]
+
+
+class GenerateBatchTests(unittest.TestCase):
+    def test_batch_runs_one_model_call(self):
+        import shutil
+        import tempfile
+
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        model = BatchModel()
+        with patch.object(inference, "MODEL", model), patch.object(inference, "STATIC_ROOT", tmp):
+            outputs = inference.generate_batch([("a", 1, None), ("b", 2, {"Brick": 1})])
+        self.assertEqual(model.batches, [(["a", "b"], [1, 2])])
+        self.assertEqual([Path(o[0]).read_bytes() for o in outputs], [b"a", b"b"])
+        # Each result is trimmed to its own request's inventory
+        self.assertEqual(outputs[1][4], {"Brick": 1})
+
+
 if __name__ == "__main__":  # pragma: no cover
     unittest.main()
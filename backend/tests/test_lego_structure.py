@@ -0,0 +1,152 @@
+import random
+import sys
+import unittest
+import warnings
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[2]
+vendor_root = project_root / "vendor"
+for p in (project_root, vendor_root):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+import numpy as np  # noqa: E402
+
+from legogpt.data import CompactLegoStructure, LegoBrick, LegoStructure  # noqa: E402
+from legogpt.data import lego_library  # noqa: E402
+from legogpt.data.lego_library import (  # noqa: E402
+    brick_id_to_dimensions,
+    brick_id_to_part_id,
+    part_id_to_brick_id,
+    part_id_to_dimensions,
+)
+from legogpt.stability_analysis import ground_connected  # noqa: E402
+
+# The vendored offline-test stub only provides ``zeros``/``array``
+NUMPY_AVAILABLE = hasattr(np, "cumsum")
+
+
+def random_bricks(rng: random.Random, count: int, world_dim: int) -> list[LegoBrick]:
+    bricks = []
+    for _ in range(count):
+        h, w = rng.choice([(1, 1), (1, 2), (2, 1), (2, 4), (4, 2)])
+        bricks.append(
+            LegoBrick(
+                h=h,
+                w=w,
+                x=rng.randrange(world_dim - h + 1),
+                y=rng.randrange(world_dim - w + 1),
+                z=rng.randrange(world_dim),
+            )
+        )
+    return bricks
+
+
+@unittest.skipUnless(NUMPY_AVAILABLE, "NumPy not installed")
+class CompactLegoStructureTests(unittest.TestCase):
+    def setUp(self):
+        warnings.simplefilter("ignore")  # random structures rarely start at z=0
+
+    def test_matches_list_backed_structure(self):
+        rng = random.Random(0)
+        for _ in range(100):
+            world_dim = rng.choice([4, 8, 12])
+            bricks = random_bricks(rng, rng.randrange(40), world_dim)
+            full = LegoStructure(bricks, world_dim)
+            compact = CompactLegoStructure(bricks, world_dim)
+            self.assertEqual(compact, full)
+            self.assertEqual(compact.to_ldr(), full.to_ldr())
+            self.assertTrue((compact.voxel_occupancy == full.voxel_occupancy).all())
+            self.assertEqual(compact.has_collisions(), full.has_collisions())
+            self.assertEqual(compact.validate().floating.tolist(), [full.brick_floats(b) for b in bricks])
+            while len(full):
+                full.undo_add_brick()
+                compact.undo_add_brick()
+                self.assertEqual(compact.bricks, full.bricks)
+            self.assertFalse(compact.voxel_occupancy.any())
+
+    def test_compact_storage(self):
+        bricks = [LegoBrick(h=2, w=4, x=0, y=0, z=z) for z in range(20)] * 3
+        compact = CompactLegoStructure(bricks)
+        self.assertEqual(compact.voxel_occupancy.dtype, np.uint8)
+        self.assertEqual(compact.records.nbytes, 8 * len(bricks))
+        self.assertEqual(compact.records["z"].tolist(), [b.z for b in bricks])
+
+    def test_out_of_bounds_mask(self):
+        compact = CompactLegoStructure(
+            [LegoBrick(h=2, w=2, x=0, y=0, z=0), LegoBrick(h=2, w=2, x=19, y=0, z=0)]
+        )
+        self.assertEqual(compact.validate().out_of_bounds.tolist(), [False, True])
+        self.assertTrue(compact.has_out_of_bounds_bricks())
+
+
+@unittest.skipUnless(NUMPY_AVAILABLE, "NumPy not installed")
+class ValidateTests(unittest.TestCase):
+    def setUp(self):
+        warnings.simplefilter("ignore")
+
+    def test_report_matches_per_brick_checks(self):
+        rng = random.Random(1)
+        for _ in range(200):
+            world_dim = rng.choice([4, 8])
+            bricks = random_bricks(rng, rng.randrange(30), world_dim)
+            if rng.random() < 0.2:
+                bricks.append(LegoBrick(h=2, w=2, x=world_dim - 1, y=0, z=0))  # sticks out of the world
+            for cls in (LegoStructure, CompactLegoStructure):
+                structure = cls(bricks, world_dim)
+                report = structure.validate()
+                self.assertEqual(report.out_of_bounds.tolist(), [not structure.brick_in_bounds(b) for b in bricks])
+                self.assertEqual(
+                    report.collides.tolist(),
+                    [bool((structure.voxel_occupancy[b.slice] > 1).any()) for b in bricks],
+                )
+                self.assertEqual(report.floating.tolist(), [structure.brick_floats(b) for b in bricks])
+                self.assertEqual(report.connected.tolist(), ground_connected(bricks))
+
+    def test_report_is_cached_until_mutation(self):
+        structure = LegoStructure([LegoBrick(h=2, w=2, x=0, y=0, z=0)])
+        report = structure.validate()
+        self.assertTrue(report.valid)
+        self.assertIs(structure.validate(), report)
+        structure.add_brick(LegoBrick(h=2, w=2, x=5, y=5, z=3))
+        self.assertFalse(structure.validate().valid)
+        self.assertTrue(structure.has_floating_bricks())
+        self.assertFalse(structure.is_connected())
+        structure.undo_add_brick()
+        self.assertTrue(structure.is_connected())
+
+
+class LdrParsingTests(unittest.TestCase):
+    def test_lookup_tables_match_library(self):
+        for brick_id, properties in lego_library.items():
+            dims = (properties["height"], properties["width"])
+            self.assertEqual(brick_id_to_dimensions(int(brick_id)), dims)
+            self.assertEqual(brick_id_to_dimensions(brick_id), dims)
+            self.assertEqual(brick_id_to_part_id(int(brick_id)), properties["partID"])
+            self.assertEqual(part_id_to_dimensions(properties["partID"]), dims)
+            self.assertEqual(brick_id_to_dimensions(part_id_to_brick_id(properties["partID"])), dims)
+        with self.assertRaises(ValueError):
+            part_id_to_brick_id("9999.DAT")
+
+    def test_brick_roundtrip(self):
+        for properties in lego_library.values():
+            h, w = properties["height"], properties["width"]
+            for brick in (LegoBrick(h=h, w=w, x=1, y=2, z=3), LegoBrick(h=w, w=h, x=0, y=5, z=0)):
+                line = brick.to_ldr().split("\n")[0]
+                self.assertEqual(LegoBrick.from_ldr(line), brick)
+        with self.assertRaises(ValueError):
+            LegoBrick.from_ldr("1 115 10 0 10 1 0 0 0 1 0 0 0 1 3001.DAT")
+
+    @unittest.skipUnless(NUMPY_AVAILABLE, "NumPy not installed")
+    def test_structure_from_ldr(self):
+        warnings.simplefilter("ignore")
+        bricks = random_bricks(random.Random(2), 50, 20)
+        ldr = LegoStructure(bricks).to_ldr()
+        self.assertEqual(LegoStructure.from_ldr(ldr).bricks, bricks)
+        self.assertEqual(LegoStructure.from_ldr(ldr.replace("0 STEP\n", "")).bricks, bricks)
+        with self.assertRaises(ValueError):
+            LegoStructure.from_ldr("0 FILE model.ldr\n" + ldr)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
@@ -0,0 +1,95 @@
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest.mock import patch
+
+project_root = Path(__file__).resolve().parents[2]
+vendor_root = project_root / "vendor"
+for p in (project_root, vendor_root):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from backend import metrics  # noqa: E402
+
+
+class MetricPrimitiveTests(unittest.TestCase):
+    def test_counter_sums_thread_cells(self):
+        counter = metrics.Counter("c")
+
+        def work():
+            for _ in range(1000):
+                counter.inc()
+
+        threads = [threading.Thread(target=work) for _ in range(8)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        counter.inc(5)
+        self.assertEqual(counter.value, 8005)
+
+    def test_histogram_buckets_and_render(self):
+        hist = metrics.Histogram("h", "help", buckets=(0.1, 1.0))
+        for value in (0.05, 0.5, 0.5, 5.0):
+            hist.observe(value)
+        self.assertEqual(hist.snapshot(), {"buckets": [1, 3, 4], "sum": 6.05, "count": 4})
+        lines = hist.render()
+        self.assertIn('lego_gpt_h_bucket{le="1"} 3', lines)
+        self.assertIn('lego_gpt_h_bucket{le="+Inf"} 4', lines)
+        self.assertIn("lego_gpt_h_count 4", lines)
+
+    def test_minute_history_is_a_ring(self):
+        history = metrics.MinuteHistory("m", minutes=3)
+        for minute in range(5):
+            history.record(now=minute * 60)
+            history.record(now=minute * 60 + 30)
+        self.assertEqual(history.items(now=4 * 60), [(2, 2), (3, 2), (4, 2)])
+        self.assertEqual(len(history._slots), 3)
+        self.assertEqual(history.items(now=10 * 60), [])
+
+
+class RegistryTests(unittest.TestCase):
+    def test_snapshot_includes_dicts_and_merges(self):
+        registry = metrics.Registry()
+        registry.counter("requests").inc(2)
+        registry.histogram("latency", buckets=(1.0,)).observe(0.5)
+        registry.history("usage").record()
+        extra = {"cache_hits": 3}
+        registry.include(extra)
+        snap = registry.snapshot()
+        self.assertEqual(snap["counters"], {"requests": 2, "cache_hits": 3})
+        merged = metrics.merge([snap, json.loads(json.dumps(snap))])
+        self.assertEqual(merged["counters"], {"requests": 4, "cache_hits": 6})
+        self.assertEqual(merged["histograms"]["latency"]["counts"], [2, 0])
+        self.assertEqual(merged["history"]["usage"][0][1], 2)
+        text = metrics.render(merged)
+        self.assertIn("lego_gpt_requests 4", text)
+        self.assertIn('lego_gpt_latency_bucket{le="1"} 2', text)
+        registry.reset()
+        self.assertEqual(registry.snapshot()["counters"], {"requests": 0, "cache_hits": 0})
+
+    def test_collect_aggregates_processes(self):
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        other = {"counters": {"generate_requests": 5}, "histograms": {}, "history": {}}
+        # A live process (the parent) and one that has exited
+        (tmp / f"{os.getppid()}-aaaa.json").write_text(json.dumps(other))
+        (tmp / "999999999-bbbb.json").write_text(json.dumps(other))
+        registry = metrics.Registry()
+        registry.counter("generate_requests").inc()
+        with patch.object(metrics, "REGISTRY", registry):
+            first = metrics.collect(str(tmp))
+            second = metrics.collect(str(tmp))
+        self.assertEqual(first["counters"]["generate_requests"], 11)
+        self.assertEqual(second["counters"]["generate_requests"], 11)
+        self.assertFalse((tmp / "999999999-bbbb.json").exists())
+        self.assertTrue((tmp / "dead.json").exists())
+
+
+if __name__ == "__main__":
+    unittest.main()
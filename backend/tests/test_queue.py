@@ -1,8 +1,9 @@
 import os
 import sys
+import tempfile
 import unittest
 from pathlib import Path
-from unittest.mock import patch
+from unittest.mock import MagicMock, patch
 
 project_root = Path(__file__).resolve().parents[2]
 vendor_root = project_root / "vendor"
@@ -17,6 +18,7 @@ except Exception:  # pragma: no cover - optional dep may be missing
     fakeredis = None
 
 from rq import Queue, SimpleWorker
+from backend import tracing
 import backend.worker as worker
 
 
@@ -40,5 +42,285 @@ class QueueTests(unittest.TestCase):
             mock_gen.assert_called_once_with("cube", 1, None)
 
 
+class FakeJob:
+    def __init__(self, job_id, func_name=worker._GENERATE_JOB, args=()):
+        self.id = job_id
+        self.func_name = func_name
+        self.args = args
+        self.kwargs = {}
+        self.timeout = None
+        self.heartbeats = []
+        self.meta = {}
+        self.connection = None
+
+    def save_meta(self):
+        pass
+
+    def prepare_for_execution(self, name, pipeline=None):
+        self.worker_name = name
+
+    def heartbeat(self, now, ttl, pipeline=None):
+        self.heartbeats.append(ttl)
+
+
+class FakeConn:
+    """Just enough of a Redis client for claiming jobs off a list."""
+
+    def __init__(self):
+        self.lists = {}
+
+    def lrem(self, key, count, value):
+        items = self.lists.get(key, [])
+        if value not in items:
+            return 0
+        items.remove(value)
+        return 1
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, conn):
+        self.conn = conn
+        self.removals = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def lrem(self, key, count, value):
+        self.removals.append((key, count, value))
+
+    def execute(self):
+        return [self.conn.lrem(*args) for args in self.removals]
+
+
+class FakeQueue:
+    key = "rq:queue:legogpt"
+    DEFAULT_TIMEOUT = 180
+
+    def __init__(self, conn):
+        self.conn = conn
+
+    def get_job_ids(self, offset, length):
+        return list(self.conn.lists[self.key][offset : offset + length])
+
+
+class FakeDeathPenalty:
+    """Records the timeouts RQ's death penalty would be armed with."""
+
+    timeouts: list = []
+
+    def __init__(self, timeout, exception, **kwargs):
+        self.timeouts.append(timeout)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def fork_horse(self, job, queue):
+    """Stand-in for RQ forking a work horse that performs ``job``."""
+    return self.perform_job(job, queue)
+
+
+class BatchWorkerTests(unittest.TestCase):
+    def setUp(self):
+        self.conn = FakeConn()
+        self.queue = FakeQueue(self.conn)
+        self.worker = worker.BatchWorker([self.queue], connection=self.conn, batch_size=3)
+        self.worker.name = "w"
+        self.worker.log = MagicMock()
+        self.jobs = {
+            "a": FakeJob("a", args=("cube", 1)),
+            "d": FakeJob("d", func_name="backend.worker.detect_job"),
+            "b": FakeJob("b", args=("car",)),
+            "c": FakeJob("c", args=("boat", 3, {"Brick": 1})),
+        }
+        self.conn.lists[self.queue.key] = list(self.jobs)
+        fetch = patch.object(
+            worker.Job, "fetch_many", create=True,
+            side_effect=lambda ids, connection: [self.jobs.get(i) for i in ids],
+        )
+        fetch.start()
+        self.addCleanup(fetch.stop)
+        events = patch("backend.worker.publish_event")
+        events.start()
+        self.addCleanup(events.stop)
+        FakeDeathPenalty.timeouts = []
+        penalty = patch.object(worker.EventWorker, "death_penalty_class", FakeDeathPenalty, create=True)
+        penalty.start()
+        self.addCleanup(penalty.stop)
+
+    def test_claims_generation_jobs_only(self):
+        claimed = self.worker._claim_batch(self.queue)
+        self.assertEqual([j.id for j in claimed], ["a", "b"])
+        self.assertEqual(self.queue.get_job_ids(0, 10), ["d", "c"])
+        self.assertEqual(self.jobs["a"].worker_name, "w")
+        # Heartbeats outlast the default timeouts of the whole batch
+        self.assertEqual(self.jobs["a"].heartbeats, [420])
+
+    def test_skips_jobs_claimed_elsewhere(self):
+        self.conn.lrem(self.queue.key, 1, "a")  # dequeued by another worker
+        with patch.object(self.queue, "get_job_ids", return_value=["a", "b", "c"]):
+            claimed = self.worker._claim_batch(self.queue)
+        self.assertEqual([j.id for j in claimed], ["b"])
+
+    def test_perform_job_fans_out_batch(self):
+        performed = []
+
+        def perform(_self, job, queue):
+            performed.append((job.id, worker._BATCH_RESULTS.get(job.id)))
+            return True
+
+        leader = FakeJob("x", args=("house",))
+        with patch.object(worker.EventWorker, "perform_job", perform), patch.object(
+            worker.EventWorker, "execute_job", fork_horse, create=True
+        ), patch(
+            "backend.worker.generate_lego_models",
+            side_effect=lambda reqs: [{"prompt": r[0]} for r in reqs],
+        ) as mock_batch:
+            self.assertTrue(self.worker.execute_job(leader, self.queue))
+        mock_batch.assert_called_once_with(
+            [("house", 42, None), ("cube", 1, None), ("car", 42, None)]
+        )
+        self.assertEqual(
+            performed,
+            [("x", {"prompt": "house"}), ("a", {"prompt": "cube"}), ("b", {"prompt": "car"})],
+        )
+        self.assertEqual(worker._BATCH_RESULTS, {})
+        # The model call is bounded by the default timeouts of all three jobs
+        self.assertEqual(FakeDeathPenalty.timeouts, [540])
+
+    def test_batch_reports_stage_progress_for_every_job(self):
+        progress = []
+
+        def fake_batch(requests):
+            with tracing.stage("model"):
+                pass
+            return [{} for _ in requests]
+
+        def perform(_self, job, queue):
+            with patch("rq.get_current_job", return_value=job, create=True), patch("backend.worker.ResultCache"):
+                worker.generate_job(*job.args)
+            return True
+
+        with patch.object(worker.EventWorker, "perform_job", perform), patch.object(
+            worker.EventWorker, "execute_job", fork_horse, create=True
+        ), patch("backend.worker.generate_lego_models", side_effect=fake_batch), patch(
+            "backend.worker._set_progress", side_effect=lambda job, p: progress.append((job.id, p))
+        ):
+            self.worker.execute_job(FakeJob("x", args=("house",)), self.queue)
+        for job_id in ("x", "a", "b"):
+            self.assertEqual([p for i, p in progress if i == job_id], [0, 60, 100], job_id)
+
+    def test_batch_timeout_fails_every_job(self):
+        performed = []
+
+        def perform(_self, job, queue):
+            with patch("rq.get_current_job", return_value=job, create=True):
+                try:
+                    worker.generate_job(*job.args)
+                except worker.JobTimeoutException:
+                    performed.append(job.id)
+            return False
+
+        hang = worker.JobTimeoutException("Task exceeded maximum timeout value (540 seconds)")
+        with patch.object(worker.EventWorker, "perform_job", perform), patch.object(
+            worker.EventWorker, "execute_job", fork_horse, create=True
+        ), patch("backend.worker.generate_lego_models", side_effect=hang), patch(
+            "backend.worker.generate_lego_model"
+        ) as single, patch("backend.worker._set_progress"):
+            self.worker.execute_job(FakeJob("x", args=("house",)), self.queue)
+        single.assert_not_called()
+        self.assertEqual(performed, ["x", "a", "b"])
+        self.assertEqual(worker._BATCH_RESULTS, {})
+
+    def test_failed_batch_runs_jobs_alone(self):
+        performed = []
+
+        def perform(_self, job, queue):
+            performed.append((job.id, worker._BATCH_RESULTS.get(job.id)))
+            return True
+
+        with patch.object(worker.EventWorker, "perform_job", perform), patch.object(
+            worker.EventWorker, "execute_job", fork_horse, create=True
+        ), patch("backend.worker.generate_lego_models", side_effect=RuntimeError("oom")):
+            self.worker.execute_job(FakeJob("x", args=("house",)), self.queue)
+        self.assertEqual(performed, [("x", None), ("a", None), ("b", None)])
+
+    def test_horse_timeout_covers_whole_batch(self):
+        timeouts = {}
+
+        def monitored_horse(_self, job, queue):
+            # RQ kills the horse once it outlives job.timeout (plus grace)
+            timeouts["horse"] = job.timeout
+            return _self.perform_job(job, queue)
+
+        def perform(_self, job, queue):
+            timeouts.setdefault(job.id, job.timeout)
+            return True
+
+        self.jobs["a"].timeout = 50
+        leader = FakeJob("x", args=("house",))
+        leader.timeout = 100
+        with patch.object(worker.EventWorker, "perform_job", perform), patch.object(
+            worker.EventWorker, "execute_job", monitored_horse, create=True
+        ), patch("backend.worker.generate_lego_models", side_effect=lambda reqs: [{} for _ in reqs]):
+            self.worker.execute_job(leader, self.queue)
+        # Leader, "a" and "b" with the queue's default timeout
+        self.assertEqual(timeouts, {"horse": 330, "x": 100, "a": 50, "b": None})
+        self.assertEqual(leader.timeout, 100)
+        self.assertEqual(self.jobs["a"].heartbeats, [390])
+        self.assertEqual(worker._batch_timeout([leader, FakeJob("y")], self.queue), 280)
+        unlimited = FakeJob("z")
+        unlimited.timeout = -1
+        self.assertEqual(worker._batch_timeout([leader, unlimited], self.queue), -1)
+
+
+class WarmWorkerTests(unittest.TestCase):
+    def test_ready_only_after_warm_up(self):
+        ready = Path(tempfile.mkdtemp()) / "ready"
+        self.addCleanup(ready.parent.rmdir)
+        events = []
+
+        class Recorder:
+            def __init__(self, queues, **kwargs):
+                events.append(("init", queues, kwargs))
+
+            def work(self):
+                events.append(("work", ready.exists()))
+
+        with patch("backend.worker.Redis.from_url"), patch("backend.worker.metrics.start_flusher"), patch(
+            "backend.worker.warm_up", side_effect=lambda: events.append(("warm", ready.exists())) or 0.1
+        ), patch("backend.worker.worker_class", return_value=Recorder) as mock_class:
+            worker.run_worker(batch_size=1, preload=True, fork=False, ready_file=str(ready), queues="q")
+        mock_class.assert_called_once_with(1, False)
+        self.assertEqual(events, [("warm", False), ("init", ["q"], {"weights": [1.0]}), ("work", True)])
+        self.assertFalse(ready.exists())
+
+    def test_no_preload_skips_warm_up(self):
+        with patch("backend.worker.Redis.from_url"), patch("backend.worker.metrics.start_flusher"), patch(
+            "backend.worker.warm_up"
+        ) as mock_warm, patch("backend.worker.worker_class") as mock_class:
+            worker.run_worker(queue_name="q", batch_size=4, preload=False, ready_file=None, queues=None)
+        mock_warm.assert_not_called()
+        # The generation queues derived from the queue name, by priority
+        mock_class.return_value.assert_called_once_with(
+            ["q-high", "q", "q-bulk"], weights=[4.0, 2.0, 1.0], batch_size=4
+        )
+
+    def test_worker_class_without_fork_runs_in_process(self):
+        self.assertIs(worker.worker_class(1, True), worker.EventWorker)
+        cls = worker.worker_class(3, False)
+        self.assertTrue(issubclass(cls, worker.BatchWorker))
+        self.assertTrue(issubclass(cls, SimpleWorker))
+
+
 if __name__ == "__main__":  # pragma: no cover
     unittest.main()
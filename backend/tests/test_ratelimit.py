@@ -0,0 +1,153 @@
+import asyncio
+import os
+import subprocess
+import sys
+import unittest
+import uuid
+from pathlib import Path
+from unittest.mock import patch
+
+project_root = Path(__file__).resolve().parents[2]
+vendor_root = project_root / "vendor"
+for p in (project_root, vendor_root):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from backend import ratelimit  # noqa: E402
+
+REDIS_URL = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+
+class FakeScriptConn:
+    """Redis client whose Lua script returns queued grants."""
+
+    def __init__(self, grants):
+        self.grants = list(grants)
+        self.calls = []
+
+    def register_script(self, source):
+        def script(keys, args):
+            self.calls.append((keys, args))
+            return self.grants.pop(0)
+
+        return script
+
+
+class FakeAsyncScriptConn(FakeScriptConn):
+    def register_script(self, source):
+        script = super().register_script(source)
+
+        async def run(keys, args):
+            return script(keys, args)
+
+        return run
+
+
+class BrokenConn:
+    def register_script(self, source):
+        raise ConnectionError("redis down")
+
+
+def _real_redis_python() -> list[str] | None:
+    """Return a command running Python with the real redis client, if reachable."""
+    probe = f"from redis import Redis; Redis.from_url({REDIS_URL!r}, socket_timeout=1).ping()"
+    try:
+        result = subprocess.run(
+            [sys.executable, "-c", probe], cwd=project_root, capture_output=True, timeout=10
+        )
+    except (OSError, subprocess.TimeoutExpired):
+        return None
+    return [sys.executable, "-c"] if result.returncode == 0 else None
+
+
+class RateLimiterTests(unittest.TestCase):
+    def setUp(self):
+        self.metrics = patch.dict(ratelimit.METRICS, {k: 0 for k in ratelimit.METRICS})
+        self.metrics.start()
+
+    def tearDown(self):
+        self.metrics.stop()
+
+    def test_leases_admit_locally(self):
+        conn = FakeScriptConn([3, 0])
+        limiter = ratelimit.RateLimiter(conn)
+        self.assertEqual([limiter.hit("tok", 10) for _ in range(4)], [True, True, True, False])
+        self.assertEqual(len(conn.calls), 2)
+        self.assertEqual(ratelimit.METRICS["rate_limit_local"], 2)
+        keys, args = conn.calls[0]
+        self.assertNotIn("tok", keys[0])
+        self.assertEqual(args[0], 10)
+
+    def test_async_leases(self):
+        conn = FakeAsyncScriptConn([2, 0])
+        limiter = ratelimit.RateLimiter(None, conn)
+
+        async def run():
+            return [await limiter.ahit("tok", 5) for _ in range(3)]
+
+        self.assertEqual(asyncio.run(run()), [True, True, False])
+        self.assertEqual(len(conn.calls), 2)
+
+    def test_batches_are_admitted_whole(self):
+        conn = FakeScriptConn([4, 0])
+        limiter = ratelimit.RateLimiter(conn)
+        self.assertTrue(limiter.hit("tok", 10, 3))
+        self.assertEqual(conn.calls[0][1][5], 3)
+        # One request left on the lease is not enough for two
+        self.assertFalse(limiter.hit("tok", 10, 2))
+        self.assertTrue(limiter.hit("tok", 10))
+
+    def test_rejected_batch_uses_no_quota(self):
+        limiter = ratelimit.RateLimiter(BrokenConn())
+        with self.assertLogs("backend.ratelimit", "WARNING"):
+            self.assertTrue(limiter.hit("tok", 4, 3))
+            self.assertFalse(limiter.hit("tok", 4, 2))
+            self.assertTrue(limiter.hit("tok", 4))
+            self.assertFalse(limiter.hit("tok", 4))
+
+    def test_local_state_is_bounded(self):
+        limiter = ratelimit.RateLimiter(FakeScriptConn([5] * 10), local_size=3)
+        for i in range(10):
+            limiter.hit(f"tok{i}", 10)
+        self.assertEqual(len(limiter._leases), 3)
+
+    def test_fallback_without_redis(self):
+        limiter = ratelimit.RateLimiter(BrokenConn())
+        with self.assertLogs("backend.ratelimit", "WARNING"):
+            results = [limiter.hit("tok", 2) for _ in range(3)]
+        self.assertEqual(results, [True, True, False])
+        self.assertTrue(limiter.hit("other", 2))
+        self.assertEqual(ratelimit.METRICS["rate_limit_fallback"], 4)
+
+    def test_fallback_weights_previous_window(self):
+        limiter = ratelimit.RateLimiter(BrokenConn(), window=60)
+        with self.assertLogs("backend.ratelimit", "WARNING"), patch.object(ratelimit.time, "time", return_value=600.0):
+            self.assertEqual([limiter.hit("tok", 4) for _ in range(5)], [True] * 4 + [False])
+        # Three quarters into the next window a quarter of the old count remains
+        with patch.object(ratelimit.time, "time", return_value=705.0):
+            self.assertEqual([limiter.hit("tok", 4) for _ in range(4)], [True] * 3 + [False])
+
+
+@unittest.skipUnless(_real_redis_python(), f"Redis not reachable at {REDIS_URL}")
+class SharedLimitTests(unittest.TestCase):
+    def test_limit_holds_across_processes(self):
+        prefix = f"legogpt:test:{uuid.uuid4()}:"
+        code = (
+            "from redis import Redis\n"
+            "from backend.ratelimit import RateLimiter\n"
+            f"limiter = RateLimiter(Redis.from_url({REDIS_URL!r}), prefix={prefix!r}, window=3600)\n"
+            "print(sum(limiter.hit('shared-token', 100) for _ in range(60)))\n"
+        )
+        procs = [
+            subprocess.Popen([sys.executable, "-c", code], cwd=project_root, stdout=subprocess.PIPE)
+            for _ in range(4)
+        ]
+        admitted = [int(proc.communicate(timeout=60)[0]) for proc in procs]
+        self.assertTrue(all(proc.returncode == 0 for proc in procs))
+        # 240 requests against a limit of 100: leases may only make it stricter
+        self.assertLessEqual(sum(admitted), 100)
+        self.assertGreaterEqual(sum(admitted), 90)
+
+
+if __name__ == "__main__":
+    unittest.main()
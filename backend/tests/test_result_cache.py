@@ -0,0 +1,183 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+project_root = Path(__file__).resolve().parents[2]
+vendor_root = project_root / "vendor"
+for p in (project_root, vendor_root):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from backend import result_cache as rc  # noqa: E402
+from backend.cleanup import cleanup  # noqa: E402
+
+
+class FakeRedis:
+    """Dict-backed stand-in for the Redis calls the cache makes."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+        self.hashes = {}
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def mget(self, keys):
+        return [self.data.get(key) for key in keys]
+
+    def set(self, key, value, ex=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value.encode() if isinstance(value, str) else value
+        self.ttls[key] = ex
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def hget(self, key, field):
+        return self.hashes.get(key, {}).get(field)
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, conn):
+        self.conn = conn
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: self.calls.append((name, args, kwargs))
+
+    def execute(self):
+        return [getattr(self.conn, name)(*args, **kwargs) for name, args, kwargs in self.calls]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+def _result(run: str) -> dict:
+    return {"png_url": f"/static/{run}/preview.png", "ldr_url": None, "brick_counts": {}}
+
+
+class ResultKeyTests(unittest.TestCase):
+    def test_key_normalizes_prompt_whitespace(self):
+        key = rc.result_key("red  car ", 1, None)
+        self.assertEqual(key, rc.result_key("red car", 1, None))
+        self.assertEqual(key, rc.result_key("red\tcar", 1, None))
+        self.assertNotEqual(key, rc.result_key("Red car", 1, None))
+
+    def test_key_covers_seed_inventory_and_version(self):
+        key = rc.result_key("car", 1, {"a": 1, "b": 2})
+        self.assertEqual(key, rc.result_key("car", 1, {"b": 2, "a": 1}))
+        self.assertNotEqual(key, rc.result_key("car", 2, {"a": 1, "b": 2}))
+        self.assertNotEqual(key, rc.result_key("car", 1, None))
+        with patch.dict(os.environ, {"LEGOGPT_MODEL": "other"}):
+            self.assertNotEqual(key, rc.result_key("car", 1, {"a": 1, "b": 2}))
+
+
+class ResultCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.conn = FakeRedis()
+        self.cache = rc.ResultCache(self.conn, ttl=60, prefix="r:")
+
+    def test_put_and_get(self):
+        self.assertIsNone(self.cache.get("k"))
+        self.cache.put("k", _result("run1"))
+        self.assertEqual(self.cache.get("k"), _result("run1"))
+        self.assertEqual(self.conn.data["r:run:run1"], b"k")
+        self.assertEqual(set(self.conn.ttls.values()), {60})
+        self.assertEqual(self.cache.get_many(["k", "x"]), [_result("run1"), None])
+
+    def test_disabled_without_ttl(self):
+        cache = rc.ResultCache(self.conn, ttl=0)
+        cache.put("k", _result("run1"))
+        self.assertEqual(self.conn.data, {})
+        self.assertIsNone(cache.get("k"))
+
+    def test_unreachable_redis_is_a_miss(self):
+        cache = rc.ResultCache(object(), ttl=60)
+        with self.assertLogs("backend.result_cache", "WARNING"):
+            self.assertIsNone(cache.get("k"))
+
+    def test_cleanup_forgets_removed_runs(self):
+        root = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, root)
+        for run in ("old", "new"):
+            (root / run).mkdir()
+            self.cache.put(run, _result(run))
+        past = time.time() - 2 * 86400
+        os.utime(root / "old", (past, past))
+        self.assertEqual(cleanup(root, days=1, cache=self.cache), 1)
+        self.assertIsNone(self.cache.get("old"))
+        self.assertEqual(self.cache.get("new"), _result("new"))
+        self.assertNotIn("r:run:old", self.conn.data)
+
+
+class InFlightTests(unittest.TestCase):
+    def setUp(self):
+        self.conn = FakeRedis()
+        self.in_flight = rc.InFlight(self.conn, ttl=60, prefix="r:")
+
+    def _status(self, job_id, status):
+        self.conn.hashes[f"rq:job:{job_id}"] = {"status": status.encode()}
+
+    def test_identical_requests_share_a_job(self):
+        before = rc.METRICS["generate_coalesced"]
+        (first, new), (second, dup), (other, _) = self.in_flight.claim_many(["k", "k", "j"])
+        self.assertTrue(new)
+        self.assertEqual((second, dup), (first, False))
+        self.assertNotEqual(other, first)
+        self._status(first, "started")
+        self.assertEqual(self.in_flight.claim_many(["k"]), [(first, False)])
+        self.assertEqual(rc.METRICS["generate_coalesced"] - before, 2)
+
+    def test_failed_and_lost_jobs_are_replaced(self):
+        ((first, _),) = self.in_flight.claim_many(["k"])
+        self._status(first, "failed")
+        ((second, new),) = self.in_flight.claim_many(["k"])
+        self.assertTrue(new)
+        self.assertNotEqual(second, first)
+        # Never enqueued: replaced once the grace period is over
+        with patch.object(rc.time, "time", return_value=time.time() + rc._ENQUEUE_GRACE + 1):
+            ((third, new),) = self.in_flight.claim_many(["k"])
+        self.assertTrue(new)
+        self.assertNotEqual(third, second)
+
+    def test_release_only_own_job(self):
+        ((first, _),) = self.in_flight.claim_many(["k"])
+        self.in_flight.release("k", "someone-else")
+        self.assertIn("r:inflight:k", self.conn.data)
+        self.in_flight.release("k", first)
+        self.assertNotIn("r:inflight:k", self.conn.data)
+
+    def test_submit_jobs_enqueues_only_new_work(self):
+        cache = rc.ResultCache(self.conn, ttl=60, prefix="r:")
+        cached_key = rc.result_key("cached", 1, None)
+        cache.put(cached_key, _result("run1"))
+        queue = MagicMock()
+        queue.enqueue_many.side_effect = lambda datas: [MagicMock(id=d.kwargs["job_id"]) for d in datas]
+        queue.prepare_data.side_effect = lambda func, args, **kwargs: MagicMock(args=args, kwargs=kwargs)
+        calls = [("cached", 1, None), ("new", 1, None), ("new", 1, None), ("other", 2, None)]
+        submitted = rc.submit_jobs(queue, "generate", calls, [{}] * 4, cache, self.in_flight)
+        self.assertEqual(submitted[0], (f"cached-{cached_key}", _result("run1")))
+        self.assertEqual(submitted[1], submitted[2])
+        enqueued = [d.args for d in queue.enqueue_many.call_args.args[0]]
+        self.assertEqual(enqueued, [("new", 1, None), ("other", 2, None)])
+        meta = queue.prepare_data.call_args.kwargs["meta"]
+        self.assertEqual(meta["result_key"], rc.result_key("other", 2, None))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,6 @@
+import gzip
 import os
+import shutil
 import sys
 import tempfile
 import unittest
@@ -21,13 +23,15 @@ class S3UploadTests(unittest.TestCase):
         os.environ["S3_URL_PREFIX"] = "http://cdn"
         import importlib
         importlib.reload(storage)
-        with patch.object(storage, "boto3") as mock_boto:
+        with patch.object(storage, "boto3") as mock_boto, patch.object(
+            storage, "Config", create=True
+        ), patch.object(storage, "TransferConfig", create=True):
             mock_client = MagicMock()
             mock_boto.client.return_value = mock_client
             urls, uploaded = storage.maybe_upload_assets([f])
             self.assertTrue(uploaded)
-            mock_client.upload_file.assert_called_once()
-            args, kwargs = mock_client.upload_file.call_args
+            mock_client.upload_fileobj.assert_called_once()
+            args, kwargs = mock_client.upload_fileobj.call_args
             self.assertIn("ExtraArgs", kwargs)
             self.assertEqual(kwargs["ExtraArgs"].get("ContentEncoding"), "gzip")
             self.assertEqual(urls[0], "http://cdn/" + f"{f.parent.name}/{f.name}")
@@ -35,5 +39,47 @@ class S3UploadTests(unittest.TestCase):
         del os.environ["S3_URL_PREFIX"]
 
 
+class PooledUploadTests(unittest.TestCase):
+    def setUp(self):
+        self.client = MagicMock()
+        self.client.upload_fileobj.side_effect = lambda buf, *a, **kw: self.bodies.append(buf.read())
+        self.bodies = []
+        self.boto = MagicMock()
+        self.boto.client.return_value = self.client
+        for patcher in (
+            patch.object(storage, "S3_BUCKET", "b"),
+            patch.object(storage, "S3_URL_PREFIX", "http://cdn"),
+            patch.object(storage, "boto3", self.boto),
+            patch.object(storage, "Config", create=True),
+            patch.object(storage, "TransferConfig", create=True),
+            patch.object(storage, "_s3", None),
+        ):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        self.tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, self.tmp)
+
+    def test_client_is_shared_and_assets_keep_order(self):
+        paths = []
+        for name in ("model.ldr", "model.gltf", "preview.png"):
+            paths.append(self.tmp / name)
+            paths[-1].write_bytes(b"data " * 100)
+        urls, uploaded = storage.maybe_upload_assets(paths)
+        self.assertTrue(uploaded)
+        self.assertEqual(urls, [f"http://cdn/{self.tmp.name}/{p.name}" for p in paths])
+        self.boto.client.assert_called_once()
+        storage.TransferConfig.assert_called_with(
+            multipart_threshold=storage.UPLOAD_MULTIPART_THRESHOLD,
+            multipart_chunksize=storage.UPLOAD_MULTIPART_THRESHOLD,
+            max_concurrency=storage.UPLOAD_MULTIPART_CONCURRENCY,
+        )
+        # Text is gzipped in memory, the PNG is sent as is
+        self.assertEqual([gzip.decompress(body) for body in self.bodies], [b"data " * 100] * 2)
+        self.client.upload_file.assert_called_once()
+        args, kwargs = self.client.upload_file.call_args
+        self.assertEqual(args[0], str(paths[2]))
+        self.assertEqual(kwargs["ExtraArgs"], {"ContentType": "image/png"})
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,115 @@
+import random
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock
+
+project_root = Path(__file__).resolve().parents[2]
+vendor_root = project_root / "vendor"
+for p in (project_root, vendor_root):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from backend import scheduler as sched  # noqa: E402
+from backend.worker import EventWorker  # noqa: E402
+
+
+class FakeRedis:
+    """Dict-backed stand-in for the counter calls the scheduler makes."""
+
+    def __init__(self):
+        self.data = {}
+        self.ttls = {}
+
+    def incrby(self, key, amount):
+        self.data[key] = self.data.get(key, 0) + amount
+        return self.data[key]
+
+    def expire(self, key, seconds):
+        self.ttls[key] = seconds
+        return True
+
+    def pipeline(self):
+        return FakePipeline(self)
+
+
+class FakePipeline:
+    def __init__(self, conn):
+        self.conn = conn
+        self.calls = []
+
+    def __getattr__(self, name):
+        return lambda *args: self.calls.append((name, args))
+
+    def execute(self):
+        return [getattr(self.conn, name)(*args) for name, args in self.calls]
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+class RoutingTests(unittest.TestCase):
+    def setUp(self):
+        self.conn = FakeRedis()
+        self.scheduler = sched.Scheduler(self.conn, enabled=True, fair_share=3, window=60, large_cost=10)
+
+    def test_job_classes(self):
+        self.assertEqual(self.scheduler.job_class("detect", {"sub": "a"}), "detect")
+        self.assertEqual(self.scheduler.job_class("generate", {"sub": "a"}, cost=2), "normal")
+        self.assertEqual(self.scheduler.job_class("generate", {"sub": "b", "tier": "pro"}), "high")
+        self.assertEqual(self.scheduler.job_class("generate", {"sub": "c", "role": "admin"}), "high")
+        self.assertEqual(self.scheduler.job_class("generate", {"sub": "d", "tier": "pro"}, cost=10), "bulk")
+
+    def test_users_over_fair_share_drop_one_class(self):
+        claims = {"sub": "heavy", "tier": "pro"}
+        self.assertEqual(self.scheduler.job_class("generate", claims, count=3), "high")
+        self.assertEqual(self.scheduler.job_class("generate", claims), "normal")
+        self.assertEqual(self.scheduler.job_class("generate", {"sub": "heavy"}), "bulk")
+        # Other users are unaffected
+        self.assertEqual(self.scheduler.job_class("generate", {"sub": "light"}), "normal")
+        self.assertEqual(set(self.conn.ttls.values()), {60})
+
+    def test_route_returns_sibling_queues(self):
+        queue = MagicMock()
+        queue.name = "q"
+        self.assertIs(self.scheduler.route(queue, "generate", {"sub": "a"}), queue)
+        detect = self.scheduler.route(queue, "detect", {"sub": "a"})
+        self.assertEqual(detect.name, "q-detect")
+        self.assertIs(detect.connection, queue.connection)
+        disabled = sched.Scheduler(self.conn, enabled=False)
+        self.assertIs(disabled.route(queue, "detect", {"sub": "a"}), queue)
+
+    def test_unreachable_redis_demotes_nobody(self):
+        scheduler = sched.Scheduler(object(), enabled=True, fair_share=1)
+        with self.assertLogs("backend.scheduler", "WARNING"):
+            self.assertEqual(scheduler.job_class("generate", {"sub": "a"}, count=5), "normal")
+
+    def test_estimate_cost(self):
+        self.assertEqual(sched.estimate_cost("a  red car"), 3)
+        self.assertEqual(sched.estimate_cost("car", {"3001": 4, "3003": 2}), 3)
+
+
+class WeightTests(unittest.TestCase):
+    def test_parse_weights(self):
+        self.assertEqual(sched.parse_weights("a=3, b,c=0.5"), [("a", 3.0), ("b", 1.0), ("c", 0.5)])
+        for spec in ("", "a=0", "a=x", "=2"):
+            with self.assertRaises(ValueError):
+                sched.parse_weights(spec)
+
+    def test_weighted_order_follows_weights(self):
+        rng = random.Random(1)
+        firsts = [sched.weighted_order(["a", "b", "c"], [6, 3, 1], rng)[0] for _ in range(10000)]
+        self.assertAlmostEqual(firsts.count("a") / 10000, 0.6, delta=0.03)
+        self.assertAlmostEqual(firsts.count("c") / 10000, 0.1, delta=0.03)
+
+    def test_worker_reorders_by_weight(self):
+        worker = EventWorker(["a", "b"], weights=[1.0, 1e9])
+        worker.reorder_queues(worker.queues[0])
+        self.assertEqual(worker._ordered_queues, ["b", "a"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -34,9 +34,10 @@ class ServerTests(unittest.TestCase):
         self.server.PREFERENCES_ROOT = self.tmp_prefs
         self.token = auth.encode({"sub": "t"}, "testsecret")
         self.admin_token = auth.encode({"sub": "a", "role": "admin"}, "testsecret")
-        self.httpd = self.server.HTTPServer(("127.0.0.1", 0), self.server.Handler)
+        self.httpd = self.server.GatewayServer(("127.0.0.1", 0), self.server.Handler)
         self.port = self.httpd.server_address[1]
-        self.thread = threading.Thread(target=self.httpd.serve_forever)
+        # Requests run on pool threads, so shutdown waits out the poll interval
+        self.thread = threading.Thread(target=self.httpd.serve_forever, kwargs={"poll_interval": 0.05})
         self.thread.start()
 
     def tearDown(self):
@@ -153,9 +154,92 @@ class ServerTests(unittest.TestCase):
         self.assertEqual(status, 429)
 
     @patch("backend.gateway.queue")
-    def test_detect_inventory_post(self, mock_queue):
-        mock_job = MagicMock(id="xyz")
-        mock_queue.enqueue.return_value = mock_job
+    def test_generate_served_from_result_cache(self, mock_queue):
+        cached = {"png_url": "/static/run/preview.png", "brick_counts": {}}
+        self.server.result_cache = MagicMock()
+        self.server.result_cache.get_many.return_value = [cached]
+        self.server.result_cache.get.return_value = cached
+        self.server.scheduler = MagicMock()
+        status, data = self._request("POST", "/generate", body=b'{"prompt":"cube","seed":1}', token=self.token)
+        self.assertEqual(status, 200)
+        payload = json.loads(data)
+        self.assertTrue(payload["cached"])
+        self.assertEqual(payload["result"], cached)
+        self.assertTrue(payload["job_id"].startswith("cached-"))
+        mock_queue.enqueue.assert_not_called()
+        # Nothing was enqueued, so nothing counts towards fair share
+        self.server.scheduler.route.assert_not_called()
+        (key,) = self.server.result_cache.get_many.call_args.args[0]
+        self.assertEqual(payload["job_id"], f"cached-{key}")
+
+        status, data = self._request("GET", f"/generate/cached-{key}", token=self.token)
+        self.assertEqual((status, json.loads(data)), (200, cached))
+        self.server.rate_limiter.clear()
+        self.server.result_cache.get.return_value = None
+        status, _ = self._request("GET", "/generate/cached-gone", token=self.token)
+        self.assertEqual(status, 404)
+
+    @patch("backend.gateway.queue")
+    def test_generate_batch_post(self, mock_queue):
+        mock_queue.enqueue_many.return_value = [MagicMock(id="a"), MagicMock(id="b")]
+        body = {"requests": [{"prompt": "cube", "seed": 1}, {"prompt": "car", "inventory_filter": {"Brick": 2}}]}
+        status, data = self._request("POST", "/generate/batch", body=json.dumps(body).encode(), token=self.token)
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(data)["job_ids"], ["a", "b"])
+        mock_queue.enqueue_many.assert_called_once()
+        calls = [c.args[1] for c in mock_queue.prepare_data.call_args_list]
+        self.assertEqual(calls, [("cube", 1, None), ("car", 42, {"Brick": 2})])
+        self.assertEqual(mock_queue.prepare_data.call_args.kwargs["meta"]["user"], "t")
+
+    @patch("backend.gateway.queue")
+    def test_generate_batch_routes_only_new_jobs(self, mock_queue):
+        cached = {"png_url": "/static/run/preview.png", "brick_counts": {}}
+        self.server.result_cache = MagicMock()
+        self.server.result_cache.get_many.return_value = [cached, None]
+        self.server.scheduler = MagicMock()
+        target = self.server.scheduler.route.return_value
+        target.enqueue.return_value = MagicMock(id="b")
+        body = {"requests": [{"prompt": "cube"}, {"prompt": "a much longer car prompt"}]}
+        status, data = self._request("POST", "/generate/batch", body=json.dumps(body).encode(), token=self.token)
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(data)["job_ids"][1], "b")
+        # Only the uncached prompt is charged and prices the route
+        args = self.server.scheduler.route.call_args.args
+        self.assertEqual(args[3:], (self.server.estimate_cost("a much longer car prompt"), 1))
+        self.assertEqual(target.enqueue.call_args.args[1], "a much longer car prompt")
+
+    @patch("backend.gateway.queue")
+    def test_generate_batch_rejects_bad_batches(self, mock_queue):
+        self.server.GENERATE_BATCH_MAX = 1
+        for body, expected in (
+            ({"requests": []}, 400),
+            ({"requests": [{"prompt": "p", "inventory_filter": 1}]}, 400),
+            ({"requests": "p"}, 400),
+            ({"requests": [{}, {}]}, 413),
+        ):
+            self.server.rate_limiter.clear()
+            status, _ = self._request("POST", "/generate/batch", body=json.dumps(body).encode(), token=self.token)
+            self.assertEqual(status, expected, body)
+        mock_queue.enqueue_many.assert_not_called()
+
+    @patch("backend.gateway.queue")
+    def test_generate_batch_counts_each_prompt(self, mock_queue):
+        # RATE_LIMIT is 2, so a batch of three prompts is over the limit
+        body = json.dumps({"requests": [{}, {}, {}]}).encode()
+        status, _ = self._request("POST", "/generate/batch", body=body, token=self.token)
+        self.assertEqual(status, 429)
+        mock_queue.enqueue_many.assert_not_called()
+        # The rejected batch used none of the quota
+        mock_queue.enqueue_many.return_value = [MagicMock(id="a"), MagicMock(id="b")]
+        body = json.dumps({"requests": [{}, {}]}).encode()
+        status, _ = self._request("POST", "/generate/batch", body=body, token=self.token)
+        self.assertEqual(status, 200)
+
+    @patch("backend.scheduler.Queue")
+    @patch("backend.gateway.queue")
+    def test_detect_inventory_post(self, mock_queue, mock_detect_queue):
+        mock_queue.name = "legogpt"
+        mock_detect_queue.return_value.enqueue.return_value = MagicMock(id="xyz")
 
         status, data = self._request(
             "POST",
@@ -166,7 +250,21 @@ class ServerTests(unittest.TestCase):
         self.assertEqual(status, 200)
         payload = json.loads(data)
         self.assertEqual(payload["job_id"], "xyz")
-        mock_queue.enqueue.assert_called_once()
+        # Detections skip the generation queue
+        mock_detect_queue.assert_called_once_with("legogpt-detect", connection=mock_queue.connection)
+        mock_queue.enqueue.assert_not_called()
+
+    @patch("backend.scheduler.Queue")
+    @patch("backend.gateway.queue")
+    def test_generate_priority_tier_routed(self, mock_queue, mock_sibling):
+        mock_queue.name = "legogpt"
+        mock_sibling.return_value.enqueue.return_value = MagicMock(id="abc")
+        token = auth.encode({"sub": "p", "tier": "pro"}, "testsecret")
+
+        status, data = self._request("POST", "/generate", body=b'{"prompt":"cube"}', token=token)
+        self.assertEqual(status, 200)
+        self.assertEqual(json.loads(data)["job_id"], "abc")
+        mock_sibling.assert_called_once_with("legogpt-high", connection=mock_queue.connection)
 
     @patch("backend.gateway.queue")
     def test_detect_inventory_invalid_base64(self, mock_queue):
@@ -204,6 +302,88 @@ class ServerTests(unittest.TestCase):
         self.assertEqual(headers.get("Content-Type"), "model/gltf+json")
         shutil.rmtree(tmp)
 
+    def _static_file(self, name: str, data: bytes) -> str:
+        import tempfile
+        import shutil
+        from pathlib import Path
+
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        run_dir = tmp / "0b6a3bd2-5a3e-4a4b-9d0c-2f1e7c9f4a11"
+        run_dir.mkdir()
+        (run_dir / name).write_bytes(data)
+        self.server.STATIC_ROOT = tmp.resolve()
+        return f"/static/{run_dir.name}/{name}"
+
+    def _get_static(self, path: str, headers: dict[str, str], method: str = "GET"):
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        conn.request(method, path, headers=headers)
+        resp = conn.getresponse()
+        data = resp.read()
+        conn.close()
+        return resp.status, data, dict(resp.getheaders())
+
+    def test_static_cache_headers_and_etag(self):
+        path = self._static_file("model.ldr", b"1 4 0 0 0\n" * 100)
+        status, data, headers = self._get_static(path, {})
+        self.assertEqual(status, 200)
+        self.assertEqual(len(data), 1000)
+        self.assertIn("immutable", headers.get("Cache-Control", ""))
+        self.assertIn("Last-Modified", headers)
+        status, data, not_modified = self._get_static(path, {"If-None-Match": headers["ETag"]})
+        self.assertEqual(status, 304)
+        self.assertEqual(data, b"")
+        self.assertEqual(not_modified["ETag"], headers["ETag"])
+        self.assertEqual(not_modified["Last-Modified"], headers["Last-Modified"])
+        for name in ("Content-Length", "Content-Type", "Content-Encoding", "Accept-Ranges"):
+            self.assertNotIn(name, not_modified)
+        status, _, _ = self._get_static(path, {"If-Modified-Since": headers["Last-Modified"]})
+        self.assertEqual(status, 304)
+        status, data, _ = self._get_static(path, {"If-None-Match": '"other"'})
+        self.assertEqual(status, 200)
+        self.assertEqual(len(data), 1000)
+
+    def test_static_range_requests(self):
+        body = bytes(range(256))
+        path = self._static_file("model.gltf", body)
+        status, data, headers = self._get_static(path, {"Range": "bytes=10-19"})
+        self.assertEqual(status, 206)
+        self.assertEqual(data, body[10:20])
+        self.assertEqual(headers.get("Content-Range"), "bytes 10-19/256")
+        status, data, _ = self._get_static(path, {"Range": "bytes=-6"})
+        self.assertEqual(status, 206)
+        self.assertEqual(data, body[-6:])
+        status, _, headers = self._get_static(path, {"Range": "bytes=300-"})
+        self.assertEqual(status, 416)
+        self.assertEqual(headers.get("Content-Range"), "bytes */256")
+
+    def test_static_serves_gzip_sibling(self):
+        import gzip
+        from pathlib import Path
+
+        body = b'{"asset": {"version": "2.0"}}' * 50
+        path = self._static_file("model.gltf", body)
+        from backend.static_files import precompress
+
+        precompress(Path(self.server.STATIC_ROOT) / path[len("/static/") :])
+        status, data, headers = self._get_static(path, {"Accept-Encoding": "gzip"})
+        self.assertEqual(status, 200)
+        self.assertEqual(headers.get("Content-Encoding"), "gzip")
+        self.assertEqual(headers.get("Content-Type"), "model/gltf+json")
+        self.assertEqual(headers.get("Vary"), "Accept-Encoding")
+        self.assertEqual(gzip.decompress(data), body)
+        status, data, headers = self._get_static(path, {})
+        self.assertNotIn("Content-Encoding", headers)
+        self.assertEqual(data, body)
+
+    def test_static_head(self):
+        path = self._static_file("preview.png", b"x" * 64)
+        status, data, headers = self._get_static(path, {}, method="HEAD")
+        self.assertEqual(status, 200)
+        self.assertEqual(data, b"")
+        self.assertEqual(headers.get("Content-Length"), "64")
+        self.assertEqual(headers.get("Content-Type"), "image/png")
+
     def test_submit_example_post(self):
         import tempfile
         import shutil
@@ -235,7 +415,13 @@ class ServerTests(unittest.TestCase):
         shutil.rmtree(tmp)
 
     def test_submissions_get_redis(self):
-        self.server.SUBMISSIONS_ROOT.mkdir(parents=True, exist_ok=True)
+        import tempfile
+        import shutil
+        from pathlib import Path
+
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        self.server.SUBMISSIONS_ROOT = tmp
         class FakeRedis:
             def __init__(self, items):
                 self.items = items
@@ -301,6 +487,105 @@ class ServerTests(unittest.TestCase):
         payload = json.loads(data)
         self.assertGreaterEqual(payload.get("generate_requests", 0), 1)
 
+    def test_metrics_prom_histograms(self):
+        self._request("GET", "/health")
+        status, data = self._request("GET", "/metrics_prom", token=self.admin_token)
+        self.assertEqual(status, 200)
+        text = data.decode()
+        self.assertIn("# TYPE lego_gpt_http_request_seconds histogram", text)
+        self.assertIn("# TYPE lego_gpt_job_queue_wait_seconds histogram", text)
+        self.assertIn("# TYPE lego_gpt_generation_seconds histogram", text)
+        self.assertIn("# TYPE lego_gpt_solver_solve_seconds histogram", text)
+        self.assertIn("lego_gpt_generate_requests ", text)
+        count = next(line for line in text.splitlines() if line.startswith("lego_gpt_http_request_seconds_count"))
+        self.assertGreaterEqual(int(count.split()[1]), 1)
+
+    def test_keep_alive_reuses_connection(self):
+        pending = MagicMock(is_finished=False, is_failed=False)
+        conn = http.client.HTTPConnection("127.0.0.1", self.port)
+        try:
+            with patch("backend.gateway.Job.fetch", return_value=pending):
+                for _ in range(2):
+                    conn.request("GET", "/generate/1", headers={"Authorization": f"Bearer {self.token}"})
+                    resp = conn.getresponse()
+                    self.assertEqual(resp.status, 202)
+                    self.assertEqual(resp.getheader("Content-Length"), "0")
+                    self.assertEqual(resp.read(), b"")
+            conn.request("GET", "/health")
+            resp = conn.getresponse()
+            self.assertEqual(resp.status, 200)
+            resp.read()
+        finally:
+            conn.close()
+
+    def test_progress_streams_are_capped(self):
+        httpd = self.server.GatewayServer(("127.0.0.1", 0), self.server.Handler, threads=4, max_streams=1)
+        port = httpd.server_address[1]
+        thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05})
+        thread.start()
+        pending = MagicMock(is_finished=False, is_failed=False, meta={"progress": 10})
+        stream = http.client.HTTPConnection("127.0.0.1", port)
+        try:
+            with patch("backend.gateway.Job.fetch", return_value=pending):
+                stream.request("GET", "/progress/1")
+                resp = stream.getresponse()
+                self.assertEqual(resp.status, 200)
+                self.assertEqual(resp.getheader("Connection"), "close")
+                self.assertIn(b"progress", resp.fp.readline())
+                conn = http.client.HTTPConnection("127.0.0.1", port)
+                conn.request("GET", "/progress/2")
+                self.assertEqual(conn.getresponse().status, 503)
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port)
+                conn.request("GET", "/health")
+                self.assertEqual(conn.getresponse().status, 200)
+                conn.close()
+        finally:
+            stream.close()
+            httpd.shutdown()
+            thread.join()
+            httpd.server_close()
+
+    def test_long_polls_are_capped(self):
+        httpd = self.server.GatewayServer(("127.0.0.1", 0), self.server.Handler, threads=4, max_long_polls=1)
+        port = httpd.server_address[1]
+        thread = threading.Thread(target=httpd.serve_forever, kwargs={"poll_interval": 0.05})
+        thread.start()
+        pending = MagicMock(is_finished=False, is_failed=False)
+        waiting, release = threading.Event(), threading.Event()
+        waits = []
+
+        def fake_wait(job_id, wait):
+            waits.append(wait)
+            if wait > 0:
+                waiting.set()
+                release.wait(5)
+            return pending
+
+        headers = {"Authorization": f"Bearer {self.token}"}
+        poller = http.client.HTTPConnection("127.0.0.1", port)
+        try:
+            with patch("backend.gateway._wait_for_job", side_effect=fake_wait):
+                poller.request("GET", "/generate/1?wait=30", headers=headers)
+                self.assertTrue(waiting.wait(5))
+                conn = http.client.HTTPConnection("127.0.0.1", port)
+                conn.request("GET", "/generate/2?wait=30", headers=headers)
+                self.assertEqual(conn.getresponse().status, 202)
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port)
+                conn.request("GET", "/health")
+                self.assertEqual(conn.getresponse().status, 200)
+                conn.close()
+                release.set()
+                self.assertEqual(poller.getresponse().status, 202)
+            self.assertEqual(waits, [30.0, 0])
+        finally:
+            release.set()
+            poller.close()
+            httpd.shutdown()
+            thread.join()
+            httpd.server_close()
+
     @patch("backend.gateway.Job.fetch")
     def test_progress_events(self, mock_fetch):
         state = {"calls": 0}
@@ -342,7 +627,7 @@ class ServerTests(unittest.TestCase):
             self._request("POST", "/generate", body=b'{"prompt":"p","seed":1}', token=self.token)
             mock_fetch.return_value = job
             self._request("GET", f"/generate/{job.id}", token=self.token)
-        self.server._TOKEN_USAGE.clear()
+        self.server.rate_limiter.clear()
         status, _ = self._request("GET", "/history", token=self.token)
         self.assertEqual(status, 200)
 
@@ -366,7 +651,7 @@ class ServerTests(unittest.TestCase):
         self.assertGreaterEqual(len(payload["examples"]), 1)
 
     def test_link_code_and_preferences(self):
-        self.server._TOKEN_USAGE.clear()
+        self.server.rate_limiter.clear()
         self.server.RATE_LIMIT = 10
         # Generate a link code
         status, data = self._request(
@@ -409,11 +694,27 @@ class ServerTests(unittest.TestCase):
         status, data = self._request("GET", "/reports", token=self.admin_token)
         self.assertEqual(json.loads(data)["reports"], [])
 
+    def test_ban_applies_to_cached_token(self):
+        import tempfile
+        from pathlib import Path
+
+        self.server.rate_limiter.clear()
+        self.server.RATE_LIMIT = 10
+        self.server.COMMENTS_ROOT = Path(tempfile.mkdtemp())
+        self.server.BANS_FILE = Path(tempfile.mkdtemp()) / "b.json"
+        status, _ = self._request("POST", "/comments/3", body=b'{"comment":"hi"}', token=self.token)
+        self.assertEqual(status, 200)
+        status, _ = self._request("POST", "/ban_user", body=b'{"user":"t"}', token=self.admin_token)
+        self.assertEqual(status, 200)
+        status, _ = self._request("POST", "/comments/3", body=b'{"comment":"hi"}', token=self.token)
+        self.assertEqual(status, 401)
+        self.server._BANNED_USERS.discard("t")
+
     def test_ban_user_and_comment_delete(self):
         import tempfile
         from pathlib import Path
 
-        self.server._TOKEN_USAGE.clear()
+        self.server.rate_limiter.clear()
         tmpc = Path(tempfile.mkdtemp())
         self.server.COMMENTS_ROOT = tmpc
         tmpb = Path(tempfile.mkdtemp()) / "b.json"
@@ -439,7 +740,7 @@ class ServerTests(unittest.TestCase):
 
     def test_rate_limit_metrics(self):
         self.server.RATE_LIMIT = 1
-        self.server._TOKEN_USAGE.clear()
+        self.server.rate_limiter.clear()
         with patch("backend.gateway.queue.enqueue") as mock_q:
             mock_q.return_value.id = "j"
             self._request("POST", "/generate", body=b"{}", token=self.token)
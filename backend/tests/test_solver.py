@@ -1,5 +1,7 @@
+import random
 import sys
 import unittest
+from itertools import combinations
 from pathlib import Path
 
 # Ensure vendor modules are importable
@@ -10,9 +12,16 @@ for p in (project_root, vendor_root):
         sys.path.insert(0, str(p))
 
 from dataclasses import dataclass
+from unittest.mock import MagicMock, patch
 
 from backend.solver import get_solver  # noqa: E402
+from backend.solver import fallback  # noqa: E402
+from backend.solver import decompose, pool  # noqa: E402
+from backend.solver.incremental import StabilitySession  # noqa: E402
+from backend.solver.spatial import SpatialIndex  # noqa: E402
 from legogpt.data import LegoBrick  # noqa: E402
+from legogpt.stability_analysis import brick_adjacency, ground_connected  # noqa: E402
+from legogpt.stability_analysis.connectivity_analysis import _connected  # noqa: E402
 
 
 @dataclass
@@ -21,6 +30,22 @@ class SimpleStructure:
     world_dim: int = 20
 
 
+def random_bricks(rng: random.Random, count: int, world_dim: int = 8) -> list[LegoBrick]:
+    bricks = []
+    for _ in range(count):
+        h, w = rng.choice([(1, 1), (1, 2), (2, 1), (2, 2), (1, 4), (4, 1), (2, 4)])
+        bricks.append(
+            LegoBrick(
+                h=h,
+                w=w,
+                x=rng.randrange(world_dim - h + 1),
+                y=rng.randrange(world_dim - w + 1),
+                z=rng.randrange(4),
+            )
+        )
+    return bricks
+
+
 class SolverBehaviourTests(unittest.TestCase):
     def setUp(self):
         self.solver = get_solver()
@@ -91,5 +116,246 @@ class SolverBehaviourTests(unittest.TestCase):
         self.assertEqual(len(result.bricks), 4)
 
 
+class SpatialIndexTests(unittest.TestCase):
+    def test_single_supporter_yields_one_group(self):
+        bricks = [
+            LegoBrick(h=2, w=4, x=0, y=0, z=0),
+            LegoBrick(h=2, w=4, x=0, y=0, z=1),
+        ]
+        index = SpatialIndex(bricks)
+        self.assertEqual(len(index.supporters(1)), 8)
+        self.assertEqual(index.support_groups(1), [(0,)])
+
+    def test_bridge_has_one_group_per_pillar(self):
+        bricks = [
+            LegoBrick(h=1, w=1, x=0, y=0, z=0),
+            LegoBrick(h=1, w=1, x=1, y=0, z=0),
+            LegoBrick(h=2, w=1, x=0, y=0, z=1),
+        ]
+        index = SpatialIndex(bricks)
+        self.assertEqual(sorted(index.support_groups(2)), [(0,), (1,)])
+
+    def test_unsupported_stud_yields_empty_group(self):
+        bricks = [
+            LegoBrick(h=1, w=1, x=0, y=0, z=0),
+            LegoBrick(h=1, w=2, x=0, y=0, z=1),
+        ]
+        index = SpatialIndex(bricks)
+        self.assertEqual(index.support_groups(1), [()])
+
+    def test_superset_groups_dropped(self):
+        bricks = [
+            LegoBrick(h=2, w=1, x=0, y=0, z=0),
+            LegoBrick(h=1, w=1, x=1, y=0, z=0),
+            LegoBrick(h=2, w=1, x=0, y=0, z=1),
+        ]
+        # Brick 1 collides with brick 0, so stud (1, 0) rests on both
+        index = SpatialIndex(bricks)
+        self.assertEqual(index.support_groups(2), [(0,)])
+
+
+class ConnectivityTests(unittest.TestCase):
+    def test_adjacency_matches_pairwise_scan(self):
+        rng = random.Random(0)
+        for _ in range(50):
+            bricks = random_bricks(rng, 30)
+            expected = {
+                tuple(sorted((i, j)))
+                for (i, bi), (j, bj) in combinations(enumerate(bricks), 2)
+                if _connected(bi, bj)
+            }
+            pairs = list(brick_adjacency(bricks))
+            self.assertEqual(len(pairs), len(expected))
+            self.assertEqual({tuple(sorted(p)) for p in pairs}, expected)
+
+    def test_ground_connected_matches_graph_search(self):
+        rng = random.Random(1)
+        for _ in range(50):
+            bricks = random_bricks(rng, 30)
+            graph: list[list[int]] = [[] for _ in bricks]
+            for (i, bi), (j, bj) in combinations(enumerate(bricks), 2):
+                if _connected(bi, bj):
+                    graph[i].append(j)
+                    graph[j].append(i)
+            visited = {i for i, b in enumerate(bricks) if b.z == 0}
+            stack = list(visited)
+            while stack:
+                for j in graph[stack.pop()]:
+                    if j not in visited:
+                        visited.add(j)
+                        stack.append(j)
+            self.assertEqual(ground_connected(bricks), [i in visited for i in range(len(bricks))])
+
+    def test_bridge_connects_floating_brick(self):
+        bricks = [
+            LegoBrick(h=1, w=1, x=0, y=0, z=0),
+            LegoBrick(h=2, w=1, x=0, y=0, z=1),
+            LegoBrick(h=1, w=1, x=1, y=0, z=0),
+            LegoBrick(h=1, w=1, x=5, y=5, z=1),
+        ]
+        self.assertEqual(ground_connected(bricks), [True, True, True, False])
+
+
+class StabilitySessionTests(unittest.TestCase):
+    def test_add_and_undo_track_full_solve(self):
+        session = StabilitySession()
+        solver = get_solver()
+        bricks = [
+            LegoBrick(h=1, w=1, x=0, y=0, z=0),
+            LegoBrick(h=1, w=1, x=0, y=0, z=1),
+            LegoBrick(h=1, w=2, x=0, y=0, z=2),
+            LegoBrick(h=1, w=1, x=0, y=1, z=0),
+            LegoBrick(h=1, w=1, x=0, y=1, z=1),
+        ]
+        counts = []
+        for brick in bricks:
+            session.add_brick(brick)
+            counts.append(len(session.solve().bricks))
+            self.assertEqual(counts[-1], len(solver.solve(SimpleStructure(list(session.bricks))).bricks))
+        # The overhang at z=2 becomes supported once the second pillar is done
+        self.assertEqual(counts, [1, 2, 2, 3, 5])
+        session.undo_add_brick()
+        self.assertEqual(len(session.solve().bricks), 3)
+
+    def test_sync_matches_full_solve(self):
+        rng = random.Random(2)
+        session = StabilitySession()
+        solver = get_solver()
+        for _ in range(30):
+            bricks = random_bricks(rng, rng.randrange(1, 20))
+            # Reuse a prefix of the previous structure half of the time
+            if session.bricks and rng.random() < 0.5:
+                keep = rng.randrange(len(session.bricks) + 1)
+                bricks = session.bricks[:keep] + bricks
+            session.sync(bricks)
+            self.assertEqual(session.bricks, bricks)
+            expected = solver.solve(SimpleStructure(bricks, world_dim=8))
+            self.assertEqual(len(session.solve().bricks), len(expected.bricks))
+
+
+class FallbackTests(unittest.TestCase):
+    def test_solver_without_ortools_uses_greedy_fallback(self):
+        bricks = [
+            LegoBrick(h=1, w=1, x=0, y=0, z=0),
+            LegoBrick(h=1, w=1, x=0, y=0, z=1),
+            LegoBrick(h=1, w=2, x=0, y=0, z=2),
+            LegoBrick(h=1, w=1, x=3, y=3, z=1),
+        ]
+        with patch("backend.solver.ortools_solver._ORTOOLS_AVAILABLE", False):
+            result = get_solver().solve(SimpleStructure(bricks))
+        self.assertEqual(result.bricks, bricks[:2])
+
+    def test_greedy_depends_on_brick_order(self):
+        bricks = [
+            LegoBrick(h=1, w=1, x=0, y=0, z=1),
+            LegoBrick(h=1, w=1, x=0, y=0, z=0),
+        ]
+        self.assertEqual(fallback.greedy_supported_python(bricks), bricks[1:])
+        self.assertEqual(fallback.greedy_supported(bricks), bricks[1:])
+
+    def test_numpy_matches_python(self):
+        if not fallback._NUMPY_AVAILABLE:
+            self.skipTest("NumPy not installed")
+        rng = random.Random(3)
+        for _ in range(300):
+            world_dim = rng.choice([4, 8, 12])
+            bricks = random_bricks(rng, rng.randrange(1, 40), world_dim)
+            if rng.random() < 0.2:  # out-of-bounds and negative coordinates
+                bricks.append(LegoBrick(h=2, w=2, x=rng.randrange(-2, world_dim + 2), y=-1, z=rng.randrange(-1, 4)))
+            rng.shuffle(bricks)
+            self.assertEqual(
+                fallback.greedy_supported_numpy(bricks, world_dim),
+                fallback.greedy_supported_python(bricks),
+            )
+
+
+@unittest.skipIf(pool.pywraplp is None, "OR-Tools not installed")
+class SolverPoolTests(unittest.TestCase):
+    def setUp(self):
+        self.metrics = patch.dict(pool.METRICS, {k: 0 for k in pool.METRICS})
+        self.metrics.start()
+
+    def tearDown(self):
+        self.metrics.stop()
+
+    def test_solvers_are_cleared_and_reused(self):
+        p = pool.SolverPool("CBC", size=1)
+        with p.acquire() as first:
+            first.BoolVar("x")
+            with p.acquire() as second:  # pool empty, so a new solver
+                self.assertIsNot(first, second)
+        self.assertEqual(len(p), 1)  # the extra solver was dropped
+        with p.acquire() as again:
+            self.assertIs(again, second)
+            again.BoolVar("y")
+        self.assertEqual(second.NumVariables(), 0)
+
+    def test_run_reports_incumbent_and_records_latency(self):
+        p = pool.SolverPool("CBC", time_limit=1.5, mip_gap=0.05)
+        solver = MagicMock()
+        before = pool.SOLVE_LATENCY.count
+        solver.Solve.return_value = pool.pywraplp.Solver.OPTIMAL
+        with pool.track_optimal() as optimal:
+            self.assertTrue(p.run(solver))
+        self.assertEqual(optimal, [True])
+        solver.Solve.return_value = pool.pywraplp.Solver.FEASIBLE
+        with pool.track_optimal() as optimal:
+            self.assertTrue(p.run(solver))
+        self.assertEqual(optimal, [False])
+        solver.SetTimeLimit.assert_called_with(1500)
+        solver.Solve.return_value = pool.pywraplp.Solver.NOT_SOLVED
+        self.assertFalse(p.run(solver))
+        self.assertEqual(pool.METRICS, {"solver_solves": 3, "solver_incumbents": 1, "solver_fallbacks": 1})
+        self.assertEqual(pool.SOLVE_LATENCY.count, before + 3)
+
+    def test_solver_falls_back_to_greedy_without_solution(self):
+        bricks = [
+            LegoBrick(h=1, w=1, x=0, y=0, z=1),
+            LegoBrick(h=1, w=1, x=0, y=0, z=0),
+        ]
+        solver = get_solver()
+        with patch.object(solver.pool, "run", return_value=False):
+            result = solver.solve(SimpleStructure(bricks))
+        self.assertEqual(result.bricks, bricks[1:])  # greedy is order dependent
+        self.assertEqual(len(solver.solve(SimpleStructure(bricks)).bricks), 2)
+
+
+@unittest.skipIf(pool.pywraplp is None, "OR-Tools not installed")
+class DecompositionTests(unittest.TestCase):
+    def test_ground_bricks_split_components(self):
+        bricks = [
+            LegoBrick(h=1, w=6, x=0, y=0, z=0),  # shared base
+            LegoBrick(h=1, w=2, x=0, y=0, z=1),
+            LegoBrick(h=1, w=2, x=0, y=4, z=1),
+            LegoBrick(h=1, w=1, x=0, y=1, z=2),
+            LegoBrick(h=1, w=6, x=5, y=0, z=3),  # floating
+        ]
+        self.assertEqual(decompose.support_components(bricks), [[1, 3], [2], [4]])
+
+    def test_matches_monolithic_solve(self):
+        solver = get_solver()
+        rng = random.Random(5)
+        for _ in range(30):
+            bricks = random_bricks(rng, rng.randrange(5, 60), world_dim=12)
+            full = solver._solve_mask(bricks)
+            split = decompose._solve_components(solver, bricks)
+            self.assertEqual(sum(split), sum(full))
+            kept = sorted((b for b, flag in zip(bricks, split) if flag), key=lambda b: b.z)
+            self.assertEqual(fallback.greedy_supported_python(kept), kept)  # every kept stud supported
+
+    def test_process_pool_matches_in_process(self):
+        solver = get_solver()
+        bricks = random_bricks(random.Random(9), 80, world_dim=12)
+        expected = solver._solve_mask(bricks)
+        with patch.object(decompose, "SOLVER_WORKERS", 2), patch.object(decompose, "SOLVER_PARALLEL_MIN_BRICKS", 0):
+            try:
+                self.assertEqual(sum(decompose.solve_decomposed(solver, bricks)), sum(expected))
+                self.assertIsNotNone(decompose._executor)
+            finally:
+                if decompose._executor is not None:
+                    decompose._executor.shutdown()
+                    decompose._executor = None
+
+
 if __name__ == "__main__":  # pragma: no cover
     unittest.main()
@@ -0,0 +1,105 @@
+import json
+import sys
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+project_root = Path(__file__).resolve().parents[2]
+vendor_root = project_root / "vendor"
+for p in (project_root, vendor_root):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from backend.solver import cache  # noqa: E402
+from backend.solver import pool, shim  # noqa: E402
+from legogpt.data import LegoBrick  # noqa: E402
+
+
+class SolverCacheTests(unittest.TestCase):
+    def setUp(self):
+        self.metrics = patch.dict(cache.METRICS, {k: 0 for k in cache.METRICS})
+        self.metrics.start()
+
+    def tearDown(self):
+        self.metrics.stop()
+
+    def test_key_ignores_brick_order(self):
+        a = LegoBrick(h=1, w=2, x=0, y=0, z=0)
+        b = LegoBrick(h=1, w=1, x=0, y=0, z=1)
+        self.assertEqual(cache.structure_key([a, b]), cache.structure_key([b, a]))
+        self.assertNotEqual(cache.structure_key([a, b]), cache.structure_key([a, b], world_dim=30))
+
+    def test_kept_indices_roundtrip(self):
+        bricks = [
+            LegoBrick(h=1, w=1, x=0, y=0, z=1),
+            LegoBrick(h=1, w=1, x=0, y=0, z=0),
+            LegoBrick(h=1, w=1, x=0, y=0, z=0),
+        ]
+        kept = [bricks[0], bricks[2]]
+        indices = cache.kept_indices(bricks, kept)
+        self.assertEqual(cache.restore_kept(list(reversed(bricks)), indices), [bricks[2], bricks[0]])
+
+    def test_lru_eviction_and_counters(self):
+        c = cache.SolverCache(maxsize=2)
+        c.put("a", [0], 1.0)
+        c.put("b", [0], 1.0)
+        self.assertIsNotNone(c.get("a"))
+        c.put("c", [], 0.0)  # evicts "b", the least recently used
+        self.assertIsNone(c.get("b"))
+        self.assertEqual(len(c), 2)
+        self.assertEqual(cache.METRICS["solver_cache_hits"], 1)
+        self.assertEqual(cache.METRICS["solver_cache_misses"], 1)
+        self.assertEqual(cache.METRICS["solver_cache_evictions"], 1)
+
+    def test_redis_backing(self):
+        conn = MagicMock()
+        conn.get.return_value = json.dumps({"kept": [1], "score": 0.5})
+        c = cache.SolverCache(maxsize=0, redis_conn=conn, ttl=60)
+        self.assertEqual(c.get("k"), ([1], 0.5))
+        conn.get.assert_called_once_with("solver_cache:k")
+        c.put("k", [0], 1.0)
+        conn.set.assert_called_once_with("solver_cache:k", json.dumps({"kept": [0], "score": 1.0}), ex=60)
+
+    def test_shim_reuses_cached_result(self):
+        structure = {
+            "1": {"brick_id": 2, "x": 0, "y": 0, "z": 0, "ori": 0},
+            "2": {"brick_id": 2, "x": 5, "y": 5, "z": 1, "ori": 0},
+        }
+        with patch.object(shim, "solver_cache", cache.SolverCache(maxsize=8)):
+            first = shim.stability_score(json.dumps(structure), None)
+            with patch.object(shim, "_session") as session, patch.object(shim, "_solver") as solver:
+                second = shim.stability_score(structure, None)
+                session.solve.assert_not_called()
+                solver.solve.assert_not_called()
+        self.assertEqual(first[0], 0.5)
+        self.assertEqual(second[0], 0.5)
+        self.assertEqual(second[4].bricks, first[4].bricks)
+        self.assertEqual(cache.METRICS["solver_cache_hits"], 1)
+
+    def test_shim_skips_non_optimal_results(self):
+        structure = {
+            "1": {"brick_id": 2, "x": 0, "y": 0, "z": 0, "ori": 0},
+            "2": {"brick_id": 2, "x": 5, "y": 5, "z": 1, "ori": 0},
+        }
+
+        def incumbent(struct):
+            pool.mark_not_optimal()
+            return shim._Structure(struct.bricks[:1])
+
+        c = cache.SolverCache(maxsize=8)
+        with patch.object(shim, "solver_cache", c), patch.object(shim, "_session", None), patch.object(
+            shim, "_solver"
+        ) as solver:
+            solver.solve.side_effect = incumbent
+            self.assertEqual(shim.stability_score(structure, None)[0], 0.5)
+            self.assertEqual(len(c), 0)
+            # The order-dependent greedy fallback used without OR-Tools
+            solver.pool = None
+            solver.solve.side_effect = lambda struct: shim._Structure(struct.bricks[:1])
+            shim.stability_score(structure, None)
+            self.assertEqual(len(c), 0)
+        self.assertEqual(cache.METRICS["solver_cache_misses"], 1)
+
+
+if __name__ == "__main__":  # pragma: no cover
+    unittest.main()
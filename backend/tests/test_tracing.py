@@ -0,0 +1,89 @@
+import shutil
+import sys
+import tempfile
+import unittest
+from pathlib import Path
+from unittest.mock import MagicMock, patch
+
+project_root = Path(__file__).resolve().parents[2]
+vendor_root = project_root / "vendor"
+for p in (project_root, vendor_root):
+    if str(p) not in sys.path:
+        sys.path.insert(0, str(p))
+
+from backend import inference, tracing  # noqa: E402
+import backend.worker as worker  # noqa: E402
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class TraceTests(unittest.TestCase):
+    def setUp(self):
+        self.clock = FakeClock()
+        patcher = patch.object(tracing.time, "perf_counter", self.clock)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_nested_stages_are_exclusive(self):
+        trace = tracing.Trace()
+        before = tracing.STAGE_TIME["solver"].count
+        with tracing.tracing(trace):
+            with tracing.stage("model"):
+                self.clock.now += 1.0
+                for _ in range(3):
+                    with tracing.stage("solver"):
+                        self.clock.now += 0.5
+            with tracing.stage("save"):
+                self.clock.now += 0.25
+        self.assertIsNone(tracing.current())
+        self.assertEqual(trace.stages(), {"solver": 1.5, "model": 1.0, "save": 0.25})
+        spans = trace.as_dict()["spans"]
+        self.assertEqual([(s["stage"], s["start"], s["calls"]) for s in spans], [
+            ("model", 0.0, 1), ("solver", 1.0, 3), ("save", 2.5, 1),
+        ])
+        self.assertEqual(tracing.STAGE_TIME["solver"].count - before, 3)
+
+    def test_progress_is_throttled(self):
+        reports = []
+        trace = tracing.Trace(on_progress=reports.append, interval=1.0)
+        with tracing.tracing(trace):
+            for name in ("model", "save", "export"):
+                with tracing.stage(name):
+                    self.clock.now += 0.6
+        self.assertEqual(reports, [60, 85])
+        trace.report(85, force=True)
+        trace.report(100, force=True)
+        self.assertEqual(reports, [60, 85, 100])
+
+
+class GenerateJobTraceTests(unittest.TestCase):
+    def test_job_meta_gets_progress_and_trace(self):
+        tmp = Path(tempfile.mkdtemp())
+        self.addCleanup(shutil.rmtree, tmp)
+        model = MagicMock()
+        model.generate.return_value = {"png": b"\x89PNG", "ldr": "1 0 0 0 0 1 0 0 0 1 0 0 0 1 3001.dat\n"}
+        job = MagicMock(id="j", meta={})
+        progress = []
+        job.save_meta.side_effect = lambda: progress.append(job.meta["progress"])
+        with patch.object(inference, "MODEL", model), patch.object(inference, "STATIC_ROOT", tmp), patch(
+            "backend.generation.STATIC_ROOT", tmp
+        ), patch("rq.get_current_job", return_value=job, create=True), patch(
+            "backend.worker.ResultCache"
+        ), patch("backend.worker.publish_event"), patch("backend.storage.S3_BUCKET", None):
+            worker.generate_job("cube", 1, None)
+        self.assertEqual(progress[0], 0)
+        self.assertEqual(progress[-1], 100)
+        self.assertIn(60, progress)
+        self.assertEqual(set(job.meta["trace"]["stages"]), {"model", "save", "export"})
+        self.assertIn("first_artifact", job.meta["trace"]["marks"])
+        self.assertEqual(job.meta["time_to_first_artifact"], job.meta["trace"]["marks"]["first_artifact"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -34,7 +34,10 @@ class WorkerCLITests(unittest.TestCase):
         with patch.object(sys, 'argv', argv):
             with patch('backend.worker.run_worker') as mock_run:
                 worker.main()
-                mock_run.assert_called_once_with('redis://host:9999/1', 'testq', 'DEBUG', 'CBC', '/tmp/w.log')
+                mock_run.assert_called_once_with(
+                    'redis://host:9999/1', 'testq', 'DEBUG', 'CBC', '/tmp/w.log', worker.WORKER_BATCH_SIZE,
+                    worker.WORKER_PRELOAD, worker.WORKER_FORK, worker.WORKER_READY_FILE, worker.WORKER_QUEUES,
+                )
 
     def test_detector_worker_version_flag(self):
         with patch.object(sys, 'argv', ['detector-worker', '--version']):
@@ -54,7 +57,9 @@ class WorkerCLITests(unittest.TestCase):
         with patch.object(sys, 'argv', argv):
             with patch('detector.worker.run_detector') as mock_run:
                 detect_worker.main()
-                mock_run.assert_called_once_with('redis://host:9999/1', 'detq', 'weights.pt', 'WARNING', '/tmp/d.log')
+                mock_run.assert_called_once_with(
+                    'redis://host:9999/1', 'detq', 'weights.pt', 'WARNING', '/tmp/d.log', detect_worker.DETECTOR_QUEUES
+                )
 
 
 if __name__ == '__main__':  # pragma: no cover
@@ -0,0 +1,169 @@
+"""Per-stage timings and progress of generation jobs.
+
+The generation pipeline wraps each stage in :func:`stage`: ``model`` (the
+model's own work), ``solver`` (stability checks the model runs), ``save``
+(PNG/LDraw files), ``export`` (glTF, PDF and gzip siblings) and ``upload``
+(S3). Every stage is observed in a ``generation_stage_<stage>_seconds``
+histogram. Stage times are exclusive: a solver call made while the model
+generates counts towards ``solver`` only, so no time is counted twice.
+
+Inside a :class:`Trace`, made current with :func:`tracing`, stages are also
+recorded as spans and the trace reports progress when a stage ends.
+Progress callbacks are throttled to one per ``PROGRESS_INTERVAL`` seconds so
+a burst of short stages does not write job meta for each of them. Work
+handed to other threads is wrapped with :func:`bind` to stay in the trace.
+"""
+from __future__ import annotations
+
+import contextvars
+import functools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Iterator
+
+from backend.metrics import REGISTRY
+
+# Least seconds between two progress reports of a job
+PROGRESS_INTERVAL = float(os.getenv("PROGRESS_INTERVAL", "0.5"))
+
+# Stage names and the job progress reached when each ends; solver calls
+# happen during the model stage and do not move it
+STAGES: dict[str, int | None] = {"model": 60, "solver": None, "save": 70, "export": 85, "upload": 95}
+STAGE_TIME = {
+    name: REGISTRY.histogram(
+        f"generation_stage_{name}_seconds",
+        f"Time generation jobs spent in the {name} stage",
+        buckets=(0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0),
+    )
+    for name in STAGES
+}
+
+_current: contextvars.ContextVar["Trace | None"] = contextvars.ContextVar("generation_trace", default=None)
+# Stages running in this context, innermost last: [name, start, child seconds]
+_stack: contextvars.ContextVar[tuple] = contextvars.ContextVar("generation_stages", default=())
+
+
+class Trace:
+    """Stage spans and progress of one generation job.
+
+    ``on_progress`` is called with the new progress when a stage ends, at
+    most once per ``interval`` seconds unless forced.
+    """
+
+    def __init__(self, on_progress: Callable[[int], None] | None = None, interval: float = PROGRESS_INTERVAL) -> None:
+        self.on_progress = on_progress
+        self.interval = interval
+        self.start = time.perf_counter()
+        self.spans: list[dict] = []
+        self.marks: dict[str, float] = {}
+        self.progress = 0
+        self._lock = threading.RLock()
+        self._reported = 0
+        self._reported_at = float("-inf")
+
+    def record(self, name: str, start: float, seconds: float) -> None:
+        """Add a span of ``seconds`` exclusive time starting at ``start``.
+
+        Consecutive spans of one stage, such as the solver calls of one
+        model run, are merged and counted in ``calls``.
+        """
+        with self._lock:
+            last = self.spans[-1] if self.spans else None
+            if last is not None and last["stage"] == name:
+                last["seconds"] = round(last["seconds"] + seconds, 6)
+                last["calls"] += 1
+                return
+            self.spans.append(
+                {"stage": name, "start": round(start - self.start, 6), "seconds": round(seconds, 6), "calls": 1}
+            )
+
+    def mark(self, name: str) -> None:
+        """Record the seconds since the trace started as ``name``, once."""
+        with self._lock:
+            self.marks.setdefault(name, round(time.perf_counter() - self.start, 6))
+
+    def report(self, progress: int, force: bool = False) -> None:
+        """Raise the progress to ``progress`` and report it unless throttled."""
+        with self._lock:
+            self.progress = max(self.progress, progress)
+            now = time.perf_counter()
+            if self.on_progress is None or self.progress == self._reported:
+                return
+            if force or now - self._reported_at >= self.interval:
+                self._reported = self.progress
+                self._reported_at = now
+                self.on_progress(self.progress)
+
+    def stages(self) -> dict[str, float]:
+        """Return the total exclusive seconds of each stage."""
+        totals: dict[str, float] = {}
+        for span in self.spans:
+            totals[span["stage"]] = totals.get(span["stage"], 0.0) + span["seconds"]
+        return {name: round(seconds, 6) for name, seconds in totals.items()}
+
+    def as_dict(self) -> dict:
+        """Return the trace as JSON-serializable data."""
+        return {
+            "total": round(time.perf_counter() - self.start, 6),
+            "stages": self.stages(),
+            "spans": sorted(self.spans, key=lambda span: span["start"]),
+            "marks": dict(self.marks),
+        }
+
+
+def current() -> Trace | None:
+    """Return the trace of the running job, if any."""
+    return _current.get()
+
+
+@contextmanager
+def tracing(trace: Trace) -> Iterator[Trace]:
+    """Make ``trace`` current for the ``with`` block."""
+    token = _current.set(trace)
+    try:
+        yield trace
+    finally:
+        _current.reset(token)
+
+
+def mark(name: str) -> None:
+    """Mark ``name`` on the current trace, if any."""
+    trace = _current.get()
+    if trace is not None:
+        trace.mark(name)
+
+
+def bind(func: Callable[..., Any]) -> Callable[..., Any]:
+    """Return ``func`` running in the current trace but outside any stage.
+
+    For work submitted to another thread; each bound function may only be
+    running once at a time.
+    """
+    context = contextvars.copy_context()
+    context.run(_stack.set, ())
+    return functools.partial(context.run, func)
+
+
+@contextmanager
+def stage(name: str) -> Iterator[None]:
+    """Time the ``with`` block as pipeline stage ``name``."""
+    start = time.perf_counter()
+    frame = [name, start, 0.0]
+    parent = _stack.get()
+    token = _stack.set(parent + (frame,))
+    try:
+        yield
+    finally:
+        _stack.reset(token)
+        elapsed = time.perf_counter() - start
+        exclusive = max(0.0, elapsed - frame[2])
+        if parent:
+            parent[-1][2] += elapsed
+        STAGE_TIME[name].observe(exclusive)
+        trace = _current.get()
+        if trace is not None:
+            trace.record(name, start, exclusive)
+            if STAGES[name] is not None:
+                trace.report(STAGES[name])
@@ -1,14 +1,68 @@
 """RQ worker for asynchronous generation jobs."""
+import inspect
+import json
+import logging
 import os
+from datetime import datetime, timezone
+from pathlib import Path
 from redis import Redis
-from rq import Connection, Worker
+from rq import Connection, Queue, SimpleWorker, Worker
+try:
+    from rq.job import Job
+except Exception:  # pragma: no cover - fallback for older/stub versions
+    from rq import Job
+try:
+    from rq.timeouts import JobTimeoutException
+except Exception:  # pragma: no cover - fallback for older/stub versions
+    JobTimeoutException = TimeoutError
 from backend.logging_config import setup_logging
 from backend.config import apply_yaml_config
-from backend.generation import generate_lego_model
+from backend.generation import generate_instructions, generate_lego_model, generate_lego_models
+from backend.inference import warm_up
 from backend.detector import detect_inventory
-from backend import __version__
+from backend.events import publish_event
+from backend.result_cache import InFlight, ResultCache, result_key, run_id
+from backend.scheduler import JOB_ROUTING, default_weights, parse_weights, queue_name, weighted_order
+from backend.tracing import Trace, tracing
+from backend import STATIC_ROOT, __version__, inference, metrics
 
 QUEUE_NAME = os.getenv("QUEUE_NAME", "legogpt")
+# Generation jobs run through the model per call; 1 disables batching
+WORKER_BATCH_SIZE = int(os.getenv("WORKER_BATCH_SIZE", "1"))
+# Load the model and solver before taking jobs; forked job processes then
+# share the loaded weights copy-on-write. WORKER_FORK=0 runs jobs in the
+# worker process itself, e.g. for CUDA models that cannot be forked.
+WORKER_PRELOAD = os.getenv("WORKER_PRELOAD", "1") not in {"", "0", "false", "False"}
+WORKER_FORK = os.getenv("WORKER_FORK", "1") not in {"", "0", "false", "False"}
+# File created once the worker is warmed up and taking jobs, for probes
+WORKER_READY_FILE = os.getenv("WORKER_READY_FILE")
+# Weighted queues to take jobs from ("name=weight,..."); derived from
+# QUEUE_NAME by default, see backend.scheduler
+WORKER_QUEUES = os.getenv("WORKER_QUEUES")
+
+log = logging.getLogger(__name__)
+
+QUEUE_WAIT = metrics.REGISTRY.histogram(
+    "job_queue_wait_seconds",
+    "Time jobs spent queued before a worker started them",
+    buckets=(0.1, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0),
+)
+GENERATION_TIME = metrics.REGISTRY.histogram(
+    "generation_seconds",
+    "Wall-clock time of each model call in generation jobs, single or batched",
+    buckets=(0.5, 1.0, 2.5, 5.0, 10.0, 20.0, 30.0, 60.0, 120.0, 300.0),
+)
+BATCH_SIZE = metrics.REGISTRY.histogram(
+    "generation_batch_size",
+    "Generation jobs run per batched model call",
+    buckets=(1, 2, 4, 8, 16, 32, 64),
+)
+
+# Results of the batch being worked by this process, keyed by job ID; the
+# timeout error if the batched model call overran
+_BATCH_RESULTS: dict[str, dict | Exception] = {}
+# Trace of that batch's model call, shared by its jobs
+_BATCH_TRACE: dict = {}
 
 
 def generate_job(
@@ -16,44 +70,321 @@ def generate_job(
     seed: int | None = 42,
     inventory_filter: dict[str, int] | None = None,
 ) -> dict:
-    """Background job that runs the model and returns file URLs."""
+    """Background job that runs the model and returns file URLs.
+
+    Progress is reported as pipeline stages end, of the batched model call
+    if the job was run in a :class:`BatchWorker` batch, and the stage timings are
+    stored in the job's ``trace`` meta and logged, along with the seconds
+    until the preview was available as ``time_to_first_artifact``. With
+    ``DEFER_INSTRUCTIONS`` the PDF is left to an :func:`instructions_job`
+    on the bulk queue, whose ID is stored as ``instructions_job_id``.
+    """
     try:
         from rq import get_current_job
 
         job = get_current_job()
     except Exception:
         job = None
-    if job:
-        job.meta["progress"] = 0
-        job.save_meta()
-    result = generate_lego_model(prompt, seed, inventory_filter)
-    if job:
-        job.meta["progress"] = 100
-        job.save_meta()
+    result = _BATCH_RESULTS.pop(job.id, None) if job is not None else None
+    if isinstance(result, Exception):
+        raise result
+    if result is None:
+        _set_progress(job, 0)
+        trace = Trace(on_progress=lambda progress: _set_progress(job, progress))
+        with tracing(trace), GENERATION_TIME.time():
+            result = generate_lego_model(prompt, seed, inventory_filter)
+        trace_data = trace.as_dict()
+    else:
+        trace_data = dict(_BATCH_TRACE)
+    if job is not None:
+        # Later identical requests are answered from the cache, under the
+        # key the API looked up
+        key = job.meta.get("result_key") or result_key(prompt, seed, inventory_filter)
+        ResultCache(job.connection).put(key, result)
+        job.meta["trace"] = trace_data
+        job.meta["time_to_first_artifact"] = trace_data.get("marks", {}).get("first_artifact")
+        if inference.DEFER_INSTRUCTIONS:
+            _defer_instructions(job, result)
+    log.info("Generation trace %s", json.dumps({"job_id": job.id if job else None, **trace_data}))
+    _set_progress(job, 100)
     return result
 
 
+def instructions_job(run: str, ldr: str) -> dict:
+    """Background job that renders the PDF instructions of a finished run."""
+    return {"instructions_url": generate_instructions(run, ldr)}
+
+
+def _defer_instructions(job, result: dict) -> None:
+    """Queue an :func:`instructions_job` for ``result`` on the bulk queue."""
+    run = run_id(result)
+    ldr_path = STATIC_ROOT / run / "model.ldr" if run and result.get("ldr_url") else None
+    if ldr_path is None or not ldr_path.exists():
+        return
+    name = queue_name(QUEUE_NAME, "bulk") if JOB_ROUTING else QUEUE_NAME
+    follow_up = Queue(name, connection=job.connection).enqueue(instructions_job, run, ldr_path.read_text())
+    job.meta["instructions_job_id"] = follow_up.id
+
+
+_GENERATE_JOB = f"{generate_job.__module__}.{generate_job.__qualname__}"
+
+
+def _generate_args(job) -> tuple:
+    """Return the ``(prompt, seed, inventory_filter)`` of a queued ``generate_job``."""
+    bound = inspect.signature(generate_job).bind(*job.args, **job.kwargs)
+    bound.apply_defaults()
+    return bound.args
+
+
+def _set_progress(job, progress: int) -> None:
+    """Store ``progress`` in the job meta and notify listeners."""
+    if job is None:
+        return
+    job.meta["progress"] = progress
+    job.save_meta()
+    publish_event(job.connection, job.id, progress=progress)
+
+
 def detect_job(image_b64: str) -> dict:
     """Background job that detects brick counts from a photo."""
     counts = detect_inventory(image_b64)
     return {"brick_counts": counts}
 
 
+class EventWorker(Worker):
+    """Worker that publishes an event once a job's final status is saved.
+
+    Publishing from the job itself would race RQ storing the result, so
+    clients woken by the event could still see the job as started. Finished
+    and failed generation jobs stop taking identical requests at the same
+    point. It also records how long each job waited in the queue.
+
+    With ``weights`` (one per queue) the queues are reordered at random
+    after every job, each coming first with a chance proportional to its
+    weight, instead of always being checked in the given order.
+    """
+
+    def __init__(self, *args, weights: list[float] | None = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.weights = list(weights) if weights else None
+
+    def reorder_queues(self, reference_queue):
+        if self.weights and len(self.weights) == len(self.queues):
+            self._ordered_queues = weighted_order(self.queues, self.weights)
+        else:
+            super().reorder_queues(reference_queue)
+
+    def perform_job(self, job, queue):
+        # Runs in the job's own process, so its metrics are written out
+        # before that process exits.
+        enqueued_at = job.enqueued_at
+        if enqueued_at is not None:
+            if enqueued_at.tzinfo is None:  # RQ stores naive UTC times
+                enqueued_at = enqueued_at.replace(tzinfo=timezone.utc)
+            QUEUE_WAIT.observe(max(0.0, (datetime.now(timezone.utc) - enqueued_at).total_seconds()))
+        try:
+            return super().perform_job(job, queue)
+        finally:
+            metrics.flush()
+
+    def handle_job_success(self, job, queue, *args, **kwargs):
+        super().handle_job_success(job, queue, *args, **kwargs)
+        self._release(job)
+        publish_event(self.connection, job.id, status="finished")
+
+    def handle_job_failure(self, job, queue, *args, **kwargs):
+        super().handle_job_failure(job, queue, *args, **kwargs)
+        # Retried jobs go back to queued/scheduled; waiters keep waiting.
+        status = job.get_status(refresh=False)
+        if status == "failed":
+            self._release(job)
+        publish_event(self.connection, job.id, status=status)
+
+    def _release(self, job) -> None:
+        key = job.meta.get("result_key")
+        if key:
+            InFlight(self.connection).release(key, job.id)
+
+
+class BatchWorker(EventWorker):
+    """Worker that runs queued generation jobs through the model in batches.
+
+    On taking a ``generate_job`` it also claims up to ``batch_size - 1`` more
+    waiting in the same queue and runs all their prompts as one batched
+    model call. Each job is then performed as usual, so RQ stores every
+    result and status, and events are published, under the job's own ID.
+    If the batched call fails the jobs are generated one by one instead;
+    if it overruns the batch's timeout every job of the batch fails.
+
+    The batch is claimed before the work horse is forked and the horse may
+    run for the sum of the batch's job timeouts, since RQ kills a horse
+    that outlives the timeout of the job it was started for.
+    """
+
+    def __init__(self, *args, batch_size: int = WORKER_BATCH_SIZE, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.batch_size = max(1, batch_size)
+        self._batch: list = []
+        self._leader_timeout = None
+
+    def execute_job(self, job, queue):
+        if self.batch_size < 2 or job.func_name != _GENERATE_JOB:
+            return super().execute_job(job, queue)
+        self._leader_timeout = job.timeout
+        self._batch = [job, *self._claim_batch(queue, _job_timeout(job, queue))]
+        # Only the in-memory copy the horse is monitored by is changed
+        job.timeout = _batch_timeout(self._batch, queue)
+        try:
+            return super().execute_job(job, queue)
+        finally:
+            job.timeout = self._leader_timeout
+            self._batch = []
+
+    def perform_job(self, job, queue):
+        batch = self._batch
+        if not batch or batch[0] is not job:
+            return super().perform_job(job, queue)
+        # The job itself is performed within its own timeout again
+        job.timeout = self._leader_timeout
+        try:
+            if len(batch) > 1:
+                self._run_batch(batch, queue)
+            ok = super().perform_job(job, queue)
+            for other in batch[1:]:
+                super().perform_job(other, queue)
+            return ok
+        finally:
+            _BATCH_RESULTS.clear()
+            _BATCH_TRACE.clear()
+
+    def _claim_batch(self, queue, timeout: int = 0) -> list:
+        """Take up to ``batch_size - 1`` generation jobs off ``queue``.
+
+        Jobs are claimed with ``LREM`` so a job another worker dequeued at
+        the same time is never run twice. Claimed jobs are marked started,
+        with a heartbeat that lasts the whole batch (``timeout`` seconds for
+        the job that started it plus their own), so the started registry
+        recovers them if this process dies mid-batch.
+        """
+        ids = queue.get_job_ids(0, self.batch_size * 2)
+        candidates = [
+            other
+            for other in Job.fetch_many(ids, connection=self.connection)
+            if other is not None and other.func_name == _GENERATE_JOB
+        ][: self.batch_size - 1]
+        if not candidates:
+            return []
+        with self.connection.pipeline() as pipe:
+            for other in candidates:
+                pipe.lrem(queue.key, 1, other.id)
+            removed = pipe.execute()
+        claimed = [other for other, count in zip(candidates, removed) if count]
+        if claimed:
+            now = datetime.now(timezone.utc)
+            ttl = timeout + sum(_job_timeout(other, queue) for other in claimed) + 60
+            with self.connection.pipeline() as pipe:
+                for other in claimed:
+                    other.prepare_for_execution(self.name, pipeline=pipe)
+                    other.heartbeat(now, ttl, pipeline=pipe)
+                pipe.execute()
+        return claimed
+
+    def _run_batch(self, batch: list, queue) -> None:
+        """Generate ``batch`` in one model call and keep the results.
+
+        The call runs under the death penalty of the whole batch, so a hung
+        model cannot stall a worker that does not fork work horses.
+        """
+        timeout = _batch_timeout(batch, queue)
+        try:
+            requests = [_generate_args(job) for job in batch]
+            _set_batch_progress(batch, 0)
+            trace = Trace(on_progress=lambda progress: _set_batch_progress(batch, progress))
+            with self.death_penalty_class(timeout, JobTimeoutException), tracing(trace), GENERATION_TIME.time():
+                results = generate_lego_models(requests)
+        except JobTimeoutException as exc:
+            self.log.warning("Batched generation exceeded its %s s timeout", timeout)
+            _BATCH_RESULTS.update((job.id, exc) for job in batch)
+            return
+        except Exception:
+            self.log.warning("Batched generation failed, running jobs one by one", exc_info=True)
+            return
+        BATCH_SIZE.observe(len(batch))
+        _BATCH_TRACE.update(trace.as_dict(), batch=len(batch))
+        for job, result in zip(batch, results):
+            _BATCH_RESULTS[job.id] = result
+
+
+def _set_batch_progress(batch: list, progress: int) -> None:
+    """Report the progress of a batched model call for every job of ``batch``."""
+    for job in batch:
+        _set_progress(job, progress)
+
+
+def _job_timeout(job, queue) -> int:
+    return job.timeout or queue.DEFAULT_TIMEOUT
+
+
+def _batch_timeout(batch: list, queue) -> int:
+    """Return the seconds ``batch`` may run for; ``-1`` if unlimited."""
+    timeouts = [_job_timeout(job, queue) for job in batch]
+    return -1 if -1 in timeouts else sum(timeouts)
+
+
+def worker_class(batch_size: int = 1, fork: bool = True) -> type:
+    """Return the worker class for ``batch_size`` and execution model.
+
+    Without ``fork`` jobs run in the worker process, as with RQ's
+    ``SimpleWorker``, so the loaded model is reused as is.
+    """
+    base = BatchWorker if batch_size > 1 else EventWorker
+    if fork:
+        return base
+    return type(f"Simple{base.__name__}", (base, SimpleWorker), {})
+
+
 def run_worker(
     redis_url: str = "redis://localhost:6379/0",
     queue_name: str = QUEUE_NAME,
     log_level: str | None = None,
     solver_engine: str | None = None,
     log_file: str | None = None,
+    batch_size: int = WORKER_BATCH_SIZE,
+    preload: bool = WORKER_PRELOAD,
+    fork: bool = WORKER_FORK,
+    ready_file: str | None = WORKER_READY_FILE,
+    queues: str | None = WORKER_QUEUES,
 ) -> None:
-    """Start an RQ worker that processes generation jobs."""
+    """Start an RQ worker that processes generation jobs.
+
+    ``queues`` lists weighted queues as ``name=weight,...``; by default the
+    generation queues derived from ``queue_name`` are used. With
+    ``preload`` the model and solver are loaded before the worker takes
+    jobs, and ``ready_file`` is only created after that. With
+    ``batch_size`` above 1 a :class:`BatchWorker` batches generation jobs
+    through the model.
+    """
     conn = Redis.from_url(redis_url)
     setup_logging(log_level, log_file)
     if solver_engine:
         os.environ["ORTOOLS_ENGINE"] = solver_engine
+    if preload:
+        log.info("Model and solver loaded in %.2f s", warm_up())
+    metrics.start_flusher()
+    ready = Path(ready_file) if ready_file else None
     with Connection(conn):
-        worker = Worker([queue_name])
-        worker.work()
+        weighted = parse_weights(queues) if queues else default_weights(queue_name)
+        kwargs = {"batch_size": batch_size} if batch_size > 1 else {}
+        worker = worker_class(batch_size, fork)(
+            [name for name, _ in weighted], weights=[weight for _, weight in weighted], **kwargs
+        )
+        if ready is not None:
+            ready.touch()
+        try:
+            worker.work()
+        finally:
+            if ready is not None:
+                ready.unlink(missing_ok=True)
 
 
 def main(argv: list[str] | None = None) -> None:
@@ -71,6 +402,11 @@ def main(argv: list[str] | None = None) -> None:
         default=os.getenv("QUEUE_NAME", QUEUE_NAME),
         help="RQ queue name (default: env QUEUE_NAME or 'legogpt')",
     )
+    parser.add_argument(
+        "--queues",
+        default=WORKER_QUEUES,
+        help="Weighted queues as name=weight,... (default: env WORKER_QUEUES or the generation queues of --queue)",
+    )
     parser.add_argument(
         "--version",
         action="store_true",
@@ -91,6 +427,29 @@ def main(argv: list[str] | None = None) -> None:
         default=os.getenv("ORTOOLS_ENGINE", "HIGHs"),
         help="OR-Tools solver backend (default: env ORTOOLS_ENGINE or HIGHs)",
     )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=WORKER_BATCH_SIZE,
+        help="Generation jobs per batched model call (default: env WORKER_BATCH_SIZE or 1)",
+    )
+    parser.add_argument(
+        "--preload",
+        action=argparse.BooleanOptionalAction,
+        default=WORKER_PRELOAD,
+        help="Load the model and solver before taking jobs (default: env WORKER_PRELOAD or on)",
+    )
+    parser.add_argument(
+        "--fork",
+        action=argparse.BooleanOptionalAction,
+        default=WORKER_FORK,
+        help="Run each job in a forked process (default: env WORKER_FORK or on)",
+    )
+    parser.add_argument(
+        "--ready-file",
+        default=WORKER_READY_FILE,
+        help="File to create once the worker is ready (default: env WORKER_READY_FILE)",
+    )
     parser.add_argument(
         "--config",
         default=os.getenv("LEGOGPT_CONFIG"),
@@ -111,6 +470,11 @@ def main(argv: list[str] | None = None) -> None:
         args.log_level,
         args.solver_engine,
         args.log_file,
+        args.batch_size,
+        args.preload,
+        args.fork,
+        args.ready_file,
+        args.queues,
     )
 
 
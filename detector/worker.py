@@ -1,10 +1,15 @@
 """RQ worker dedicated to brick inventory detection."""
 from redis import Redis
-from rq import Worker, Connection
+from rq import Connection
 import os
 from backend.logging_config import setup_logging
 from backend import __version__
-from backend.worker import QUEUE_NAME
+from backend.worker import QUEUE_NAME, EventWorker
+from backend.scheduler import default_weights, parse_weights
+
+# Weighted queues to take jobs from ("name=weight,..."); the detection
+# queue derived from QUEUE_NAME by default
+DETECTOR_QUEUES = os.getenv("DETECTOR_QUEUES")
 
 
 def run_detector(
@@ -13,14 +18,20 @@ def run_detector(
     model_path: str | None = None,
     log_level: str | None = None,
     log_file: str | None = None,
+    queues: str | None = DETECTOR_QUEUES,
 ) -> None:
-    """Run an RQ worker that processes detection jobs."""
+    """Run an RQ worker that processes detection jobs.
+
+    ``queues`` lists weighted queues as ``name=weight,...``; by default the
+    detection queue derived from ``queue_name`` is used.
+    """
     conn = Redis.from_url(redis_url)
     if model_path:
         os.environ["DETECTOR_MODEL"] = model_path
     setup_logging(log_level, log_file)
     with Connection(conn):
-        worker = Worker([queue_name])
+        weighted = parse_weights(queues) if queues else default_weights(queue_name, detect=True)
+        worker = EventWorker([name for name, _ in weighted], weights=[weight for _, weight in weighted])
         worker.work()
 
 
@@ -39,6 +50,11 @@ def main(argv: list[str] | None = None) -> None:
         default=os.getenv("QUEUE_NAME", QUEUE_NAME),
         help="RQ queue name (default: env QUEUE_NAME or 'legogpt')",
     )
+    parser.add_argument(
+        "--queues",
+        default=DETECTOR_QUEUES,
+        help="Weighted queues as name=weight,... (default: env DETECTOR_QUEUES or the detection queue of --queue)",
+    )
     parser.add_argument(
         "--model",
         default=os.getenv("DETECTOR_MODEL", "detector/model.pt"),
@@ -71,6 +87,7 @@ def main(argv: list[str] | None = None) -> None:
         args.model,
         args.log_level,
         args.log_file,
+        args.queues,
     )
 
 
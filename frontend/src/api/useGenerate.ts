@@ -60,7 +60,7 @@ export default function useGenerate(
         const { job_id } = (await res.json()) as { job_id: string };
 
         while (!cancelled) {
-          const poll = await fetch(`${API_BASE}/generate/${job_id}`, {
+          const poll = await fetch(`${API_BASE}/generate/${job_id}?wait=30`, {
             signal: ctrl.signal,
           });
           if (poll.status === 200) {
@@ -22,7 +22,7 @@ async function runGenerate(req: PendingRequest): Promise<GenerateResponse> {
   }
   const { job_id } = (await res.json()) as { job_id: string };
   while (true) {
-    const poll = await fetch(`${API_BASE}/generate/${job_id}`, {
+    const poll = await fetch(`${API_BASE}/generate/${job_id}?wait=30`, {
       headers: { ...authHeaders() },
     });
     if (poll.status === 200) {
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+"""Microbenchmark the API's ``_auth`` dependency.
+
+Authenticates ``--requests`` requests round-robin over ``--tokens`` tokens
+through ``backend.api._auth``, verifying every token with HMAC as before
+and then through the verified-token cache, and prints requests/sec and the
+cache hit rate. Rate limits are counted in process so Redis is not needed.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+sys.path.append(str(project_root / "vendor"))
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ["RATE_LIMIT"] = str(10**9)
+
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+
+import backend.api as api  # noqa: E402
+from backend import auth  # noqa: E402
+from backend.ratelimit import RateLimiter  # noqa: E402
+
+
+async def _run(credentials: list[HTTPAuthorizationCredentials], requests: int) -> float:
+    start = time.perf_counter()
+    for i in range(requests):
+        await api._auth(credentials[i % len(credentials)])
+    return time.perf_counter() - start
+
+
+def benchmark(requests: int, tokens: int) -> None:
+    # Without a Redis client the limiter counts in process
+    logging.getLogger("backend.ratelimit").setLevel(logging.ERROR)
+    api.rate_limiter = RateLimiter(None)
+    secret = os.environ["JWT_SECRET"]
+    credentials = [
+        HTTPAuthorizationCredentials(
+            scheme="Bearer",
+            credentials=auth.encode({"sub": f"user{i}", "role": "user"}, secret, exp=int(time.time()) + 3600),
+        )
+        for i in range(tokens)
+    ]
+    print(f"{'mode':<8} {'req/s':>9} {'hit rate':>9}")
+    for label, decode in (("hmac", auth.decode), ("cached", auth.decode_cached)):
+        api.decode_jwt = decode
+        for key in auth.METRICS:
+            auth.METRICS[key] = 0
+        elapsed = asyncio.run(_run(credentials, requests))
+        lookups = auth.METRICS["jwt_cache_hits"] + auth.METRICS["jwt_cache_misses"]
+        hit_rate = f"{auth.METRICS['jwt_cache_hits'] / lookups:.1%}" if lookups else "-"
+        print(f"{label:<8} {requests / elapsed:>9.0f} {hit_rate:>9}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark API token verification")
+    parser.add_argument("--requests", type=int, default=50000, help="Authenticated requests (default: 50000)")
+    parser.add_argument("--tokens", type=int, default=100, help="Distinct tokens (default: 100)")
+    args = parser.parse_args(argv)
+    benchmark(args.requests, args.tokens)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
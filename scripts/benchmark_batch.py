@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+"""Benchmark batched generation against one prompt per model call.
+
+Runs ``--prompts`` prompts through ``backend.inference`` with a simulated
+model whose forward pass costs ``--overhead`` ms plus ``--per-prompt`` ms
+for each prompt in it, as for a GPU that is not saturated by one sequence.
+``single`` calls ``generate`` per prompt as a plain worker does; ``batch``
+calls ``generate_batch`` with ``--batch-size`` prompts as a ``BatchWorker``
+does. Prints prompts/sec for each. Outputs go to a temporary directory.
+"""
+from __future__ import annotations
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+sys.path.append(str(project_root / "vendor"))
+
+from backend import inference  # noqa: E402
+
+
+class SimulatedModel:
+    """Model whose latency grows sub-linearly with the batch size."""
+
+    def __init__(self, overhead: float, per_prompt: float) -> None:
+        self.overhead = overhead
+        self.per_prompt = per_prompt
+
+    def _result(self) -> dict:
+        return {"png": b"\x89PNG", "ldr": None, "brick_counts": {}}
+
+    def generate(self, prompt: str, seed: int | None = None) -> dict:
+        time.sleep(self.overhead + self.per_prompt)
+        return self._result()
+
+    def generate_batch(self, prompts: list[str], seeds: list[int | None]) -> list[dict]:
+        time.sleep(self.overhead + self.per_prompt * len(prompts))
+        return [self._result() for _ in prompts]
+
+
+def benchmark(prompts: int, batch_size: int, overhead: float, per_prompt: float) -> None:
+    requests = [(f"prompt {i}", i, None) for i in range(prompts)]
+    tmp = Path(tempfile.mkdtemp())
+    model = SimulatedModel(overhead / 1000, per_prompt / 1000)
+    print(f"{'mode':<7} {'prompts/s':>10}")
+    try:
+        with patch.object(inference, "MODEL", model), patch.object(inference, "STATIC_ROOT", tmp):
+            start = time.perf_counter()
+            for prompt, seed, inventory in requests:
+                inference.generate(prompt, seed, inventory)
+            print(f"{'single':<7} {prompts / (time.perf_counter() - start):>10.1f}")
+            start = time.perf_counter()
+            for i in range(0, prompts, batch_size):
+                inference.generate_batch(requests[i : i + batch_size])
+            print(f"{'batch':<7} {prompts / (time.perf_counter() - start):>10.1f}")
+    finally:
+        shutil.rmtree(tmp)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark batched generation")
+    parser.add_argument("--prompts", type=int, default=64, help="Prompts to generate (default: 64)")
+    parser.add_argument("--batch-size", type=int, default=8, help="Prompts per batch (default: 8)")
+    parser.add_argument("--overhead", type=float, default=40.0, help="Fixed ms per model call (default: 40)")
+    parser.add_argument("--per-prompt", type=float, default=5.0, help="Extra ms per prompt (default: 5)")
+    args = parser.parse_args(argv)
+    benchmark(args.prompts, args.batch_size, args.overhead, args.per_prompt)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
@@ -5,6 +5,7 @@ import threading
 import time
 import uuid
 from http.server import HTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlsplit
 import sys
 from pathlib import Path
 
@@ -49,7 +50,7 @@ class Handler(BaseHTTPRequestHandler):
         if not self.path.startswith("/generate/"):
             self.send_error(404)
             return
-        job_id = self.path.rsplit("/", 1)[-1]
+        job_id = urlsplit(self.path).path.rsplit("/", 1)[-1]
         job = _JOBS.get(job_id)
         if not job:
             self.send_response(202)
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Micro-benchmark for ground-connectivity checks.
+
+Compares the original all-pairs graph construction used by
+``OrtoolsSolver._filter_connected`` and ``connectivity_score`` with the
+layer-bucketed adjacency builder and union-find pass in
+``legogpt.stability_analysis``.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from itertools import combinations
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+import backend.solver  # noqa: E402,F401  (puts the vendored legogpt on sys.path)
+from legogpt.data import LegoBrick  # noqa: E402
+from legogpt.stability_analysis import ground_connected  # noqa: E402
+from legogpt.stability_analysis.connectivity_analysis import _connected  # noqa: E402
+from scripts.benchmark_solver import tower, wall  # noqa: E402
+
+
+def pairwise_connected(bricks: list[LegoBrick]) -> list[bool]:
+    """Reference implementation comparing every brick pair."""
+    graph: list[list[int]] = [[] for _ in bricks]
+    for (i, bi), (j, bj) in combinations(enumerate(bricks), 2):
+        if _connected(bi, bj):
+            graph[i].append(j)
+            graph[j].append(i)
+    visited = {i for i, b in enumerate(bricks) if b.z == 0}
+    stack = list(visited)
+    while stack:
+        for j in graph[stack.pop()]:
+            if j not in visited:
+                visited.add(j)
+                stack.append(j)
+    return [i in visited for i in range(len(bricks))]
+
+
+def scattered(n: int, world_dim: int = 20, seed: int = 0) -> list[LegoBrick]:
+    """Random bricks spread over a ``world_dim`` cube."""
+    rng = random.Random(seed)
+    bricks = []
+    for _ in range(n):
+        h, w = rng.choice([(1, 2), (2, 1), (2, 2), (2, 4), (4, 2)])
+        bricks.append(
+            LegoBrick(
+                h=h,
+                w=w,
+                x=rng.randrange(world_dim - h + 1),
+                y=rng.randrange(world_dim - w + 1),
+                z=rng.randrange(world_dim),
+            )
+        )
+    return bricks
+
+
+def _time(func, bricks: list[LegoBrick], repeat: int) -> tuple[float, list[bool]]:
+    best = float("inf")
+    result: list[bool] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func(bricks)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def benchmark(sizes: list[int], repeat: int) -> None:
+    """Print the best-of-``repeat`` timing for each shape and size."""
+    print(f"{'shape':<10} {'bricks':>6} {'pairwise s':>11} {'bucketed s':>11} {'speedup':>8}")
+    for name, shape in (("tower", tower), ("wall", wall), ("scattered", scattered)):
+        for n in sizes:
+            bricks = shape(n)
+            slow, expected = _time(pairwise_connected, bricks, repeat)
+            fast, result = _time(ground_connected, bricks, repeat)
+            if result != expected:
+                raise SystemExit(f"Mismatch for {name} with {n} bricks")
+            print(f"{name:<10} {n:>6} {slow:>11.4f} {fast:>11.4f} {slow / fast:>7.1f}x")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark ground-connectivity checks")
+    parser.add_argument(
+        "--sizes",
+        default="50,300,1000,2000",
+        help="Comma-separated brick counts (default: 50,300,1000,2000)",
+    )
+    parser.add_argument("--repeat", type=int, default=3, help="Repetitions per case (default: 3)")
+    args = parser.parse_args(argv)
+    benchmark([int(s) for s in args.sizes.split(",") if s], args.repeat)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Compare serial and pipelined export and upload of generation results.
+
+Runs ``--runs`` generations with a stub model and simulated exporters and S3
+uploads that sleep ``--export`` seconds per glTF, ``--pdf`` per PDF and
+``--upload`` per file. ``serial`` exports the glTF and PDF one after the
+other and uploads every file once all are written, as before.
+``pipelined`` runs the exports in the export pool and uploads each file as
+soon as it is written; ``deferred`` also leaves the PDF to a follow-up job.
+Prints the mean seconds until the preview was uploaded and until the job
+result was ready.
+"""
+from __future__ import annotations
+
+import argparse
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from pathlib import Path
+from unittest.mock import patch
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+sys.path.append(str(project_root / "vendor"))
+
+from backend import generation, inference, storage  # noqa: E402
+
+LDR = "1 0 0 0 0 1 0 0 0 1 0 0 0 1 3001.dat\n"
+
+
+class StubModel:
+    def generate(self, prompt: str, seed: int | None = None) -> dict:
+        return {"png": b"\x89PNG", "ldr": LDR, "brick_counts": {"3001": 1}}
+
+
+def run(mode: str, runs: int, export: float, pdf: float, upload: float) -> tuple[float, float]:
+    """Return the mean seconds to the uploaded preview and to the result."""
+    tmp = Path(tempfile.mkdtemp())
+    first: list[float] = []
+
+    def fake_upload(path: Path, key: str) -> str:
+        time.sleep(upload)
+        if path.name == "preview.png":
+            first.append(time.perf_counter())
+        return f"https://cdn/{key}"
+
+    def fake_export(_ldr: Path, out: Path) -> None:
+        time.sleep(pdf if out.suffix == ".pdf" else export)
+        out.write_text("")
+
+    totals = []
+    try:
+        with ExitStack() as stack:
+            stack.enter_context(patch.object(inference, "MODEL", StubModel()))
+            stack.enter_context(patch.object(inference, "STATIC_ROOT", tmp))
+            stack.enter_context(patch.object(generation, "STATIC_ROOT", tmp))
+            stack.enter_context(patch.object(storage, "S3_BUCKET", "bench"))
+            stack.enter_context(patch.object(storage, "_upload", fake_upload))
+            stack.enter_context(patch.object(inference, "ldr_to_gltf", fake_export))
+            stack.enter_context(patch.object(inference, "ldr_to_pdf", fake_export))
+            stack.enter_context(patch.object(inference, "precompress", lambda _path: None))
+            stack.enter_context(patch.object(inference, "DEFER_INSTRUCTIONS", mode == "deferred"))
+            if mode == "serial":
+                pool = stack.enter_context(ThreadPoolExecutor(max_workers=1))
+                stack.enter_context(patch.object(inference, "_get_executor", lambda: pool))
+                # Files are uploaded one by one when the URLs are collected
+                stack.enter_context(patch.object(generation._Uploads, "add", lambda self, path: None))
+            for i in range(runs):
+                start = time.perf_counter()
+                generation.generate_lego_model("bench", i)
+                totals.append(time.perf_counter() - start)
+                first[-1] -= start
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+    return sum(first) / len(first), sum(totals) / len(totals)
+
+
+def benchmark(runs: int, export: float, pdf: float, upload: float) -> None:
+    print(f"{'mode':<10} {'preview s':>10} {'result s':>10}")
+    for mode in ("serial", "pipelined", "deferred"):
+        preview, result = run(mode, runs, export, pdf, upload)
+        print(f"{mode:<10} {preview:>10.3f} {result:>10.3f}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark pipelined export and upload")
+    parser.add_argument("--runs", type=int, default=5, help="Generations per mode (default: 5)")
+    parser.add_argument("--export", type=float, default=0.2, help="Seconds per glTF export (default: 0.2)")
+    parser.add_argument("--pdf", type=float, default=0.5, help="Seconds per PDF export (default: 0.5)")
+    parser.add_argument("--upload", type=float, default=0.1, help="Seconds per file upload (default: 0.1)")
+    args = parser.parse_args(argv)
+    benchmark(args.runs, args.export, args.pdf, args.upload)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""Benchmark the greedy stability fallback used without OR-Tools.
+
+Times the pure-Python and NumPy implementations in
+``backend.solver.fallback`` on random structures and checks that both
+keep the same bricks. Requires NumPy.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+# Append (rather than prepend) the vendor directory so the real NumPy wins
+# over the offline-test stub that lives there.
+sys.path.append(str(project_root / "vendor"))
+
+from backend.solver import fallback  # noqa: E402
+from legogpt.data import LegoBrick  # noqa: E402
+
+
+def random_structure(n: int, world_dim: int, rng: random.Random) -> list[LegoBrick]:
+    """Random bricks, mostly stacked so that a useful share is supported."""
+    bricks: list[LegoBrick] = []
+    for _ in range(n):
+        h, w = rng.choice([(1, 2), (2, 1), (2, 2), (2, 4), (4, 2), (1, 4), (4, 1)])
+        bricks.append(
+            LegoBrick(
+                h=h,
+                w=w,
+                x=rng.randrange(world_dim - h + 1),
+                y=rng.randrange(world_dim - w + 1),
+                z=min(int(rng.expovariate(0.3)), world_dim - 1),
+            )
+        )
+    bricks.sort(key=lambda b: b.z)
+    return bricks
+
+
+def _time(func, *args) -> tuple[float, list[LegoBrick]]:
+    start = time.perf_counter()
+    result = func(*args)
+    return time.perf_counter() - start, result
+
+
+def benchmark(sizes: list[int], world_dim: int, seed: int) -> None:
+    """Print timings for each structure size."""
+    rng = random.Random(seed)
+    fallback.greedy_supported_numpy(random_structure(10, world_dim, rng), world_dim)  # warm-up
+    print(f"{'bricks':>6} {'kept':>6} {'python s':>9} {'numpy s':>9} {'speedup':>8}")
+    for n in sizes:
+        bricks = random_structure(n, world_dim, rng)
+        slow, expected = _time(fallback.greedy_supported_python, bricks)
+        fast, result = _time(fallback.greedy_supported_numpy, bricks, world_dim)
+        if result != expected:
+            raise SystemExit(f"Mismatch for {n} bricks")
+        print(f"{n:>6} {len(result):>6} {slow:>9.4f} {fast:>9.4f} {slow / fast:>7.1f}x")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the greedy stability fallback")
+    parser.add_argument(
+        "--sizes",
+        default="50,300,1000,2000",
+        help="Comma-separated brick counts (default: 50,300,1000,2000)",
+    )
+    parser.add_argument("--world-dim", type=int, default=20, help="World dimension (default: 20)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    args = parser.parse_args(argv)
+    if not fallback._NUMPY_AVAILABLE:
+        raise SystemExit("NumPy is required for this benchmark")
+    benchmark([int(s) for s in args.sizes.split(",") if s], args.world_dim, args.seed)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""Load-test the gateway's serving modes.
+
+Starts ``backend.gateway`` twice on local ports: once as the original
+single-threaded ``HTTPServer`` speaking HTTP/1.0, and once as the
+``GatewayServer`` thread pool with keep-alive. For each it reports
+requests/sec of ``--clients`` concurrent clients polling a pending job via
+``GET /generate/{job_id}``, then opens up to ``--streams`` ``/progress/``
+SSE streams and reports how many were accepted and whether a ``/health``
+request is still answered while they are open. Jobs live in an in-memory
+fakeredis server with a simulated ``--rtt-ms`` round trip per command.
+Requires rq, redis and fakeredis.
+
+With ``--static`` it instead downloads a ``--file-mb`` MB asset
+``--downloads`` times from ``/static/`` and reports the MB/s and the CPU
+time spent in handler threads, reading the whole file into memory per
+request versus streaming it with ``sendfile``.
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import os
+import socket
+import sys
+import threading
+import time
+from http.server import HTTPServer
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+# Append (rather than prepend) the vendor directory so the real redis and
+# rq win over the offline-test stubs that live there.
+sys.path.append(str(project_root / "vendor"))
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ["RATE_LIMIT"] = str(10**9)
+os.environ.setdefault("CLEANUP_INTERVAL", "0")
+
+from redis import BlockingConnectionPool, Redis  # noqa: E402
+from rq import Queue  # noqa: E402
+
+import backend.gateway as gateway  # noqa: E402
+from backend import auth  # noqa: E402
+from backend.events import JobEvents  # noqa: E402
+
+
+class LegacyHandler(gateway.Handler):
+    """Handler as served before keep-alive: one request per connection."""
+
+    protocol_version = "HTTP/1.0"
+    timeout = None
+
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+class QuietHandler(gateway.Handler):
+    def log_message(self, format: str, *args) -> None:
+        return
+
+
+class TimedHandler(QuietHandler):
+    """Record the CPU time each connection spends in its handler thread."""
+
+    cpu: list[float] = []
+
+    def handle(self) -> None:
+        start = time.thread_time()
+        try:
+            super().handle()
+        finally:
+            self.cpu.append(time.thread_time() - start)
+
+
+class ReadBytesHandler(TimedHandler):
+    """Static serving as before ``sendfile``: read, then write the body."""
+
+    def _send_static(self, head: bool = False) -> None:
+        file_path = (gateway.STATIC_ROOT / self.path[len("/static/") :]).resolve()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        data = file_path.read_bytes()
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def _fake_redis(rtt: float) -> Redis:
+    """Return a fakeredis client whose replies are delayed by ``rtt`` seconds."""
+    import fakeredis
+
+    class SlowConnection(fakeredis.FakeRedisConnection):
+        def read_response(self, *args, **kwargs):
+            time.sleep(rtt)
+            return super().read_response(*args, **kwargs)
+
+    server = fakeredis.FakeServer()
+    return Redis(connection_pool=BlockingConnectionPool(connection_class=SlowConnection, server=server))
+
+
+def _get(conn: http.client.HTTPConnection, path: str, token: str) -> int:
+    conn.request("GET", path, headers={"Authorization": f"Bearer {token}"})
+    resp = conn.getresponse()
+    resp.read()
+    return resp.status
+
+
+def _throughput(port: int, path: str, token: str, clients: int, duration: float, keep_alive: bool) -> float:
+    """Return requests/sec of ``clients`` threads hitting ``path`` for ``duration`` s."""
+    counts = [0] * clients
+    deadline = time.perf_counter() + duration
+
+    def client(idx: int) -> None:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        while time.perf_counter() < deadline:
+            if _get(conn, path, token) != 202:
+                raise SystemExit(f"Unexpected response for {path}")
+            counts[idx] += 1
+            if not keep_alive:
+                conn.close()
+                conn = http.client.HTTPConnection("127.0.0.1", port, timeout=30)
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(i,)) for i in range(clients)]
+    start = time.perf_counter()
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(counts) / (time.perf_counter() - start)
+
+
+def _stream_capacity(port: int, job_ids: list[str], timeout: float) -> tuple[int, float | None]:
+    """Open a ``/progress/`` stream per job and return how many got a 200.
+
+    Also returns the ``/health`` latency with the streams open, or ``None``
+    if it was not answered within ``timeout`` seconds.
+    """
+    streams = []
+    accepted = 0
+    for job_id in job_ids:
+        conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+        streams.append(conn)
+        try:
+            conn.request("GET", f"/progress/{job_id}")
+            if conn.getresponse().status == 200:
+                accepted += 1
+        except (socket.timeout, OSError):
+            pass
+    conn = http.client.HTTPConnection("127.0.0.1", port, timeout=timeout)
+    start = time.perf_counter()
+    try:
+        conn.request("GET", "/health")
+        conn.getresponse().read()
+        health: float | None = time.perf_counter() - start
+    except (socket.timeout, OSError):
+        health = None
+    for stream in [conn, *streams]:
+        stream.close()
+    return accepted, health
+
+
+def benchmark(clients: int, duration: float, streams: int, threads: int, rtt_ms: float) -> None:
+    gateway.redis_conn = _fake_redis(rtt_ms / 1000)
+    queue = Queue("benchmark-gateway", connection=gateway.redis_conn)
+    job_ids = [queue.enqueue("builtins.len", "x").id for _ in range(max(streams, 1))]
+    token = auth.encode({"sub": "bench"}, os.environ["JWT_SECRET"])
+    servers = (
+        ("legacy", lambda: HTTPServer(("127.0.0.1", 0), LegacyHandler), False),
+        (
+            "threaded",
+            lambda: gateway.GatewayServer(("127.0.0.1", 0), QuietHandler, threads=threads, max_streams=threads // 2),
+            True,
+        ),
+    )
+    print(f"{'server':<9} {'req/s':>8} {'streams':>8} {'health ms':>10}")
+    for label, make_server, keep_alive in servers:
+        gateway.job_events = JobEvents(gateway.redis_conn)
+        httpd = make_server()
+        port = httpd.server_address[1]
+        thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+        thread.start()
+        try:
+            rps = _throughput(port, f"/generate/{job_ids[0]}", token, clients, duration, keep_alive)
+            accepted, health = _stream_capacity(port, job_ids[:streams], timeout=2.0)
+        finally:
+            # Streams of the legacy server finish once the jobs are gone
+            httpd.shutdown()
+            httpd.server_close()
+        health_ms = f"{health * 1000:.1f}" if health is not None else "timeout"
+        print(f"{label:<9} {rps:>8.0f} {accepted:>5}/{streams:<2} {health_ms:>10}")
+    gateway.redis_conn.delete(queue.key, *(f"rq:job:{job_id}" for job_id in job_ids))
+
+
+def benchmark_static(file_mb: int, downloads: int) -> None:
+    """Print MB/s and handler CPU for downloading one static asset."""
+    import shutil
+    import tempfile
+    import uuid
+
+    root = Path(tempfile.mkdtemp())
+    run_dir = root / str(uuid.uuid4())
+    run_dir.mkdir()
+    (run_dir / "model.ldr").write_bytes(os.urandom(file_mb * 2**20))
+    gateway.STATIC_ROOT = root.resolve()
+    path = f"/static/{run_dir.name}/model.ldr"
+    print(f"{'server':<10} {'MB/s':>8} {'cpu ms/req':>11}")
+    try:
+        for label, handler in (("read", ReadBytesHandler), ("sendfile", TimedHandler)):
+            TimedHandler.cpu = []
+            httpd = gateway.GatewayServer(("127.0.0.1", 0), handler, threads=4, max_streams=2)
+            thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+            thread.start()
+            conn = http.client.HTTPConnection("127.0.0.1", httpd.server_address[1], timeout=30)
+            start = time.perf_counter()
+            try:
+                for _ in range(downloads):
+                    conn.request("GET", path)
+                    resp = conn.getresponse()
+                    while resp.read(2**20):
+                        pass
+            finally:
+                elapsed = time.perf_counter() - start
+                conn.close()
+                httpd.shutdown()
+                httpd.server_close()
+            print(
+                f"{label:<10} {file_mb * downloads / elapsed:>8.0f} "
+                f"{sum(TimedHandler.cpu) / downloads * 1000:>11.2f}"
+            )
+    finally:
+        shutil.rmtree(root)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark gateway serving modes")
+    parser.add_argument("--clients", type=int, default=16, help="Concurrent polling clients (default: 16)")
+    parser.add_argument("--duration", type=float, default=3.0, help="Seconds of polling per server (default: 3)")
+    parser.add_argument("--streams", type=int, default=8, help="SSE streams to open (default: 8)")
+    parser.add_argument("--threads", type=int, default=32, help="GatewayServer threads (default: 32)")
+    parser.add_argument(
+        "--rtt-ms",
+        type=float,
+        default=0.2,
+        help="Simulated Redis round trip (default: 0.2)",
+    )
+    parser.add_argument("--static", action="store_true", help="Benchmark /static/ downloads instead")
+    parser.add_argument("--file-mb", type=int, default=32, help="Size of the static asset (default: 32)")
+    parser.add_argument("--downloads", type=int, default=50, help="Static downloads per server (default: 50)")
+    args = parser.parse_args(argv)
+    if args.static:
+        benchmark_static(args.file_mb, args.downloads)
+        return
+    benchmark(args.clients, args.duration, args.streams, args.threads, args.rtt_ms)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""Benchmark recording request metrics from many threads.
+
+Each of ``--threads`` threads records ``--events`` authenticated requests:
+one counter increment plus one per-minute history entry. The ``legacy``
+mode is the original dict counter with a history dict pruned on every call
+under a lock; ``registry`` uses the per-thread counters and minute ring of
+``backend.metrics``. Prints events/sec for each.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from backend.metrics import Registry  # noqa: E402
+
+
+def _legacy_recorder():
+    lock = threading.RLock()
+    counters = {"token_usage": 0}
+    history: dict[str, dict[int, int]] = {"token_usage": {}}
+
+    def record() -> None:
+        with lock:
+            counters["token_usage"] += 1
+            now_min = int(time.time() // 60)
+            hist = history["token_usage"]
+            hist[now_min] = hist.get(now_min, 0) + 1
+            for ts in list(hist):
+                if now_min - ts > 59:
+                    del hist[ts]
+
+    # A full hour of history, as on a busy server
+    now_min = int(time.time() // 60)
+    history["token_usage"] = {now_min - i: 1 for i in range(60)}
+    return record
+
+
+def _registry_recorder():
+    registry = Registry()
+    counter = registry.counter("token_usage")
+    history = registry.history("token_usage")
+
+    def record() -> None:
+        counter.inc()
+        history.record()
+
+    return record
+
+
+def benchmark(threads: int, events: int) -> None:
+    print(f"{'mode':<9} {'events/s':>10}")
+    for label, make in (("legacy", _legacy_recorder), ("registry", _registry_recorder)):
+        record = make()
+
+        def work() -> None:
+            for _ in range(events):
+                record()
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+        print(f"{label:<9} {threads * events / elapsed:>10.0f}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark metric recording")
+    parser.add_argument("--threads", type=int, default=8, help="Recording threads (default: 8)")
+    parser.add_argument("--events", type=int, default=50000, help="Events per thread (default: 50000)")
+    args = parser.parse_args(argv)
+    benchmark(args.threads, args.events)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
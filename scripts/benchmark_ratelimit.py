@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""Benchmark the Redis rate limiter with and without local leases.
+
+Sends ``--requests`` rate-limit checks spread over ``--tokens`` tokens from
+``--threads`` threads, first with leasing disabled (one Lua call per
+request) and then with the default ``RATE_LIMIT_LEASE``. Prints checks per
+second, Redis round trips and how many requests were admitted. Uses an
+in-memory fakeredis server (requires lupa for Lua) with a simulated
+``--rtt-ms`` round trip per command unless ``--redis-url`` is given.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+# Append (rather than prepend) the vendor directory so the real redis
+# wins over the offline-test stub that lives there.
+sys.path.append(str(project_root / "vendor"))
+
+from redis import BlockingConnectionPool, Redis  # noqa: E402
+
+from backend import ratelimit  # noqa: E402
+
+
+def _fake_redis(rtt: float) -> Redis:
+    import fakeredis
+
+    class SlowConnection(fakeredis.FakeRedisConnection):
+        def read_response(self, *args, **kwargs):
+            time.sleep(rtt)
+            return super().read_response(*args, **kwargs)
+
+    return Redis(connection_pool=BlockingConnectionPool(connection_class=SlowConnection, server=fakeredis.FakeServer()))
+
+
+def benchmark(requests: int, tokens: int, threads: int, limit: int, redis_url: str | None, rtt_ms: float) -> None:
+    conn = Redis.from_url(redis_url) if redis_url else _fake_redis(rtt_ms / 1000)
+    print(f"{'mode':<8} {'checks/s':>9} {'round trips':>12} {'admitted':>9}")
+    for label, lease in (("exact", 0.0), ("lease", ratelimit.RATE_LIMIT_LEASE)):
+        prefix = f"legogpt:bench:{label}:{time.time()}:"
+        limiter = ratelimit.RateLimiter(conn, lease=lease, prefix=prefix)
+        for key in ratelimit.METRICS:
+            ratelimit.METRICS[key] = 0
+        admitted = [0] * threads
+
+        def client(idx: int) -> None:
+            for n in range(idx, requests, threads):
+                admitted[idx] += limiter.hit(f"token-{n % tokens}", limit)
+
+        workers = [threading.Thread(target=client, args=(i,)) for i in range(threads)]
+        start = time.perf_counter()
+        for t in workers:
+            t.start()
+        for t in workers:
+            t.join()
+        elapsed = time.perf_counter() - start
+        print(
+            f"{label:<8} {requests / elapsed:>9.0f} {ratelimit.METRICS['rate_limit_redis']:>12} "
+            f"{sum(admitted):>9}"
+        )
+        keys = list(conn.scan_iter(f"{prefix}*"))
+        if keys:
+            conn.delete(*keys)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the Redis rate limiter")
+    parser.add_argument("--requests", type=int, default=20000, help="Rate-limit checks (default: 20000)")
+    parser.add_argument("--tokens", type=int, default=20, help="Distinct tokens (default: 20)")
+    parser.add_argument("--threads", type=int, default=8, help="Client threads (default: 8)")
+    parser.add_argument("--limit", type=int, default=1000, help="Requests per token per window (default: 1000)")
+    parser.add_argument("--redis-url", default=None, help="Use a real Redis server instead of fakeredis")
+    parser.add_argument(
+        "--rtt-ms",
+        type=float,
+        default=0.2,
+        help="Simulated Redis round trip for fakeredis (default: 0.2)",
+    )
+    args = parser.parse_args(argv)
+    benchmark(args.requests, args.tokens, args.threads, args.limit, args.redis_url, args.rtt_ms)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
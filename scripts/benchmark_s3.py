@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Measure the upload time of generation runs to a local S3 stand-in.
+
+Starts moto's S3 server (``pip install "moto[server]" boto3``), or uses an
+existing endpoint such as MinIO given with ``--endpoint``, and uploads
+``--runs`` simulated run directories: a random ``--png-kb`` preview plus
+LDraw, glTF and PDF files scaled by ``--model-kb``. ``legacy`` creates a
+client per file, gzips every file to a temporary file on disk and uploads
+one file after the other, as before. ``pooled`` uses
+``backend.storage.maybe_upload_assets``. Prints the mean and p95 seconds
+per run.
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import logging
+import mimetypes
+import os
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+sys.path.append(str(project_root / "vendor"))
+
+from backend import storage  # noqa: E402
+
+BUCKET = "legogpt-bench"
+
+
+def _legacy_upload(path: Path, key: str, endpoint: str) -> str:
+    import boto3
+
+    client = boto3.client("s3", endpoint_url=endpoint)
+    with tempfile.NamedTemporaryFile(delete=False, suffix=".gz") as tmp:
+        with open(path, "rb") as src, gzip.GzipFile(fileobj=tmp, mode="wb") as gz:
+            shutil.copyfileobj(src, gz)
+    try:
+        ctype = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+        extra = {"ContentType": ctype, "ContentEncoding": "gzip"}
+        client.upload_file(tmp.name, BUCKET, key, ExtraArgs=extra)
+    finally:
+        os.unlink(tmp.name)
+    return key
+
+
+def _make_runs(root: Path, runs: int, png_kb: int, model_kb: int) -> list[list[Path]]:
+    line = b"1 4 0 0 0 1 0 0 0 1 0 0 0 1 3001.dat\n"
+    result = []
+    for i in range(runs):
+        run = root / f"run{i}"
+        run.mkdir()
+        files = {
+            "preview.png": os.urandom(png_kb * 1024),
+            "model.ldr": line * (model_kb * 1024 // len(line)),
+            "model.gltf": b'{"nodes": [{"mesh": 0}]}\n' * (model_kb * 4 * 1024 // 26),
+            "instructions.pdf": os.urandom(model_kb * 1024),
+        }
+        paths = []
+        for name, data in files.items():
+            (run / name).write_bytes(data)
+            paths.append(run / name)
+        result.append(paths)
+    return result
+
+
+def benchmark(endpoint: str, runs: int, png_kb: int, model_kb: int) -> None:
+    import boto3
+
+    boto3.client("s3", endpoint_url=endpoint).create_bucket(Bucket=BUCKET)
+    root = Path(tempfile.mkdtemp())
+    try:
+        assets = _make_runs(root, runs, png_kb, model_kb)
+        print(f"{'mode':<7} {'mean s':>8} {'p95 s':>8}")
+        for mode in ("legacy", "pooled"):
+            times = []
+            with patch.object(storage, "S3_BUCKET", BUCKET), patch.object(storage, "S3_ENDPOINT_URL", endpoint):
+                for paths in assets:
+                    start = time.perf_counter()
+                    if mode == "legacy":
+                        for path in paths:
+                            _legacy_upload(path, f"{path.parent.name}/{path.name}", endpoint)
+                    else:
+                        storage.maybe_upload_assets(paths)
+                    times.append(time.perf_counter() - start)
+            times.sort()
+            p95 = times[min(len(times) - 1, int(0.95 * len(times)))]
+            print(f"{mode:<7} {sum(times) / len(times):>8.3f} {p95:>8.3f}")
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark S3 uploads of generation runs")
+    parser.add_argument("--endpoint", help="S3 endpoint to use instead of starting moto")
+    parser.add_argument("--runs", type=int, default=20, help="Runs uploaded per mode (default: 20)")
+    parser.add_argument("--png-kb", type=int, default=256, help="Preview size in KiB (default: 256)")
+    parser.add_argument("--model-kb", type=int, default=512, help="LDraw/PDF size in KiB (default: 512)")
+    args = parser.parse_args(argv)
+    for name in ("AWS_ACCESS_KEY_ID", "AWS_SECRET_ACCESS_KEY"):
+        os.environ.setdefault(name, "testing")
+    os.environ.setdefault("AWS_DEFAULT_REGION", "us-east-1")
+    if args.endpoint:
+        benchmark(args.endpoint, args.runs, args.png_kb, args.model_kb)
+        return
+    from moto.server import ThreadedMotoServer
+
+    logging.getLogger("werkzeug").setLevel(logging.WARNING)
+    server = ThreadedMotoServer(port=0)
+    server.start()
+    try:
+        host, port = server.get_host_and_port()
+        benchmark(f"http://{host}:{port}", args.runs, args.png_kb, args.model_kb)
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
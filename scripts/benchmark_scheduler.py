@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""Simulate detection and generation latency with and without job routing.
+
+A discrete-event simulation of ``--seconds`` of mixed traffic on
+``--workers`` workers: quick inventory detections, generations from light
+users (a tenth of them with a priority tier, a tenth with large inventory
+filters) and a burst of ``--burst`` generations from one heavy user.
+``fifo`` puts every job on one queue served by all workers, as before.
+``routed`` uses ``backend.scheduler`` to route jobs and runs one detector
+worker plus generation workers taking the weighted generation queues.
+Prints the p50/p95 latency (queue wait plus run time) of detections, light
+users' generations and the heavy user's generations in seconds.
+"""
+from __future__ import annotations
+
+import argparse
+import heapq
+import random
+import sys
+from collections import deque
+from pathlib import Path
+from unittest.mock import patch
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+sys.path.append(str(project_root / "vendor"))
+
+from backend import scheduler  # noqa: E402
+
+
+class Counters:
+    """In-memory stand-in for the Redis counters of the fair share."""
+
+    def __init__(self) -> None:
+        self.data: dict[str, int] = {}
+        self.ops: list[tuple] = []
+
+    def pipeline(self) -> "Counters":
+        return self
+
+    def __enter__(self) -> "Counters":
+        self.ops = []
+        return self
+
+    def __exit__(self, *exc) -> bool:
+        return False
+
+    def incrby(self, key: str, amount: int) -> None:
+        self.ops.append((key, amount))
+
+    def expire(self, key: str, seconds: int) -> None:
+        self.ops.append((key, 0))
+
+    def execute(self) -> list:
+        results = []
+        for key, amount in self.ops:
+            self.data[key] = self.data.get(key, 0) + amount
+            results.append(self.data[key])
+        return results
+
+
+def _arrivals(seconds: float, burst: int, rng: random.Random) -> list[tuple[float, str, dict, float, float]]:
+    """Return ``(time, kind, claims, cost, run time)`` of every job."""
+    jobs = []
+    t = 0.0
+    while True:
+        t += rng.expovariate(0.5)
+        if t > seconds:
+            break
+        jobs.append((t, "detect", {"sub": "scanner"}, 0.0, rng.uniform(0.3, 0.7)))
+    t = 0.0
+    while True:
+        t += rng.expovariate(0.2)
+        if t > seconds:
+            break
+        user = rng.randrange(20)
+        claims = {"sub": f"user{user}", **({"tier": "pro"} if user < 2 else {})}
+        large = rng.random() < 0.1
+        cost = 100.0 if large else rng.uniform(3, 20)
+        jobs.append((t, "generate", claims, cost, rng.lognormvariate(1.5, 0.4) * (3 if large else 1)))
+    start = seconds / 10
+    for i in range(burst):
+        jobs.append((start + i * 0.1, "generate", {"sub": "heavy"}, 10.0, rng.lognormvariate(1.5, 0.4)))
+    return sorted(jobs, key=lambda job: job[0])
+
+
+def simulate(mode: str, jobs: list, workers: int, seed: int) -> dict[str, list[float]]:
+    """Return the latencies of each job group under ``mode``."""
+    rng = random.Random(seed)
+    clock = [0.0]
+    sched = scheduler.Scheduler(Counters(), enabled=True)
+    base = "legogpt"
+    if mode == "fifo":
+        pools = [[(base, 1.0)] for _ in range(workers)]
+    else:
+        pools = [scheduler.default_weights(base, detect=True)]
+        pools += [scheduler.default_weights(base) for _ in range(workers - 1)]
+    queues: dict[str, deque] = {name: deque() for pool in pools for name, _ in pool}
+    idle = list(range(workers))
+    events: list[tuple[float, int, str, object]] = []
+    latencies: dict[str, list[float]] = {"detect": [], "light": [], "heavy": []}
+    for i, job in enumerate(jobs):
+        heapq.heappush(events, (job[0], i, "arrive", job))
+
+    def dispatch() -> None:
+        for worker in list(idle):
+            pool = pools[worker]
+            names = scheduler.weighted_order([n for n, _ in pool], [w for _, w in pool], rng)
+            for name in names:
+                if queues[name]:
+                    arrived, group, run = queues[name].popleft()
+                    idle.remove(worker)
+                    heapq.heappush(events, (clock[0] + run, -1, "done", (worker, group, arrived)))
+                    break
+
+    with patch.object(scheduler.time, "time", lambda: clock[0]):
+        while events:
+            clock[0], _, event, data = heapq.heappop(events)
+            if event == "arrive":
+                at, kind, claims, cost, run = data
+                if mode == "fifo":
+                    name = base
+                else:
+                    name = scheduler.queue_name(base, sched.job_class(kind, claims, cost))
+                group = "detect" if kind == "detect" else "heavy" if claims["sub"] == "heavy" else "light"
+                queues[name].append((at, group, run))
+            else:
+                worker, group, arrived = data
+                latencies[group].append(clock[0] - arrived)
+                idle.append(worker)
+            dispatch()
+    return latencies
+
+
+def _percentile(values: list[float], q: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))] if ordered else 0.0
+
+
+def benchmark(seconds: float, workers: int, burst: int, seed: int) -> None:
+    jobs = _arrivals(seconds, burst, random.Random(seed))
+    print(f"{'mode':<7} {'detect p50':>10} {'detect p95':>10} {'light p95':>10} {'heavy p95':>10}")
+    for mode in ("fifo", "routed"):
+        lat = simulate(mode, jobs, workers, seed)
+        print(
+            f"{mode:<7} {_percentile(lat['detect'], 0.5):>10.1f} {_percentile(lat['detect'], 0.95):>10.1f}"
+            f" {_percentile(lat['light'], 0.95):>10.1f} {_percentile(lat['heavy'], 0.95):>10.1f}"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Simulate job routing under mixed load")
+    parser.add_argument("--seconds", type=float, default=1800, help="Simulated traffic (default: 1800)")
+    parser.add_argument("--workers", type=int, default=4, help="Workers in total (default: 4)")
+    parser.add_argument("--burst", type=int, default=60, help="Generations in the heavy user's burst (default: 60)")
+    parser.add_argument("--seed", type=int, default=1, help="Random seed (default: 1)")
+    args = parser.parse_args(argv)
+    benchmark(args.seconds, args.workers, args.burst, args.seed)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
@@ -0,0 +1,201 @@
+#!/usr/bin/env python3
+"""Benchmark stability-model construction and HiGHS solve time.
+
+Compares the original per-stud, all-bricks constraint builder with the
+spatial-index builder used by ``OrtoolsSolver`` on synthetic towers and
+walls. With ``--incremental`` it instead replays each structure brick by
+brick, checking stability after every brick with a full re-solve and with
+a :class:`StabilitySession`. With ``--decomposed`` it solves groups of
+separate towers as one MIP and per component across ``--workers``
+processes. Requires OR-Tools.
+"""
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+
+from backend.solver import decompose  # noqa: E402
+from backend.solver.incremental import StabilitySession  # noqa: E402
+from backend.solver.ortools_solver import OrtoolsSolver, _ORTOOLS_AVAILABLE, _Structure, pywraplp  # noqa: E402
+from legogpt.data import LegoBrick  # noqa: E402
+
+
+def wall(n: int, length: int = 40) -> list[LegoBrick]:
+    """Running-bond wall of 1x4 bricks, ``length`` studs long.
+
+    Odd courses are closed with 1x2 bricks so every stud is supported.
+    """
+    bricks: list[LegoBrick] = []
+    z = 0
+    while len(bricks) < n:
+        if z % 2:
+            course = [LegoBrick(h=2, w=1, x=0, y=0, z=z)]
+            course += [LegoBrick(h=4, w=1, x=x, y=0, z=z) for x in range(2, length - 2, 4)]
+            course.append(LegoBrick(h=2, w=1, x=length - 2, y=0, z=z))
+        else:
+            course = [LegoBrick(h=4, w=1, x=x, y=0, z=z) for x in range(0, length, 4)]
+        bricks.extend(course[: n - len(bricks)])
+        z += 1
+    return bricks
+
+
+def tower(n: int) -> list[LegoBrick]:
+    """Interlocking 4x4 tower of 2x4 bricks with alternating orientation."""
+    bricks: list[LegoBrick] = []
+    z = 0
+    while len(bricks) < n:
+        for k in range(2):
+            if len(bricks) == n:
+                break
+            if z % 2:
+                bricks.append(LegoBrick(h=4, w=2, x=0, y=2 * k, z=z))
+            else:
+                bricks.append(LegoBrick(h=2, w=4, x=2 * k, y=0, z=z))
+        z += 1
+    return bricks
+
+
+def towers(n: int, count: int = 8) -> list[LegoBrick]:
+    """``count`` separate towers, each capped by an overhanging brick."""
+    per = max(n // count, 2)
+    bricks: list[LegoBrick] = []
+    for k in range(count):
+        body = tower(per - per % 2)  # full top course
+        bricks += [LegoBrick(h=b.h, w=b.w, x=b.x + 6 * k, y=b.y, z=b.z) for b in body]
+        bricks.append(LegoBrick(h=2, w=2, x=6 * k + 3, y=3, z=body[-1].z + 1))
+    return bricks[:n]
+
+
+def _legacy_build(solver, bricks: list[LegoBrick]) -> list:
+    """Constraint builder used before the spatial index was introduced."""
+    keep_vars = [solver.BoolVar(f"keep_{i}") for i in range(len(bricks))]
+    solver.Maximize(solver.Sum(keep_vars))
+    for i, bi in enumerate(bricks):
+        if bi.z == 0:
+            continue
+        for x in range(bi.x, bi.x + bi.h):
+            for y in range(bi.y, bi.y + bi.w):
+                supporters = []
+                for j, bj in enumerate(bricks):
+                    if bj.z == bi.z - 1 and bj.x <= x < bj.x + bj.h and bj.y <= y < bj.y + bj.w:
+                        supporters.append(keep_vars[j])
+                if supporters:
+                    solver.Add(solver.Sum(supporters) >= keep_vars[i])
+                else:
+                    solver.Add(keep_vars[i] == 0)
+    return keep_vars
+
+
+def _run(build, bricks: list[LegoBrick], backend: str) -> tuple[float, float, int, int]:
+    solver = pywraplp.Solver.CreateSolver(backend)
+    start = time.perf_counter()
+    keep_vars = build(solver, bricks)
+    built = time.perf_counter()
+    solver.Solve()
+    solved = time.perf_counter()
+    kept = sum(1 for v in keep_vars if v.solution_value() > 0.5)
+    return built - start, solved - built, solver.NumConstraints(), kept
+
+
+def benchmark(sizes: list[int], backend: str, legacy_max: int) -> None:
+    """Print build/solve timings for each shape and size."""
+    indexed = OrtoolsSolver(backend)._build_model
+    print(f"{'shape':<6} {'bricks':>6} {'builder':<8} {'build s':>9} {'solve s':>9} {'constr':>7} {'kept':>6}")
+    for name, shape in (("tower", tower), ("wall", wall)):
+        for n in sizes:
+            bricks = shape(n)
+            builders = [("index", indexed)]
+            if n <= legacy_max:
+                builders.insert(0, ("legacy", _legacy_build))
+            for label, build in builders:
+                build_s, solve_s, constraints, kept = _run(build, bricks, backend)
+                print(
+                    f"{name:<6} {n:>6} {label:<8} {build_s:>9.4f} {solve_s:>9.4f} {constraints:>7} {kept:>6}"
+                )
+
+
+def benchmark_incremental(sizes: list[int], backend: str) -> None:
+    """Print the cost of validating after every brick, full vs incremental."""
+    solver = OrtoolsSolver(backend)
+    print(f"{'shape':<6} {'bricks':>6} {'full s':>9} {'session s':>9} {'speedup':>8}")
+    for name, shape in (("tower", tower), ("wall", wall)):
+        for n in sizes:
+            bricks = shape(n)
+            start = time.perf_counter()
+            for k in range(1, n + 1):
+                solver.solve(_Structure(bricks[:k]))
+            full = time.perf_counter() - start
+            session = StabilitySession(backend)
+            start = time.perf_counter()
+            for brick in bricks:
+                session.add_brick(brick)
+                session.solve()
+            incremental = time.perf_counter() - start
+            print(f"{name:<6} {n:>6} {full:>9.3f} {incremental:>9.3f} {full / incremental:>7.1f}x")
+
+
+def benchmark_decomposed(sizes: list[int], backend: str, workers: int) -> None:
+    """Print monolithic vs per-component solve time on separate towers."""
+    solver = OrtoolsSolver(backend)
+    print(f"{'bricks':>6} {'comps':>6} {'single s':>9} {'pool s':>9} {'kept':>6}")
+    for n in sizes:
+        bricks = towers(n)
+        start = time.perf_counter()
+        kept = sum(solver._solve_mask(bricks))
+        single = time.perf_counter() - start
+        decompose.SOLVER_WORKERS, decompose.SOLVER_PARALLEL_MIN_BRICKS = workers, 0
+        decompose.solve_decomposed(solver, bricks[:20])  # start the pool processes
+        start = time.perf_counter()
+        pool_kept = sum(decompose.solve_decomposed(solver, bricks))
+        pooled = time.perf_counter() - start
+        decompose.SOLVER_WORKERS = 0
+        if kept != pool_kept:
+            raise SystemExit(f"Mismatch for {n} bricks")
+        comps = len(decompose.support_components(bricks))
+        print(f"{n:>6} {comps:>6} {single:>9.4f} {pooled:>9.4f} {kept:>6}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark stability model construction")
+    parser.add_argument(
+        "--sizes",
+        default="50,100,300,1000,2000",
+        help="Comma-separated brick counts (default: 50,100,300,1000,2000)",
+    )
+    parser.add_argument("--backend", default="HIGHs", help="OR-Tools backend (default: HIGHs)")
+    parser.add_argument(
+        "--legacy-max",
+        type=int,
+        default=2000,
+        help="Skip the legacy builder above this many bricks (default: 2000)",
+    )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        help="Compare per-brick validation with full re-solves and a StabilitySession",
+    )
+    parser.add_argument(
+        "--decomposed",
+        action="store_true",
+        help="Compare one MIP with per-component solves on separate towers",
+    )
+    parser.add_argument("--workers", type=int, default=4, help="Processes for --decomposed (default: 4)")
+    args = parser.parse_args(argv)
+    if not _ORTOOLS_AVAILABLE:
+        raise SystemExit("OR-Tools is required for this benchmark")
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    if args.incremental:
+        benchmark_incremental(sizes, args.backend)
+    elif args.decomposed:
+        benchmark_decomposed(sizes, args.backend, args.workers)
+    else:
+        benchmark(sizes, args.backend, args.legacy_max)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
@@ -0,0 +1,288 @@
+#!/usr/bin/env python3
+"""Benchmark ``GET /generate/{job_id}`` latency under concurrent polling.
+
+Enqueues ``--jobs`` pending jobs and starts ``--pollers`` concurrent
+clients that each poll one job every ``--interval`` seconds, ``--polls``
+times, through the ASGI app in ``backend.api``. Prints p50/p99/max latency for the asyncio status fast
+path (one ``HGET`` of the job's ``status`` field) and for the original
+route, which ran a blocking ``Job.fetch`` inside the handler. Uses an
+in-memory fakeredis server with a simulated ``--rtt-ms`` round trip per
+command unless ``--redis-url`` is given. With ``--completion`` it instead
+finishes ``--jobs`` jobs at random times and reports how long clients take
+to see each result and how many requests they send, polling every
+``--interval`` seconds versus long-polling with ``?wait=``. Requires rq, redis and fakeredis.
+"""
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+# Append (rather than prepend) the vendor directory so the real redis and
+# rq win over the offline-test stubs that live there.
+sys.path.append(str(project_root / "vendor"))
+os.environ.setdefault("JWT_SECRET", "bench")
+os.environ["RATE_LIMIT"] = str(10**9)
+
+from redis import BlockingConnectionPool, Redis  # noqa: E402
+from redis import asyncio as aioredis  # noqa: E402
+from rq import Queue  # noqa: E402
+
+import backend.api as api  # noqa: E402
+from backend import auth  # noqa: E402
+from backend.events import AsyncJobEvents, JOB_EVENTS_CHANNEL, LONG_POLL_MAX  # noqa: E402
+
+
+async def _legacy_job_status(job_id: str):
+    """Status lookup as implemented before the asyncio client existed."""
+    try:
+        job = api.Job.fetch(job_id, connection=api.redis_conn)
+    except Exception:
+        return None, None
+    if job.is_finished:
+        return "finished", job
+    if job.is_failed:
+        return "failed", job
+    return "queued", job
+
+
+async def _get(path: str, token: str, query: bytes = b"") -> int:
+    """Send a GET through the ASGI app and return the status code."""
+    scope = {
+        "type": "http",
+        "asgi": {"version": "3.0"},
+        "http_version": "1.1",
+        "method": "GET",
+        "scheme": "http",
+        "path": path,
+        "raw_path": path.encode(),
+        "query_string": query,
+        "root_path": "",
+        "headers": [(b"authorization", f"Bearer {token}".encode())],
+        "client": ("127.0.0.1", 0),
+        "server": ("127.0.0.1", 80),
+    }
+    status = 0
+
+    async def receive():
+        return {"type": "http.request", "body": b"", "more_body": False}
+
+    async def send(message):
+        nonlocal status
+        if message["type"] == "http.response.start":
+            status = message["status"]
+
+    await api.app(scope, receive, send)
+    return status
+
+
+async def _poll(job_ids: list[str], pollers: int, polls: int, interval: float, token: str) -> list[float]:
+    """Poll on a fixed schedule and return per-request latencies.
+
+    Each poller sends a request every ``interval`` seconds from a random
+    offset. Latency is measured from the scheduled send time, so time spent
+    waiting for a blocked event loop is counted too.
+    """
+    latencies: list[float] = []
+    loop = asyncio.get_running_loop()
+    rng = random.Random(0)
+    t0 = loop.time()
+
+    async def poller(job_id: str, offset: float) -> None:
+        for k in range(polls):
+            scheduled = t0 + offset + k * interval
+            await asyncio.sleep(max(0.0, scheduled - loop.time()))
+            code = await _get(f"/generate/{job_id}", token)
+            latencies.append(loop.time() - scheduled)
+            if code != 202:
+                raise SystemExit(f"Unexpected status {code}")
+
+    await asyncio.gather(
+        *(poller(job_ids[i % len(job_ids)], rng.uniform(0, interval)) for i in range(pollers))
+    )
+    return latencies
+
+
+async def _complete(job_ids: list[str], interval: float, spread: float, token: str, long_poll: bool):
+    """Finish each job at a random time while one client waits for it.
+
+    Returns the delay between each job finishing and its client getting
+    the result, and the number of status requests sent.
+    """
+    loop = asyncio.get_running_loop()
+    rng = random.Random(1)
+    finished_at: dict[str, float] = {}
+    delays: list[float] = []
+    requests = 0
+
+    async def finish(job_id: str, delay: float) -> None:
+        await asyncio.sleep(delay)
+        await api.async_redis.hset(f"rq:job:{job_id}", "status", "finished")
+        finished_at[job_id] = loop.time()
+        await api.async_redis.publish(JOB_EVENTS_CHANNEL, json.dumps({"job_id": job_id, "status": "finished"}))
+
+    async def client(job_id: str) -> None:
+        nonlocal requests
+        query = f"wait={LONG_POLL_MAX}".encode() if long_poll else b""
+        while True:
+            requests += 1
+            code = await _get(f"/generate/{job_id}", token, query)
+            if code == 200:
+                delays.append(loop.time() - finished_at[job_id])
+                return
+            if code != 202:
+                raise SystemExit(f"Unexpected status {code}")
+            if not long_poll:
+                await asyncio.sleep(interval)
+
+    await asyncio.gather(
+        *(finish(job_id, rng.uniform(0, spread)) for job_id in job_ids),
+        *(client(job_id) for job_id in job_ids),
+    )
+    return delays, requests
+
+
+def _percentile(values: list[float], q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+
+def _fake_pools(rtt: float, max_connections: int):
+    """Return sync and asyncio pools on one fakeredis server.
+
+    Every reply is delayed by ``rtt`` seconds to stand in for the network
+    round trip to a real Redis: a blocking sleep on the sync client and
+    an ``asyncio.sleep`` on the asyncio client.
+    """
+    import fakeredis
+
+    class SlowConnection(fakeredis.FakeRedisConnection):
+        def read_response(self, *args, **kwargs):
+            time.sleep(rtt)
+            return super().read_response(*args, **kwargs)
+
+    class SlowAsyncConnection(fakeredis.FakeAsyncRedisConnection):
+        async def read_response(self, *args, **kwargs):
+            await asyncio.sleep(rtt)
+            return await super().read_response(*args, **kwargs)
+
+    server = fakeredis.FakeServer()
+    return (
+        BlockingConnectionPool(connection_class=SlowConnection, server=server, max_connections=max_connections),
+        lambda: aioredis.BlockingConnectionPool(
+            connection_class=SlowAsyncConnection, server=server, max_connections=max_connections
+        ),
+    )
+
+
+def _redis_pools(redis_url: str, max_connections: int):
+    return (
+        BlockingConnectionPool.from_url(redis_url, max_connections=max_connections),
+        lambda: aioredis.BlockingConnectionPool.from_url(redis_url, max_connections=max_connections),
+    )
+
+
+def benchmark(
+    pollers: int, polls: int, interval: float, jobs: int, redis_url: str | None, rtt_ms: float
+) -> None:
+    if redis_url:
+        sync_pool, make_async_pool = _redis_pools(redis_url, api.REDIS_POOL_SIZE)
+    else:
+        sync_pool, make_async_pool = _fake_pools(rtt_ms / 1000, api.REDIS_POOL_SIZE)
+    sync_conn = Redis(connection_pool=sync_pool)
+    api.redis_conn = sync_conn
+    queue = Queue("benchmark-status", connection=sync_conn)
+    job_ids = [queue.enqueue("builtins.len", "x" * 1024, meta={"prompt": "p" * 256}).id for _ in range(jobs)]
+    token = auth.encode({"sub": "bench"}, os.environ["JWT_SECRET"])
+    fast_status = api._job_status
+    print(f"{'route':<8} {'requests':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'req/s':>8}")
+    try:
+        for label, status_fn in (("legacy", _legacy_job_status), ("async", fast_status)):
+            api._job_status = status_fn
+            # A fresh pool per run, since pools are bound to their event loop
+            api.async_redis = aioredis.Redis(connection_pool=make_async_pool())
+            start = time.perf_counter()
+            latencies = asyncio.run(_poll(job_ids, pollers, polls, interval, token))
+            elapsed = time.perf_counter() - start
+            print(
+                f"{label:<8} {len(latencies):>8} {_percentile(latencies, 0.5) * 1000:>8.2f} "
+                f"{_percentile(latencies, 0.99) * 1000:>8.2f} {max(latencies) * 1000:>8.2f} "
+                f"{len(latencies) / elapsed:>8.0f}"
+            )
+    finally:
+        api._job_status = fast_status
+        sync_conn.delete(queue.key, *(f"rq:job:{job_id}" for job_id in job_ids))
+
+
+def benchmark_completion(
+    jobs: int, interval: float, spread: float, redis_url: str | None, rtt_ms: float
+) -> None:
+    """Print how quickly clients see finished jobs, polling vs long-polling."""
+    if redis_url:
+        sync_pool, make_async_pool = _redis_pools(redis_url, api.REDIS_POOL_SIZE)
+    else:
+        sync_pool, make_async_pool = _fake_pools(rtt_ms / 1000, api.REDIS_POOL_SIZE)
+    sync_conn = Redis(connection_pool=sync_pool)
+    api.redis_conn = sync_conn
+    queue = Queue("benchmark-status", connection=sync_conn)
+    token = auth.encode({"sub": "bench"}, os.environ["JWT_SECRET"])
+    print(f"{'client':<10} {'requests':>8} {'mean ms':>8} {'p99 ms':>8}")
+    for label, long_poll in (("poll", False), ("long-poll", True)):
+        job_ids = [queue.enqueue("builtins.len", "x").id for _ in range(jobs)]
+        api.async_redis = aioredis.Redis(connection_pool=make_async_pool())
+        api.job_events = AsyncJobEvents(api.async_redis)
+        try:
+            delays, requests = asyncio.run(_complete(job_ids, interval, spread, token, long_poll))
+        finally:
+            sync_conn.delete(queue.key, *(f"rq:job:{job_id}" for job_id in job_ids))
+        print(
+            f"{label:<10} {requests:>8} {sum(delays) / len(delays) * 1000:>8.1f} "
+            f"{_percentile(delays, 0.99) * 1000:>8.1f}"
+        )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark job status polling")
+    parser.add_argument("--pollers", type=int, default=1000, help="Concurrent pollers (default: 1000)")
+    parser.add_argument("--polls", type=int, default=5, help="Requests per poller (default: 5)")
+    parser.add_argument(
+        "--interval",
+        type=float,
+        default=1.0,
+        help="Seconds between polls of one poller, as in the CLI (default: 1.0)",
+    )
+    parser.add_argument("--jobs", type=int, default=100, help="Pending jobs to poll (default: 100)")
+    parser.add_argument("--redis-url", default=None, help="Use a real Redis server instead of fakeredis")
+    parser.add_argument(
+        "--rtt-ms",
+        type=float,
+        default=0.2,
+        help="Simulated Redis round trip for fakeredis (default: 0.2)",
+    )
+    parser.add_argument(
+        "--completion",
+        action="store_true",
+        help="Time how soon clients see finished jobs, polling vs ?wait= long-polls",
+    )
+    parser.add_argument(
+        "--spread",
+        type=float,
+        default=5.0,
+        help="Jobs finish at random times within this many seconds (default: 5)",
+    )
+    args = parser.parse_args(argv)
+    if args.completion:
+        benchmark_completion(args.jobs, args.interval, args.spread, args.redis_url, args.rtt_ms)
+        return
+    benchmark(args.pollers, args.polls, args.interval, args.jobs, args.redis_url, args.rtt_ms)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
@@ -0,0 +1,182 @@
+#!/usr/bin/env python3
+"""Compare memory use and whole-structure checks of the structure backends.
+
+Builds the same random structure as a list-backed ``LegoStructure`` and an
+array-backed ``CompactLegoStructure`` and prints their approximate memory
+footprint and the time of the bounds, collision and floating checks.
+With ``--validate`` it instead replays each structure brick by brick and
+times the checks run after every brick, comparing the original per-brick
+loops with the fused ``LegoStructure.validate`` pass. With ``--ldr`` it
+times LDraw parsing with the original per-step parser and linear part-ID
+scan against the single-pass ``parse_ldr`` behind ``LegoStructure.from_ldr``. Requires NumPy.
+"""
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+import warnings
+from pathlib import Path
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+# Append (rather than prepend) the vendor directory so the real NumPy wins
+# over the offline-test stub that lives there.
+sys.path.append(str(project_root / "vendor"))
+
+import numpy as np  # noqa: E402
+
+from legogpt.data import CompactLegoStructure, LegoBrick, LegoStructure, lego_library  # noqa: E402
+from legogpt.data.lego_structure import parse_ldr  # noqa: E402
+from legogpt.stability_analysis import connectivity_score  # noqa: E402
+
+
+def random_structure(n: int, world_dim: int, rng: random.Random) -> list[LegoBrick]:
+    """Random bricks dropped onto a height map, so none float or collide.
+
+    Valid structures are the worst case for the checks, which otherwise
+    stop at the first offending brick.
+    """
+    heights = [[0] * world_dim for _ in range(world_dim)]
+    bricks: list[LegoBrick] = []
+    for _ in range(50 * n):
+        if len(bricks) == n:
+            return bricks
+        h, w = rng.choice([(1, 2), (2, 1), (2, 2), (2, 4), (4, 2)])
+        x, y = rng.randrange(world_dim - h + 1), rng.randrange(world_dim - w + 1)
+        z = max(heights[i][j] for i in range(x, x + h) for j in range(y, y + w))
+        if z >= world_dim:
+            continue
+        for i in range(x, x + h):
+            for j in range(y, y + w):
+                heights[i][j] = z + 1
+        bricks.append(LegoBrick(h=h, w=w, x=x, y=y, z=z))
+    raise SystemExit(f"World too small for {n} bricks")
+
+
+def footprint(structure: LegoStructure) -> int:
+    """Approximate bytes held by ``structure``'s bricks and occupancy grid."""
+    size = structure.voxel_occupancy.nbytes
+    if isinstance(structure, CompactLegoStructure):
+        return size + structure._records.nbytes
+    return size + sys.getsizeof(structure.bricks) + sum(
+        sys.getsizeof(b) + sys.getsizeof(b.__dict__) for b in structure.bricks
+    )
+
+
+def _time(func, repeat: int) -> float:
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func()
+    return (time.perf_counter() - start) / repeat
+
+
+def _legacy_checks(structure: LegoStructure) -> bool:
+    """Validity checks as implemented before ``validate()`` existed."""
+    if any(structure.brick_floats(b) for b in structure.bricks) or np.any(structure.voxel_occupancy > 1):
+        return False
+    if any(not structure.brick_in_bounds(b) for b in structure.bricks):
+        return False
+    return connectivity_score(structure).max() < 1
+
+
+def _fused_checks(structure: LegoStructure) -> bool:
+    return structure.validate().valid
+
+
+def benchmark_validate(sizes: list[int], world_dim: int, seed: int) -> None:
+    """Print the cost of checking validity after every added brick."""
+    rng = random.Random(seed)
+    _fused_checks(LegoStructure(random_structure(10, world_dim, rng), world_dim))  # warm-up
+    print(f"{'bricks':>6} {'legacy s':>9} {'fused s':>9} {'speedup':>8}")
+    for n in sizes:
+        bricks = random_structure(n, world_dim, rng)
+        timings = []
+        for check in (_legacy_checks, _fused_checks):
+            structure = LegoStructure([], world_dim)
+            start = time.perf_counter()
+            for brick in bricks:
+                structure.add_brick(brick)
+                if not check(structure):
+                    raise SystemExit(f"{check.__name__} rejected a valid structure")
+            timings.append(time.perf_counter() - start)
+        print(f"{n:>6} {timings[0]:>9.4f} {timings[1]:>9.4f} {timings[0] / timings[1]:>7.1f}x")
+
+
+def _legacy_parse_ldr(lego_ldr: str) -> list[LegoBrick]:
+    """LDraw parsing as implemented before the lookup tables existed."""
+    bricks = []
+    for chunk in [b for b in lego_ldr.split('0 STEP') if b.strip()]:
+        _, _, x0, y0, z0, *matrix, part_id = chunk.strip().split()
+        ori = {'0 0 1 0 1 0 -1 0 0': 0, '-1 0 0 0 1 0 0 0 -1': 1}[' '.join(matrix)]
+        brick_id = next(int(k) for k, v in lego_library.items() if v['partID'] == part_id)
+        h, w = lego_library[str(brick_id)]['height'], lego_library[str(brick_id)]['width']
+        if ori == 1:
+            h, w = w, h
+        bricks.append(LegoBrick(h=h, w=w, x=int(float(x0) / 20 - h * 0.5), y=int(float(z0) / 20 - w * 0.5),
+                                z=int(-float(y0) / 24)))
+    return bricks
+
+
+def benchmark_ldr(sizes: list[int], world_dim: int, repeat: int, seed: int) -> None:
+    """Print LDraw parse times for each structure size."""
+    rng = random.Random(seed)
+    print(f"{'bricks':>6} {'legacy s':>9} {'bulk s':>9} {'speedup':>8}")
+    for n in sizes:
+        bricks = random_structure(n, world_dim, rng)
+        ldr = ''.join(b.to_ldr() for b in bricks)
+        if _legacy_parse_ldr(ldr) != bricks or parse_ldr(ldr) != bricks:
+            raise SystemExit(f"Mismatch for {n} bricks")
+        slow = _time(lambda: _legacy_parse_ldr(ldr), repeat)
+        fast = _time(lambda: parse_ldr(ldr), repeat)
+        print(f"{n:>6} {slow:>9.5f} {fast:>9.5f} {slow / fast:>7.1f}x")
+
+
+def benchmark(sizes: list[int], world_dim: int, repeat: int, seed: int) -> None:
+    """Print memory and check timings for each structure size."""
+    rng = random.Random(seed)
+    print(f"{'bricks':>6} {'backend':<8} {'bytes':>8} {'bounds s':>9} {'collide s':>9} {'float s':>9}")
+    for n in sizes:
+        bricks = random_structure(n, world_dim, rng)
+        for label, cls in (("list", LegoStructure), ("compact", CompactLegoStructure)):
+            structure = cls(bricks, world_dim)
+            print(
+                f"{n:>6} {label:<8} {footprint(structure):>8} "
+                f"{_time(structure.has_out_of_bounds_bricks, repeat):>9.6f} "
+                f"{_time(structure.has_collisions, repeat):>9.6f} "
+                f"{_time(structure.has_floating_bricks, repeat):>9.6f}"
+            )
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark LegoStructure backends")
+    parser.add_argument(
+        "--sizes",
+        default="50,200,400",
+        help="Comma-separated brick counts (default: 50,200,400)",
+    )
+    parser.add_argument("--world-dim", type=int, default=20, help="World dimension (default: 20)")
+    parser.add_argument("--repeat", type=int, default=20, help="Calls per timing (default: 20)")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed (default: 0)")
+    parser.add_argument(
+        "--validate",
+        action="store_true",
+        help="Time validity checks after every brick, legacy loops vs validate()",
+    )
+    parser.add_argument("--ldr", action="store_true", help="Time LDraw parsing, legacy vs bulk")
+    args = parser.parse_args(argv)
+    if not hasattr(np, "cumsum"):
+        raise SystemExit("NumPy is required for this benchmark")
+    warnings.simplefilter("ignore")
+    sizes = [int(s) for s in args.sizes.split(",") if s]
+    if args.validate:
+        benchmark_validate(sizes, args.world_dim, args.seed)
+    elif args.ldr:
+        benchmark_ldr(sizes, args.world_dim, args.repeat, args.seed)
+    else:
+        benchmark(sizes, args.world_dim, args.repeat, args.seed)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()
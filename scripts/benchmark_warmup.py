@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""Benchmark first-job latency of a cold worker against a preloaded one.
+
+Each mode runs in a fresh interpreter, as a newly started worker would.
+Loading the model is simulated by a ``--load-seconds`` sleep in the
+``LegoGPT`` constructor. A job is one ``generate`` call followed by a
+``stability_score`` check of a ``--bricks`` brick wall. ``cold`` loads
+lazily on the first job as before; ``preload`` calls
+``backend.inference.warm_up`` before reporting ready, as ``lego-gpt-worker``
+now does by default. Prints the time to ready and the latency of the first
+and second job in ms. Outputs go to a temporary directory.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+project_root = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(project_root))
+sys.path.append(str(project_root / "vendor"))
+
+
+def _wall(bricks: int) -> dict:
+    """Return a running-bond wall of 2x4 bricks, four to a course."""
+    from legogpt.data import dimensions_to_brick_id
+
+    brick_id = dimensions_to_brick_id(2, 4)
+    return {
+        str(i + 1): {"brick_id": brick_id, "x": 4 * (i % 4) + 2 * (i // 4 % 2), "y": 0, "z": i // 4, "ori": 1}
+        for i in range(bricks)
+    }
+
+
+def _child(mode: str, load_seconds: float, bricks: int) -> None:
+    start = time.perf_counter()
+    # Keep the solver cache from answering the second job
+    os.environ["SOLVER_CACHE_SIZE"] = "0"
+    from legogpt.models.legogpt import LegoGPT
+
+    from backend import inference
+    from backend.solver.shim import stability_score
+
+    init = LegoGPT.__init__
+
+    def slow_init(self, *args, **kwargs):
+        time.sleep(load_seconds)
+        init(self, *args, **kwargs)
+
+    def job(n: int) -> float:
+        job_start = time.perf_counter()
+        inference.generate(f"wall {n}", seed=n)
+        stability_score(json.dumps(_wall(bricks + n)), None)
+        return (time.perf_counter() - job_start) * 1000
+
+    with tempfile.TemporaryDirectory() as tmp, patch.object(LegoGPT, "__init__", slow_init), patch.object(
+        inference, "STATIC_ROOT", Path(tmp)
+    ):
+        if mode == "preload":
+            inference.warm_up()
+        ready = (time.perf_counter() - start) * 1000
+        first = job(0)
+        second = job(1)
+    print(json.dumps({"ready": ready, "first": first, "second": second}))
+
+
+def benchmark(load_seconds: float, bricks: int) -> None:
+    print(f"{'mode':<8} {'ready ms':>9} {'1st job ms':>11} {'2nd job ms':>11}")
+    for mode in ("cold", "preload"):
+        out = subprocess.run(
+            [sys.executable, __file__, "--child", mode, "--load-seconds", str(load_seconds), "--bricks", str(bricks)],
+            check=True,
+            capture_output=True,
+            text=True,
+        ).stdout
+        times = json.loads(out.strip().splitlines()[-1])
+        print(f"{mode:<8} {times['ready']:>9.0f} {times['first']:>11.0f} {times['second']:>11.0f}")
+
+
+def main(argv: list[str] | None = None) -> None:
+    parser = argparse.ArgumentParser(description="Benchmark worker warm-up")
+    parser.add_argument("--load-seconds", type=float, default=2.0, help="Simulated model load time (default: 2)")
+    parser.add_argument("--bricks", type=int, default=16, help="Bricks in the checked structure (default: 16)")
+    parser.add_argument("--child", choices=("cold", "preload"), help=argparse.SUPPRESS)
+    args = parser.parse_args(argv)
+    if args.child:
+        _child(args.child, args.load_seconds, args.bricks)
+    else:
+        benchmark(args.load_seconds, args.bricks)
+
+
+if __name__ == "__main__":  # pragma: no cover - manual script
+    main()